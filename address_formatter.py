@@ -2,8 +2,28 @@ from abc import ABC, abstractmethod
 import asyncio
 import random
 import re
+import unicodedata
 
-from typing import List, Tuple, Callable
+import numpy as np
+import pandas as pd
+from typing import Callable, List, Optional, Tuple
+
+from data_models import ParsedAddress
+
+
+PATTERN_COUNTRY = re.compile(r",\s*(Česká republika|Česko|Czechia|Czech Republic)")
+PATTERN_REMOVE = re.compile(r"\s*č\.p\.|\bPSČ\b|\bpsč\b")
+PATTERN_TRIM = re.compile(r"^\s*,|,\s*$")
+PATTERN_WHITESPACE = re.compile(r"\s+")
+PATTERN_COMMA = re.compile(r"\s*,\s*")
+PATTERN_CONTENT = re.compile(r"[^\W_]")  # at least one letter or digit
+PATTERN_PSC = re.compile(r"(?<![\d/])(\d{3}) ?(\d{2})(?![\d/])")
+PATTERN_ORIENTATION = re.compile(r"(\d+) ?,? ?č\. ?o\. ?(\d+)")  # `33 č.o. 12` is written as `33/12`
+PATTERN_ORIENTATION_MARK = re.compile(r"\bč\. ?o\. ?")
+PATTERN_NUMBER = re.compile(r"(?<![\w/.])((?:č\. ?ev\. ?)?\d+[a-zA-Z]?(?: ?/ ?(?:\d+[a-zA-Z]?|[a-zA-Z]))?)(?![\w/])")  # e.g. `12`, `12a`, `293/13`, `1/a`
+PATTERN_LETTER = re.compile(r"[^\W\d_]")
+PATTERN_TOKEN = re.compile(r"[^\s,]+")
+PATTERN_PRAGUE_DISTRICT = re.compile(r"^Praha \d+$", re.IGNORECASE)  # number of district, not house number
 
 
 class FallbackStrategy(ABC):
@@ -12,6 +32,25 @@ class FallbackStrategy(ABC):
     def apply_fallback(self, address: str) -> str:
         pass
 
+    def fit(self, address: str, limit: int, cleanse: Callable[[str], str]) -> str:
+        """Apply fallback until address is not longer than `limit` chars. Address which can not be shortened
+           by fallback (e.g. single long element) is truncated
+
+        Args:
+            address (str): address string
+            limit (int): maximal length of address
+            cleanse (Callable[[str], str]): function cleansing address after every fallback
+
+        Returns:
+            str: address not longer than `limit`
+        """
+        while len(address) > limit:
+            shortened = cleanse(self.apply_fallback(address))
+            if shortened == address:
+                return address[:limit].strip()
+            address = shortened
+        return address
+
 class RemoveElementsRandomStrategy(FallbackStrategy):
     """
     Remove random elements of address. Elements are parts given by `split(' ')`
@@ -30,6 +69,15 @@ class RemoveElementsFromLeftStrategy(FallbackStrategy):
     def apply_fallback(self, address: str) -> str:
         splitted = address.split(' ')
         return ' '.join(splitted[1:]) if len(splitted) > 1 else address
+
+    def fit(self, address: str, limit: int, cleanse: Callable[[str], str]) -> str:
+        # address is split only once and the longest fitting suffix is taken
+        splitted = address.split(' ')
+        for start in range(len(splitted)):
+            candidate = cleanse(' '.join(splitted[start:]))
+            if len(candidate) <= limit:
+                return candidate
+        return splitted[-1][:limit]
     
 class RemoveElementsFromRightStrategy(FallbackStrategy):
     """
@@ -39,6 +87,153 @@ class RemoveElementsFromRightStrategy(FallbackStrategy):
         splitted = address.split(' ')
         return ' '.join(splitted[:-1]) if len(splitted) > 1 else address
 
+    def fit(self, address: str, limit: int, cleanse: Callable[[str], str]) -> str:
+        # address is split only once and the longest fitting prefix is taken
+        splitted = address.split(' ')
+        for end in range(len(splitted), 0, -1):
+            candidate = cleanse(' '.join(splitted[:end]))
+            if len(candidate) <= limit:
+                return candidate
+        return splitted[0][:limit]
+
+
+class StructuredAddressStrategy(FallbackStrategy):
+    """
+    Parse address into street, house number, PSČ, part and municipality (see `parse`) and build targeted queries
+    from most to least specific (see `queries`) e.g. `Karlovo náměstí 293/13, 120 00 Praha 2` and `Karlovo náměstí 293/13, 120 00`.
+    Every fallback moves to next query so house number and PSČ are never cut off. When all queries were tried, address
+    is returned unchanged which ends the retries. Only addresses which can not be parsed are shortened by `base` strategy
+    (never to PSČ or number alone)
+    """
+    MEMO_SIZE = 100000  # maximal number of remembered queries, see `apply_fallback`
+
+    def __init__(self, base: Optional[FallbackStrategy] = None) -> None:
+        """
+        Args:
+            base (FallbackStrategy, optional): Strategy used for addresses without recognized house number. Defaults to `RemoveElementsFromLeftStrategy()`.
+        """
+        self.base = base if base is not None else RemoveElementsFromLeftStrategy()
+        self.__following = {}
+
+    @staticmethod
+    def parse(address: str) -> ParsedAddress:
+        """Extract components of Czech address (normalized, see `AddressFormatter.normalize`). Comma separated parts are expected
+           in usual order i.e. street with house number first and municipality (with PSČ) last. Bare house number
+           in separate part belongs to the preceding part e.g. `Hradec Králové, 500 08, Partyzánská, 11`
+
+        Args:
+            address (str): address string
+
+        Returns:
+            ParsedAddress: recognized components (missing are None)
+        """
+        text = PATTERN_ORIENTATION_MARK.sub('', PATTERN_ORIENTATION.sub(r"\1/\2", address))
+        psc = PATTERN_PSC.search(text)
+        psc_part = None
+        parts = [part.strip() for part in text.split(',')]
+        if psc:
+            psc_part = next(i for i, part in enumerate(parts) if PATTERN_PSC.search(part))
+            parts[psc_part] = PATTERN_PSC.sub('', parts[psc_part], count=1).strip()
+
+        # house number is in first part containing number which is not number of Prague district
+        numbered = [i for i, part in enumerate(parts) if PATTERN_NUMBER.search(part)]
+        numbered = [i for i in numbered if not PATTERN_PRAGUE_DISTRICT.match(parts[i])] or numbered
+        if not numbered:
+            return ParsedAddress(psc=f"{psc.group(1)} {psc.group(2)}" if psc else None,
+                                 municipality=parts[psc_part] or None if psc_part is not None else None)
+
+        position = street_position = numbered[0]
+        number = PATTERN_NUMBER.search(parts[position])
+        street, rest = parts[position][:number.start()].strip(), parts[position][number.end():].strip()
+        if not street and not rest and position > 0 and parts[position - 1]:  # e.g. `Partyzánská, 11`
+            street_position = position - 1
+            street = parts[street_position]
+        elif not street:  # e.g. `12 Dlouhá`
+            street, rest = rest, ''
+
+        others = [(i, part) for i, part in enumerate(parts) if i not in (position, street_position) and part]
+        if rest:  # e.g. `Dlouhá 12 Praha 1` without commas
+            others.append((position, rest))
+        has_municipality = psc_part is not None and parts[psc_part] and psc_part not in (position, street_position)
+        municipality_position = psc_part if has_municipality else (others[-1][0] if others else None)
+        municipality = next((part for i, part in reversed(others) if i == municipality_position), None)
+        part = ', '.join(part for i, part in others if part != municipality) or None
+
+        return ParsedAddress(street=street or None, number=re.sub(r" ?/ ?", '/', number.group(1)),
+                             psc=f"{psc.group(1)} {psc.group(2)}" if psc else None, part=part, municipality=municipality)
+
+    @staticmethod
+    def queries(parsed: ParsedAddress) -> List[str]:
+        """Build queries from most to least specific. Part of municipality is left out since it is often
+           written differently than in RUIAN, house number is always included together with street or municipality
+
+        Args:
+            parsed (ParsedAddress): components of address
+
+        Returns:
+            List[str]: queries (empty if address has no house number or neither street nor municipality)
+        """
+        if parsed.number is None or not (parsed.street or parsed.municipality):
+            return []
+        if parsed.street is None:  # addresses without street are numbered within municipality
+            place = f"{parsed.municipality} {parsed.number}"
+            return [f"{place}, {parsed.psc}", place] if parsed.psc else [place]
+
+        place = f"{parsed.street} {parsed.number}"
+        queries = []
+        if parsed.psc and parsed.municipality:
+            queries.append(f"{place}, {parsed.psc} {parsed.municipality}")
+        if parsed.psc:
+            queries.append(f"{place}, {parsed.psc}")
+        if parsed.municipality:
+            queries.append(f"{place}, {parsed.municipality}")
+        return queries
+
+    @staticmethod
+    def tokens(address: str) -> Tuple[str, ...]:
+        """Multiset of words of address ignoring order, case, separators and spacing of PSČ. Addresses with equal
+           tokens are the same query for RUIAN
+
+        Args:
+            address (str): address string
+
+        Returns:
+            Tuple[str, ...]: sorted words
+        """
+        return tuple(sorted(PATTERN_TOKEN.findall(PATTERN_PSC.sub(r"\1\2", address).casefold())))
+
+    def __remember(self, query: str, following: List[str]) -> None:
+        # parsing less specific query loses components (e.g. municipality) so the rest of ladder is remembered
+        if len(self.__following) >= self.MEMO_SIZE:
+            self.__following.clear()
+        self.__following[self.tokens(query)] = following
+
+    def apply_fallback(self, address: str) -> str:
+        tokens = self.tokens(address)
+        following = self.__following.get(tokens)
+        if following is None:
+            queries = self.queries(self.parse(address))
+            if not queries:
+                shortened = self.base.apply_fallback(address)
+                # PSČ or house number alone matches arbitrary address
+                return shortened if PATTERN_LETTER.search(PATTERN_PSC.sub('', shortened)) else address
+            # address which is already one of queries moves to next (less specific) query
+            tried = [i for i, query in enumerate(queries) if self.tokens(query) == tokens]
+            following = [query for query in queries[tried[-1] + 1 if tried else 0:] if self.tokens(query) != tokens]
+        if not following:
+            return address
+        self.__remember(following[0], following[1:])
+        return following[0]
+
+    def fit(self, address: str, limit: int, cleanse: Callable[[str], str]) -> str:
+        # the most specific fitting query, too long street is shortened by base strategy
+        queries = self.queries(self.parse(address))
+        fitting = next((i for i, query in enumerate(queries) if len(query) <= limit), None)
+        if fitting is not None:
+            self.__remember(queries[fitting], queries[fitting + 1:])
+            return queries[fitting]
+        return self.base.fit(queries[-1] if queries else address, limit, cleanse)
+
 
 class AddressFormatter:
     """
@@ -53,12 +248,26 @@ class AddressFormatter:
     
     @fallback_strategy.setter
     def fallback_strategy(self, fallback_strategy: FallbackStrategy):
-        self.__fallback_strategy = FallbackStrategy
+        self.__fallback_strategy = fallback_strategy
 
 
     def format_address(self, address: str) -> str:
        
         return self.cleanse(self.fallback_strategy.apply_fallback(address))
+
+    def fit(self, address: str, limit: int) -> str:
+        """Shorten address applying fallback strategy until it is not longer than `limit` chars
+
+        Args:
+            address (str): address string
+            limit (int): maximal length of address
+
+        Returns:
+            str: address not longer than `limit`
+        """
+        if len(address) <= limit:
+            return address
+        return self.fallback_strategy.fit(address, limit, self.cleanse)
     
     @staticmethod
     def remove(address: str) -> str:
@@ -70,10 +279,7 @@ class AddressFormatter:
         Returns:
             str: cleansed string
         """
-        pattern_country = r",\s*(Česká republika|Česko|Czechia|Czech Republic)"
-        pattern_remove = r"\s*č\.p\.|\bPSČ\b|\bpsč\b"
-
-        return re.sub(pattern_remove, '', re.sub(pattern_country, '', address))
+        return PATTERN_REMOVE.sub('', PATTERN_COUNTRY.sub('', address))
     
     @staticmethod
     def cleanse(address: str) -> str:
@@ -85,8 +291,52 @@ class AddressFormatter:
         Returns:
             str: cleansed string
         """
-        pattern_trim = r"^\s*,|,\s*$"
+        return PATTERN_TRIM.sub('', address).strip()
 
-        return re.sub(pattern_trim, '', address).strip()
+    @staticmethod
+    def normalize(address: str) -> str:
+        """Normalize address string into query sent to API i.e. Unicode NFC, removed patterns (see `remove`),
+           collapsed whitespace, unified separators and cleansed commas
+
+        Args:
+            address (str): address string
+
+        Returns:
+            str: normalized address
+        """
+        address = unicodedata.normalize('NFC', address)
+        address = PATTERN_WHITESPACE.sub(' ', AddressFormatter.remove(address))
+        address = PATTERN_COMMA.sub(', ', address)
+        return AddressFormatter.cleanse(address)
+
+    @staticmethod
+    def key(address: str) -> str:
+        """Canonical key of normalized address used for deduplication, caching and journal
+
+        Args:
+            address (str): normalized address string (see `normalize`)
+
+        Returns:
+            str: casefolded address
+        """
+        return address.casefold()
+
+    @staticmethod
+    def normalize_column(addresses: pd.Series) -> pd.DataFrame:
+        """Normalize whole column of addresses at once (same as `normalize` and `key` applied on every value).
+           Column is factorized first so every distinct value is normalized only once.
+           Empty, missing and junk values (without any letter or digit) get missing key and query
+
+        Args:
+            addresses (pd.Series): column of address strings
+
+        Returns:
+            pd.DataFrame: `key` (canonical key) and `query` (normalized address) columns with index of `addresses`
+        """
+        codes, uniques = pd.factorize(addresses)  # missing values get code -1
 
+        queries = [AddressFormatter.normalize(str(address)) for address in uniques]
+        queries = np.array([query if PATTERN_CONTENT.search(query) else None for query in queries] + [None], dtype=object)
+        keys = np.array([query.casefold() if query is not None else None for query in queries], dtype=object)
 
+        return pd.DataFrame({'key': keys[codes], 'query': queries[codes]}, index=addresses.index)
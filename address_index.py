@@ -0,0 +1,406 @@
+import glob
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+
+import pandas as pd
+
+from typing import Optional, Dict, List, Iterable, Union, Tuple, Set
+
+from data_models import ApiResponse, RuianCodeApiResponse, RuianCodeItem, CoordinatesAPIResponse, Candidate, Location, SpatialReference, Attributes
+
+
+# columns of CUZK address points dump (https://nahlizenidokn.cuzk.cz/StahniAdresniMistaRUIAN.aspx) mapped to columns of index
+DUMP_COLUMNS = {
+    'Kód ADM': 'kod',
+    'Název obce': 'obec',
+    'Název MOP': 'mop',
+    'Název části obce': 'cast_obce',
+    'Název ulice': 'ulice',
+    'Typ SO': 'typ_so',
+    'Číslo domovní': 'cislo_domovni',
+    'Číslo orientační': 'cislo_orientacni',
+    'Znak čísla orientačního': 'znak_co',
+    'PSČ': 'psc',
+    'Souřadnice Y': 'sjtsk_y',
+    'Souřadnice X': 'sjtsk_x',
+}
+
+SJTSK_WKID = 5514
+
+# weights of components of fuzzy match score
+SCORE_WEIGHTS = {'street': 0.35, 'number': 0.3, 'place': 0.25, 'psc': 0.1}
+
+
+class AddressIndex:
+    """
+    Offline index of RUIAN address points built from CUZK csv dump and stored in SQLite database.
+    Address is resolved to address points by house numbers and PSČ (or municipality)
+    and candidates are confirmed by street/part of municipality name present in address.
+    Addresses which can not be resolved exactly are matched fuzzily using inverted trigram index
+    of (diacritics insensitive) names of streets, parts of municipalities and municipalities.
+    """
+
+    def __init__(self, path: str = 'ruian_index.sqlite', fuzzy: bool = True, min_score: float = 80, max_candidates: int = 10) -> None:
+        """
+        Args:
+            path (str, optional): Path to SQLite index file. Defaults to 'ruian_index.sqlite'.
+            fuzzy (bool, optional): Whether use fuzzy matching when address can not be resolved exactly. Defaults to True.
+            min_score (float, optional): Minimal score (0-100) of fuzzy match candidate. Defaults to 80.
+            max_candidates (int, optional): Maximal number of returned fuzzy match candidates. Defaults to 10.
+        """
+        self.path = path
+        self.fuzzy = fuzzy
+        self.min_score = min_score
+        self.max_candidates = max_candidates
+
+        self.hits = 0
+        self.misses = 0
+
+        self.__lock = threading.Lock()
+        self.__connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self.__connection is None:
+            self.__connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.__connection.row_factory = sqlite3.Row
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS address_points ("
+                                      "kod INTEGER PRIMARY KEY, "
+                                      "obec TEXT NOT NULL, "
+                                      "mop TEXT, "
+                                      "cast_obce TEXT, "
+                                      "ulice TEXT, "
+                                      "typ_so TEXT, "
+                                      "cislo_domovni INTEGER, "
+                                      "cislo_orientacni INTEGER, "
+                                      "znak_co TEXT, "
+                                      "psc TEXT, "
+                                      "x REAL, "
+                                      "y REAL, "
+                                      "nazev TEXT NOT NULL, "
+                                      "obec_key TEXT NOT NULL, "
+                                      "ulice_id INTEGER, "
+                                      "cast_id INTEGER, "
+                                      "obec_id INTEGER)")
+            # inverted index of names: name -> trigrams of its words
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS names (name_id INTEGER PRIMARY KEY, name_key TEXT NOT NULL UNIQUE, trigram_count INTEGER NOT NULL)")
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS name_trigrams (trigram TEXT NOT NULL, name_id INTEGER NOT NULL, "
+                                      "PRIMARY KEY (trigram, name_id)) WITHOUT ROWID")
+            self.__connection.commit()
+        return self.__connection
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize text for comparison of names (remove diacritics, casefold and collapse whitespace)
+
+        Args:
+            text (str): text
+
+        Returns:
+            str: normalized text
+        """
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+        return re.sub(r"\s+", ' ', text.casefold()).strip()
+
+    @staticmethod
+    def trigrams(text: str) -> Set[str]:
+        """Trigrams of words of normalized text. Words are padded by spaces so word boundaries are part of trigrams
+
+        Args:
+            text (str): normalized text
+
+        Returns:
+            Set[str]: trigrams
+        """
+        return {padded[i:i + 3] for word in re.findall(r"\w+", text) for padded in (f" {word} ",) for i in range(len(padded) - 2)}
+
+    @staticmethod
+    def format_address(point: Union[sqlite3.Row, Dict]) -> str:
+        """Format address point the way RUIAN presents it e.g. `Dlouhá 741/13, Staré Město, 11000 Praha 1`
+
+        Args:
+            point (Union[sqlite3.Row, Dict]): address point
+
+        Returns:
+            str: formatted address
+        """
+        number = f"{'č.ev. ' if point['typ_so'] == 'č.ev.' else ''}{point['cislo_domovni']}"
+        if point['cislo_orientacni'] is not None:
+            number += f"/{point['cislo_orientacni']}{point['znak_co'] or ''}"
+
+        parts = [f"{point['ulice']} {number}", point['cast_obce']] if point['ulice'] else [f"{point['cast_obce']} {number}"]
+        parts.append(f"{point['psc']} {point['mop'] or point['obec']}")
+
+        return ', '.join(parts)
+
+    def build(self, paths: Iterable[str], chunk_size: int = 100_000) -> int:
+        """Build (or extend) index from CUZK csv dump of address points
+
+        Args:
+            paths (Iterable[str]): csv files or directories with csv files (semicolon separated, cp1250 encoded)
+            chunk_size (int, optional): Number of csv rows processed at once. Defaults to 100 000.
+
+        Returns:
+            int: number of indexed address points
+        """
+        files = []
+        for path in paths:
+            files.extend(sorted(glob.glob(os.path.join(path, '*.csv'))) if os.path.isdir(path) else [path])
+
+        if not files:
+            raise Exception("No csv files of address points found.")
+
+        for file in files:
+            for chunk in pd.read_csv(file, sep=';', encoding='cp1250', dtype=str, chunksize=chunk_size, usecols=lambda c: c in DUMP_COLUMNS):
+                self.__insert(chunk.rename(columns=DUMP_COLUMNS))
+
+        with self.__lock:
+            self.connection.execute("CREATE INDEX IF NOT EXISTS address_points_psc_cd ON address_points (psc, cislo_domovni)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS address_points_psc_co ON address_points (psc, cislo_orientacni)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS address_points_obec_cd ON address_points (obec_key, cislo_domovni)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS address_points_obec_co ON address_points (obec_key, cislo_orientacni)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS address_points_ulice_cd ON address_points (ulice_id, cislo_domovni)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS address_points_ulice_co ON address_points (ulice_id, cislo_orientacni)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS address_points_cast_cd ON address_points (cast_id, cislo_domovni)")
+            self.connection.commit()
+            return self.connection.execute("SELECT COUNT(*) FROM address_points").fetchone()[0]
+
+    def __insert(self, chunk: pd.DataFrame) -> None:
+        for column in DUMP_COLUMNS.values():
+            if column not in chunk.columns:
+                chunk[column] = None
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+
+        records = []
+        for point in chunk.to_dict('records'):
+            point['kod'] = int(point['kod'])
+            point['cislo_domovni'] = int(point['cislo_domovni']) if point['cislo_domovni'] else None
+            point['cislo_orientacni'] = int(point['cislo_orientacni']) if point['cislo_orientacni'] else None
+            # S-JTSK coordinates of dump are positive (Y, X), EPSG:5514 (Krovak East North) uses (-Y, -X)
+            point['x'] = -float(point['sjtsk_y'].replace(',', '.')) if point['sjtsk_y'] else None
+            point['y'] = -float(point['sjtsk_x'].replace(',', '.')) if point['sjtsk_x'] else None
+            point['nazev'] = self.format_address(point)
+            point['obec_key'] = self.normalize(point['obec'])
+            records.append(point)
+
+        with self.__lock:
+            name_ids = self.__name_ids({self.normalize(point[column]) for point in records for column in ('ulice', 'cast_obce', 'obec') if point[column]})
+            for point in records:
+                point['ulice_id'], point['cast_id'], point['obec_id'] = (name_ids.get(self.normalize(point[column] or '')) for column in ('ulice', 'cast_obce', 'obec'))
+
+            self.connection.executemany("INSERT OR REPLACE INTO address_points "
+                                        "(kod, obec, mop, cast_obce, ulice, typ_so, cislo_domovni, cislo_orientacni, znak_co, psc, x, y, nazev, obec_key, ulice_id, cast_id, obec_id) "
+                                        "VALUES (:kod, :obec, :mop, :cast_obce, :ulice, :typ_so, :cislo_domovni, :cislo_orientacni, :znak_co, :psc, :x, :y, :nazev, :obec_key, "
+                                        ":ulice_id, :cast_id, :obec_id)",
+                                        records)
+            self.connection.commit()
+
+    def __name_ids(self, names: Set[str]) -> Dict[str, int]:
+        # must be called with lock acquired, registers new names in inverted trigram index
+        names = sorted(names)
+        known = {}
+        for start in range(0, len(names), 500):
+            batch = names[start:start + 500]
+            known.update(self.connection.execute(f"SELECT name_key, name_id FROM names WHERE name_key IN ({', '.join('?' * len(batch))})", batch).fetchall())
+
+        for name in names:
+            if name not in known:
+                trigrams = self.trigrams(name)
+                known[name] = self.connection.execute("INSERT INTO names (name_key, trigram_count) VALUES (?, ?)", (name, len(trigrams))).lastrowid
+                self.connection.executemany("INSERT INTO name_trigrams (trigram, name_id) VALUES (?, ?)", ((trigram, known[name]) for trigram in trigrams))
+        return known
+
+    @staticmethod
+    def __contains_name(text: str, name: Optional[str]) -> bool:
+        return bool(name) and re.search(rf"(?<!\w){re.escape(AddressIndex.normalize(name))}(?!\w)", text) is not None
+
+    @staticmethod
+    def __parse_numbers(text: str) -> Tuple[Optional[str], List[Tuple[int, int, str]], List[Tuple[int, str]]]:
+        """helper method to extract PSČ, `cislo domovni/cislo orientacni` pairs and standalone numbers from normalized address"""
+        psc = re.search(r"(?<!\d)(\d{3}) ?(\d{2})(?!\d)", text)
+        numbers_text = text[:psc.start()] + ' ' + text[psc.end():] if psc else text
+
+        pairs = [(int(cd), int(co), znak) for cd, co, znak in re.findall(r"(?<!\d)(\d+) ?/ ?(\d+)([a-z]?)(?!\w)", numbers_text)]
+        singles = [(int(n), znak) for n, znak in re.findall(r"(?<![\d/])(\d+)([a-z]?)(?![\w/])", re.sub(r"\d+ ?/ ?\d+[a-z]?", ' ', numbers_text))]
+
+        return psc.group(1) + psc.group(2) if psc else None, pairs, singles
+
+    @staticmethod
+    def __number_score(point: sqlite3.Row, pairs: List[Tuple[int, int, str]], singles: List[Tuple[int, str]]) -> float:
+        """helper method to score house numbers of address point. 1 for exact match, 0.5 if only one number of pair matches"""
+        znak = (point['znak_co'] or '').casefold()
+        if any(cd == point['cislo_domovni'] and co == point['cislo_orientacni'] and z in ('', znak) for cd, co, z in pairs):
+            return 1.0
+        if point['ulice']:
+            # in street addresses single number is usually orientation number
+            if any(n == point['cislo_orientacni'] and z in ('', znak) or n == point['cislo_domovni'] and not z for n, z in singles):
+                return 1.0
+        elif any(n == point['cislo_domovni'] and not z for n, z in singles):
+            return 1.0
+        if any(cd == point['cislo_domovni'] or co == point['cislo_orientacni'] for cd, co, _ in pairs):
+            return 0.5
+        return 0.0
+
+    def lookup(self, address: str) -> List[sqlite3.Row]:
+        """Find address points exactly matching address
+
+        Args:
+            address (str): address string
+
+        Returns:
+            List[sqlite3.Row]: matching address points (empty if address can not be resolved locally)
+        """
+        text = self.normalize(address)
+        psc, pairs, singles = self.__parse_numbers(text)
+        numbers = sorted({n for cd, co, _ in pairs for n in (cd, co)} | {n for n, _ in singles})
+
+        if not numbers:
+            return []
+
+        placeholders = ', '.join('?' * len(numbers))
+        if psc:
+            query = (f"SELECT * FROM address_points WHERE psc = ? AND cislo_domovni IN ({placeholders}) "
+                     f"UNION SELECT * FROM address_points WHERE psc = ? AND cislo_orientacni IN ({placeholders})")
+            params = [psc, *numbers] * 2
+        else:
+            # without PSČ municipality has to be present in address, every word sequence is considered
+            words = re.sub(r"[\d,/.]+", ' ', text).split()
+            names = sorted({' '.join(words[i:j]) for i in range(len(words)) for j in range(i + 1, min(i + 4, len(words)) + 1)})
+            if not names:
+                return []
+            name_placeholders = ', '.join('?' * len(names))
+            query = (f"SELECT * FROM address_points WHERE obec_key IN ({name_placeholders}) AND cislo_domovni IN ({placeholders}) "
+                     f"UNION SELECT * FROM address_points WHERE obec_key IN ({name_placeholders}) AND cislo_orientacni IN ({placeholders})")
+            params = [*names, *numbers] * 2
+
+        with self.__lock:
+            candidates = self.connection.execute(query, params).fetchall()
+
+        def name_match(point: sqlite3.Row) -> bool:
+            if point['ulice']:
+                return self.__contains_name(text, point['ulice'])
+            return self.__contains_name(text, point['cast_obce']) or self.__contains_name(text, point['obec'])
+
+        return sorted([point for point in candidates if self.__number_score(point, pairs, singles) == 1.0 and name_match(point)], key=lambda point: point['kod'])
+
+    def match(self, address: str) -> List[Tuple[sqlite3.Row, float]]:
+        """Fuzzily match address against index. Names similar to words of address are found in inverted trigram index,
+           address points with these names (or PSČ) and house numbers of address are scored on street, house number,
+           PSČ and municipality
+
+        Args:
+            address (str): address string (e.g. misspelled, without diacritics or in unusual order)
+
+        Returns:
+            List[Tuple[sqlite3.Row, float]]: at most `max_candidates` (address point, score) pairs with score at least `min_score` ranked by score
+        """
+        text = self.normalize(address)
+        psc, pairs, singles = self.__parse_numbers(text)
+        numbers = sorted({n for cd, co, _ in pairs for n in (cd, co)} | {n for n, _ in singles})
+        trigrams = sorted(self.trigrams(re.sub(r"\d+", ' ', text)))
+
+        if not numbers or not trigrams:
+            return []
+
+        with self.__lock:
+            # similarity of name is share of its trigrams present in address
+            similarity = {name_id: shared / trigram_count for name_id, shared, trigram_count in
+                          self.connection.execute(f"SELECT name_trigrams.name_id, COUNT(*), names.trigram_count FROM name_trigrams "
+                                                  f"JOIN names ON names.name_id = name_trigrams.name_id "
+                                                  f"WHERE trigram IN ({', '.join('?' * len(trigrams))}) GROUP BY name_trigrams.name_id", trigrams)}
+            name_ids = sorted(name_id for name_id, value in similarity.items() if value >= 0.5)
+
+            queries, params = [], []
+            placeholders = ', '.join('?' * len(numbers))
+            if name_ids:
+                name_placeholders = ', '.join('?' * len(name_ids))
+                for name_column, number_column in (('ulice_id', 'cislo_orientacni'), ('ulice_id', 'cislo_domovni'), ('cast_id', 'cislo_domovni')):
+                    queries.append(f"SELECT * FROM address_points WHERE {name_column} IN ({name_placeholders}) AND {number_column} IN ({placeholders})")
+                    params.extend([*name_ids, *numbers])
+            if psc:
+                for number_column in ('cislo_domovni', 'cislo_orientacni'):
+                    queries.append(f"SELECT * FROM address_points WHERE psc = ? AND {number_column} IN ({placeholders})")
+                    params.extend([psc, *numbers])
+            if not queries:
+                return []
+            candidates = self.connection.execute(' UNION '.join(queries), params).fetchall()
+
+        def score(point: sqlite3.Row) -> float:
+            components = {'street': similarity.get(point['ulice_id'] if point['ulice'] else point['cast_id'], 0.0),
+                          'number': self.__number_score(point, pairs, singles),
+                          'place': max(similarity.get(point['obec_id'], 0.0), similarity.get(point['cast_id'], 0.0))}
+            if psc:
+                components['psc'] = float(psc == point['psc'])
+            # PSČ is not penalized when it is missing in address
+            return 100 * sum(SCORE_WEIGHTS[c] * value for c, value in components.items()) / sum(SCORE_WEIGHTS[c] for c in components)
+
+        scored = sorted(((point, score(point)) for point in candidates), key=lambda pair: (-pair[1], pair[0]['kod']))
+        return [(point, value) for point, value in scored if value >= self.min_score][:self.max_candidates]
+
+    def resolve(self, endpoint: str, address: str) -> Optional[ApiResponse]:
+        """Resolve address locally into response of given endpoint. Exact match is preferred, fuzzy match
+           (if enabled) is used otherwise
+
+        Args:
+            endpoint (str): name of endpoint i.e. `code` or `coordinates`
+            address (str): address string
+
+        Returns:
+            Optional[ApiResponse]: response built from index or None if address is not found
+        """
+        def usable(matches: List[Tuple[sqlite3.Row, float]]) -> List[Tuple[sqlite3.Row, float]]:
+            # points without coordinates can not answer coordinates lookup
+            return matches if endpoint == 'code' else [(point, score) for point, score in matches if point['x'] is not None]
+
+        matches = usable([(point, 100.0) for point in self.lookup(address)])
+        if not matches and self.fuzzy:
+            matches = usable(self.match(address))
+
+        with self.__lock:
+            if not matches:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        if endpoint == 'code':
+            return ApiResponse(response=RuianCodeApiResponse(polozky=[RuianCodeItem(kod=point['kod'], nazev=point['nazev']) for point, _ in matches],
+                                                             existujiDalsiPolozky=False))
+
+        spatial_reference = SpatialReference(wkid=SJTSK_WKID, latestWkid=SJTSK_WKID)
+        candidates = [Candidate(address=point['nazev'],
+                                location=Location(x=point['x'], y=point['y'], spatialReference=spatial_reference),
+                                score=round(score),
+                                attributes=Attributes(Addr_type='PointAddress', Loc_name='RUIAN_index', Type='AdresniMisto', City=point['obec'],
+                                                      Country='CZE', Match_addr=point['nazev'], Score=round(score)))
+                      for point, score in matches]
+        return ApiResponse(response=CoordinatesAPIResponse(spatialReference=spatial_reference, candidates=candidates))
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters of index
+
+        Returns:
+            Dict[str, float]: dictionary with `hits`, `misses` and `hit_rate`
+        """
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__connection is not None:
+                self.__connection.close()
+                self.__connection = None
+
+    def __getstate__(self) -> dict:
+        # connection and lock can not be pickled, they are recreated lazily
+        state = self.__dict__.copy()
+        state['_AddressIndex__connection'] = None
+        del state['_AddressIndex__lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
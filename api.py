@@ -1,15 +1,53 @@
-from fastapi import FastAPI, Query
-from pydantic import BaseModel
-from typing import Callable, List, Tuple
+import contextlib
+import os
+import shutil
+import uuid
+from collections import defaultdict
 
+import aiohttp
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from typing import AsyncIterator, Dict, List, Literal, Optional
+
+from data_models import ApiResponse, BatchRequest, BatchResult, JobStatus
+from jobs import JobQueue
+from limiter import RateLimiter
 from ruian import RuianFetcher
+from scheduler import abounded_map
+
+
+# upstream budget is divided between interactive lookups and background jobs so large jobs can not starve interactive lookups
+JOB_RATE_SHARE = float(os.environ.get('RUIAN_JOB_RATE_SHARE', 0.5))
+budget = RateLimiter()
+
+r = RuianFetcher(rate_limiter=budget.scaled(1 - JOB_RATE_SHARE))
+# all jobs share one rate limiter (and metrics with interactive lookups)
+jobs = JobQueue(RuianFetcher(rate_limiter=budget.scaled(JOB_RATE_SHARE), metrics=r.metrics), directory=os.environ.get('RUIAN_JOB_DIR', 'jobs'),
+                workers=int(os.environ.get('RUIAN_JOB_WORKERS', 2)))
 
 
-app = FastAPI()
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # one long-lived session (connection pool with keep-alive and DNS cache) shared by all requests,
+    # concurrency per upstream host is capped by `r.rate_limiter` so connector itself is not limited
+    connector = aiohttp.TCPConnector(limit=0, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        app.state.session = session
+        await jobs.start()
+        try:
+            yield
+        finally:
+            await jobs.stop()
 
-r = RuianFetcher()
 
-# https://fastapi.tiangolo.com/tutorial/background-tasks/
+app = FastAPI(lifespan=lifespan)
+
+
+def check_address(address: Optional[str]) -> str:
+    if not address or not address.strip():
+        raise HTTPException(status_code=400, detail="No address provided")
+    return address
 
 
 @app.get("/")
@@ -18,30 +56,134 @@ def root():
             "API Docs": "http://127.0.0.1:8000/docs"
     }
 
-@app.get("/ruian/coordinates")
-@app.get("/ruian/coordinates/{address}")
-def get_coordinates(address: str = None):
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Metrics of requests, retries, cache and index lookups in Prometheus text format
+    """
+    return PlainTextResponse(r.metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ruian/coordinates", response_model=ApiResponse)
+@app.get("/ruian/coordinates/{address}", response_model=ApiResponse)
+async def get_coordinates(address: str = None):
     """
     Obtain coordinates for given address
     """
-    pass
+    return await r.afetch_coordinates(check_address(address), session=app.state.session)
 
-@app.get("/ruian/code")
-@app.get("/ruian/code/{address}")
-def get_coordinates(address: str = None):
+@app.get("/ruian/code", response_model=ApiResponse)
+@app.get("/ruian/code/{address}", response_model=ApiResponse)
+async def get_ruian_code(address: str = None):
     """
     Obtain ruian code for given address
     """
-    pass
+    return await r.afetch_ruian_code(check_address(address), session=app.state.session)
 
-@app.get("/ruian/info")
-@app.get("/ruian/info/{address}")
-def get_coordinates(address: str = None):
+@app.get("/ruian/info", response_model=ApiResponse)
+@app.get("/ruian/info/{address}", response_model=ApiResponse)
+async def get_info(address: str = None):
     """
     Obtain ruian code & coordinates for given address
     """
-    pass
+    return await r.afetch_info(check_address(address), session=app.state.session)
+
+@app.post("/ruian/batch")
+async def post_batch(batch: BatchRequest):
+    """
+    Obtain ruian codes, coordinates or both (`info`) for list of addresses. Results are streamed as NDJSON
+    in order of completion, every line is tagged by index of address in input list
+    """
+    fetch = {'code': r.afetch_ruian_code, 'coordinates': r.afetch_coordinates, 'info': r.afetch_info}[batch.task]
+
+    # duplicate addresses are looked up once and result is sent for each of them
+    positions: Dict[str, List[int]] = defaultdict(list)
+    for index, address in enumerate(batch.addresses):
+        positions[address].append(index)
+
+    async def lookup(address: str) -> ApiResponse:
+        try:
+            return await fetch(address, session=app.state.session)
+        except Exception as e:  # failure of one address must not break the stream
+            return ApiResponse(response=None, error_msg=str(e))
+
+    async def stream() -> AsyncIterator[str]:
+        # lookups still in flight are cancelled when client disconnects
+        async for address, response in abounded_map(lookup, positions, batch.window):
+            for index in positions[address]:
+                yield BatchResult(index=index, address=address, result=response).model_dump_json() + '\n'
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+async def post_job(task: Literal['code', 'coordinates', 'info'] = Form('code'), column_name: str = Form(...), file: Optional[UploadFile] = File(None),
+                   server: str = Form(''), db: str = Form(''), in_table: str = Form(''), out_table: str = Form(''), key_column: str = Form('')):
+    """
+    Submit background job processing uploaded csv/excel file or table of MS SQL database (`server`, `db`, `in_table`).
+    Result is written into `out_table` if provided otherwise it can be downloaded from `/jobs/{job_id}/result` once job is done.
+    With `key_column` table is read in chunks (only address and key columns) and results are upserted into `out_table` as they are produced
+    """
+    if file is None and not (server and db and in_table):
+        raise HTTPException(status_code=400, detail="Provide either file or `server`, `db` and `in_table`")
+    if out_table and not (server and db):
+        raise HTTPException(status_code=400, detail="`out_table` requires `server` and `db`")
+
+    in_file = ''
+    job_id = uuid.uuid4().hex
+    if file is not None:
+        extension = os.path.splitext(file.filename or '')[1].lower()
+        if extension not in ('.csv', '.xlsx', '.xls'):
+            raise HTTPException(status_code=400, detail="Only csv and excel files are supported")
+        in_file = os.path.join(jobs.job_directory(job_id), f"input{extension}")
+        os.makedirs(jobs.job_directory(job_id), exist_ok=True)
+        with open(in_file, 'wb') as f:
+            await run_in_threadpool(shutil.copyfileobj, file.file, f)
+
+    return jobs.submit(task, column_name, in_file, server, db, in_table, out_table, key_column, job_id=job_id)
+
+@app.get("/jobs", response_model=List[JobStatus])
+def get_jobs():
+    """
+    Status of all jobs
+    """
+    return jobs.jobs()
 
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+def get_job(job_id: str):
+    """
+    Status and progress of job
+    """
+    job = jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    """
+    Download result of finished job
+    """
+    job = jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.result is None:
+        raise HTTPException(status_code=409, detail=f"Result is not available (job is {job.state})")
+    return FileResponse(jobs.result_path(job_id), media_type="text/csv", filename=f"{job_id}.csv")
 
+@app.post("/jobs/{job_id}/cancel", response_model=JobStatus)
+def cancel_job(job_id: str):
+    """
+    Cancel queued or running job
+    """
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
+@app.delete("/jobs/{job_id}")
+def delete_job(job_id: str):
+    """
+    Remove finished job including its files
+    """
+    if not jobs.delete(job_id):
+        raise HTTPException(status_code=409, detail="Job not found or not finished yet")
+    return {"deleted": job_id}
@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from aiohttp import web
+
+from limiter import HostLimiter, RateLimiter
+
+
+CODE_PATH = "/vdp/ruian/adresnimista/fulltext"
+COORDINATES_PATH = "/arcgis/rest/services/RUIAN/Vyhledavaci_sluzba_nad_daty_RUIAN/MapServer/exts/GeocodeSOE/findAddressCandidates"
+TARGETS = ('bulk', 'abulk', 'cli', 'acli')
+TASKS = {'code': 'ruian_codes', 'coordinates': 'coordinates', 'info': 'info'}
+
+
+class MockServer:
+    """
+    Local stand-in for RUIAN code API (CUZK) and coordinates API (ArcGIS) running in background thread.
+    Every API listens on its own port so they have separate rate limiting budgets as real hosts.
+    """
+
+    def __init__(self, port: int = 8750, latency: float = 0.05, jitter: float = 0.5, error_rate: float = 0.0, empty_rate: float = 0.0) -> None:
+        """
+        Args:
+            port (int, optional): Port of code API, coordinates API listens on `port + 1`. Defaults to 8750.
+            latency (float, optional): Mean latency of response in seconds. Defaults to 0.05.
+            jitter (float, optional): Latency is uniformly distributed in `latency * (1 +- jitter)`. Defaults to 0.5.
+            error_rate (float, optional): Probability of HTTP 503 response. Defaults to 0.
+            empty_rate (float, optional): Fraction of queries without result (decided by hash of query so it is stable between calls). Defaults to 0.
+        """
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.empty_rate = empty_rate
+        self.calls: Counter = Counter()
+
+    @property
+    def urls(self) -> Dict[str, str]:
+        return {'RUIAN_CODE_API_URL': f"http://127.0.0.1:{self.port}{CODE_PATH}",
+                'RUIAN_COORDINATES_API_URL': f"http://127.0.0.1:{self.port + 1}{COORDINATES_PATH}"}
+
+    def __is_empty(self, query: str) -> bool:
+        return zlib.crc32(query.encode()) / 2 ** 32 < self.empty_rate
+
+    async def __respond(self, endpoint: str) -> Optional[web.Response]:
+        self.calls[endpoint] += 1
+        await asyncio.sleep(max(0.0, random.uniform(self.latency * (1 - self.jitter), self.latency * (1 + self.jitter))))
+        if random.random() < self.error_rate:
+            return web.Response(status=503)
+        return None
+
+    async def code(self, request: web.Request) -> web.Response:
+        query = request.query.get('adresa', '')
+        error = await self.__respond('code')
+        if error is not None:
+            return error
+        items = [] if self.__is_empty(query) else [{'kod': zlib.crc32(query.encode()) % 100000000, 'nazev': query}]
+        return web.json_response({'polozky': items, 'existujiDalsiPolozky': False})
+
+    async def coordinates(self, request: web.Request) -> web.Response:
+        query = request.query.get('SingleLine', '')
+        error = await self.__respond('coordinates')
+        if error is not None:
+            return error
+        spatial_reference = {'wkid': 5514, 'latestWkid': 5514}
+        seed = zlib.crc32(query.encode())
+        candidates = [] if self.__is_empty(query) else [{'address': query, 'score': 100,
+                                                          'location': {'x': -430000.0 - seed % 400000, 'y': -930000.0 - seed % 300000, 'spatialReference': spatial_reference},
+                                                          'attributes': {'Addr_type': 'PointAddress', 'Loc_name': 'RUIAN', 'Type': 'AdresniMisto', 'City': '',
+                                                                         'Country': 'CZE', 'Match_addr': query, 'Score': 100}}]
+        return web.json_response({'spatialReference': spatial_reference, 'candidates': candidates})
+
+    def start(self) -> 'MockServer':
+        ready = threading.Event()
+
+        async def serve() -> None:
+            app = web.Application()
+            app.router.add_get(CODE_PATH, self.code)
+            app.router.add_get(COORDINATES_PATH, self.coordinates)
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, '127.0.0.1', self.port).start()
+            await web.TCPSite(runner, '127.0.0.1', self.port + 1).start()
+            ready.set()
+            await asyncio.Event().wait()
+
+        threading.Thread(target=asyncio.run, args=(serve(),), daemon=True).start()
+        ready.wait()
+        return self
+
+
+class RecordingHostLimiter(HostLimiter):
+    """
+    `HostLimiter` recording latency of every upstream call
+    """
+    latencies: List[float] = []
+
+    def release(self, latency: float, status: Optional[int]) -> None:
+        RecordingHostLimiter.latencies.append(latency)
+        super().release(latency, status)
+
+
+class RecordingRateLimiter(RateLimiter):
+    host_limiter_class = RecordingHostLimiter
+
+
+def make_addresses(rows: int, unique: float, seed: int = 0) -> List[str]:
+    """Generate synthetic addresses, `unique` fraction of them are distinct (rest are repeated)
+    """
+    rng = random.Random(seed)
+    distinct = [f"Ulice{rng.randint(1, 999)} {rng.randint(1, 3000)}/{rng.randint(1, 60)}, {rng.randint(10000, 79999)} Obec{rng.randint(1, 6000)}"
+                for _ in range(max(1, int(rows * unique)))]
+    return [distinct[i] if i < len(distinct) else rng.choice(distinct) for i in range(rows)]
+
+
+def run_in_process(args: argparse.Namespace) -> dict:
+    """Run `bulk_fetch_*` or `abulk_fetch_*` in this process (`RUIAN_*_API_URL` environment variables must be already set)
+    """
+    from cache import ResponseCache
+    from ruian import RuianFetcher
+
+    r = RuianFetcher(rate_limiter=RecordingRateLimiter(default_budget={'rate': args.rate_limit, 'max_concurrency': args.max_concurrency}),
+                     fast_decode=args.fast_decode, response_cache=ResponseCache(args.cache_path) if args.cache_path else None)
+    addresses = tuple(make_addresses(args.rows, args.unique))
+
+    start = time.perf_counter()
+    if args.run == 'bulk':
+        responses = getattr(r, f"bulk_fetch_{TASKS[args.task]}")(addresses, workers=args.workers)
+    else:
+        responses = asyncio.run(getattr(r, f"abulk_fetch_{TASKS[args.task]}")(addresses, processes=args.processes))
+    elapsed = time.perf_counter() - start
+
+    # latencies of calls made in worker processes (`--processes`) are not available
+    return {'seconds': elapsed, 'latencies': RecordingHostLimiter.latencies, 'failed': sum(res.error_msg is not None for res in responses)}
+
+
+def cli_command(args: argparse.Namespace, target: str, in_file: str, out_file: str, cache: str = '') -> List[str]:
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py'), '-if', in_file, '-cn', 'address', '-of', out_file,
+               '-rl', str(args.rate_limit), '-mc', str(args.max_concurrency)]
+    command += {'code': [], 'coordinates': ['-c'], 'info': ['-i']}[args.task]
+    command += ['-a', '-p', str(args.processes)] if target == 'acli' else ['-wk', str(args.workers)]
+    return command + (['-fd'] if args.fast_decode else []) + (['-ca', cache] if cache else [])
+
+
+def measure(command: List[str], env: Dict[str, str]) -> Dict:
+    """Run command in child process and collect its standard output, exit code, wall time and peak RSS
+    """
+    # standard error (progress bars) goes to file so child never blocks on full pipe while its standard output is read
+    with tempfile.TemporaryFile('w+') as errors:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=errors, text=True)
+        stdout = process.stdout.read()
+        process.stdout.close()
+        if hasattr(os, 'wait4'):
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            peak_rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+        else:
+            process.wait()
+            peak_rss = None
+        elapsed = time.perf_counter() - start
+        errors.seek(0)
+        stderr = errors.read()
+
+    if process.returncode != 0:
+        raise Exception(f"Command `{' '.join(command)}` failed:\n{stderr}")
+    return {'stdout': stdout, 'seconds': elapsed, 'peak_rss_mb': peak_rss}
+
+
+def benchmark(args: argparse.Namespace, server: MockServer, target: str, workdir: str) -> dict:
+    env = {**os.environ, **server.urls}
+    # with `--cache` every target is run once to fill its own cache and only the rerun is measured
+    cache = os.path.join(workdir, f"cache_{target}_{args.processes}.sqlite") if args.cache else ''
+
+    if target in ('bulk', 'abulk'):
+        command = [sys.executable, os.path.abspath(__file__), '--run', target] + [f"--{name}={value}" for name, value in vars(args).items()
+                                                                                 if name not in ('run', 'targets', 'json', 'baseline', 'fast_decode', 'cache', 'cache_path')]
+        command += (['--fast_decode'] if args.fast_decode else []) + ([f"--cache_path={cache}"] if cache else [])
+        if cache:
+            measure(command, env)
+        server.calls.clear()
+        result = measure(command, env)
+        result.update(json.loads(result['stdout'].splitlines()[-1]))
+    else:
+        in_file, out_file = os.path.join(workdir, 'input.csv'), os.path.join(workdir, f"output_{target}.csv")
+        pd.DataFrame({'address': make_addresses(args.rows, args.unique)}).to_csv(in_file, index=False)
+        command = cli_command(args, target, in_file, out_file, cache)
+        if cache:
+            measure(command, env)
+        server.calls.clear()
+        # wall time of CLI includes interpreter start-up, loading and export of data
+        result = measure(command, env)
+        result.update({'latencies': [], 'failed': int(pd.read_csv(out_file)['error_msg'].notna().sum())})
+
+    latencies = np.array(result['latencies']) * 1000
+    return {'target': target, 'task': args.task, 'processes': args.processes if target in ('abulk', 'acli') else 1, 'rows': args.rows, 'seconds': round(result['seconds'], 3), 'rows_per_second': round(args.rows / result['seconds'], 1),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 1) if latencies.size else None,
+            'p99_ms': round(float(np.percentile(latencies, 99)), 1) if latencies.size else None,
+            'calls_per_row': round(sum(server.calls.values()) / args.rows, 3), 'failed_rows': result['failed'],
+            'peak_rss_mb': round(result['peak_rss_mb'], 1) if result['peak_rss_mb'] is not None else None}
+
+
+def report(results: List[dict], baseline: Optional[List[dict]] = None) -> None:
+    baseline = {(res['target'], res['task'], res.get('processes', 1)): res for res in baseline or []}
+    columns = ['target', 'task', 'processes', 'rows', 'seconds', 'rows_per_second', 'p50_ms', 'p99_ms', 'calls_per_row', 'failed_rows', 'peak_rss_mb']
+    print("  ".join(f"{column:>15}" for column in columns) + ("  vs baseline" if baseline else ""))
+    for res in results:
+        line = "  ".join(f"{'n/a' if res[column] is None else res[column]:>15}" for column in columns)
+        if (res['target'], res['task'], res['processes']) in baseline:
+            line += f"  {res['rows_per_second'] / baseline[res['target'], res['task'], res['processes']]['rows_per_second'] - 1:+.1%} rows/s"
+        print(line)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark of `RuianFetcher` bulk methods and CLI against local mock of RUIAN code and coordinates APIs")
+    parser.add_argument("--targets", "-t", type=str, nargs='+', choices=TARGETS, help="What to benchmark: `bulk_fetch_*` (bulk), `abulk_fetch_*` (abulk), "
+                        "synchronous CLI (cli) or asynchronous CLI (acli). Defaults to all.", default=list(TARGETS))
+    parser.add_argument("--task", type=str, choices=list(TASKS), help="Type of task. Defaults to code.", default='code')
+    parser.add_argument("--rows", "-n", type=int, help="Number of input rows. Defaults to 2000.", default=2000)
+    parser.add_argument("--unique", "-u", type=float, help="Fraction of distinct addresses in input. Defaults to 0.8.", default=0.8)
+    parser.add_argument("--latency", "-l", type=float, help="Mean latency of mock APIs in seconds. Defaults to 0.05.", default=0.05)
+    parser.add_argument("--jitter", type=float, help="Relative spread of latency of mock APIs. Defaults to 0.5.", default=0.5)
+    parser.add_argument("--error_rate", "-e", type=float, help="Probability of HTTP 503 response of mock APIs. Defaults to 0.", default=0.0)
+    parser.add_argument("--empty_rate", "-em", type=float, help="Fraction of queries without result. Defaults to 0.", default=0.0)
+    parser.add_argument("--port", type=int, help="Port of mock code API (coordinates API uses next port). Defaults to 8750.", default=8750)
+    parser.add_argument("--rate_limit", "-rl", type=float, help="Rate limit per API host. Defaults to 1000.", default=1000)
+    parser.add_argument("--max_concurrency", "-mc", type=int, help="Maximal concurrency per API host. Defaults to 100.", default=100)
+    parser.add_argument("--workers", "-wk", type=int, help="Threads of synchronous targets. Defaults to 8.", default=8)
+    parser.add_argument("--processes", "-p", type=int, help="Processes of asynchronous targets. If greater than 1, asynchronous targets are also run "
+                        "with 1 process for comparison and benchmark fails if sharding makes more upstream calls per row. Defaults to 1.", default=1)
+    parser.add_argument("--fast_decode", "-fd", action='store_true', help="Enable `--fast_decode` of `RuianFetcher`.")
+    parser.add_argument("--cache", "-ca", action='store_true', help="Measure cache-heavy rerun: every target is run once to fill response cache "
+                        "(in temporary directory) and only the second run is measured.")
+    parser.add_argument("--json", "-j", type=str, help="Path where results are saved as JSON (e.g. to be used as `--baseline` later).", default="")
+    parser.add_argument("--baseline", "-b", type=str, help="Path to JSON results of previous run to compare throughput with (same target and task).", default="")
+    parser.add_argument("--run", type=str, choices=('bulk', 'abulk'), help=argparse.SUPPRESS, default="")
+    parser.add_argument("--cache_path", type=str, help=argparse.SUPPRESS, default="")
+    args = parser.parse_args()
+
+    if args.run:
+        # child process of benchmark, result is passed to parent as last line of standard output
+        print(json.dumps(run_in_process(args)))
+        sys.exit(0)
+
+    server = MockServer(args.port, args.latency, args.jitter, args.error_rate, args.empty_rate).start()
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [benchmark(args, server, target, workdir) for target in args.targets]
+
+    # sharding must not break deduplication i.e. more processes must not make more upstream calls per row
+    sharded = [res for res in results if res['target'] in ('abulk', 'acli')]
+    if args.processes > 1 and sharded:
+        single = argparse.Namespace(**{**vars(args), 'processes': 1})
+        with tempfile.TemporaryDirectory() as workdir:
+            references = {res['target']: benchmark(single, server, res['target'], workdir) for res in sharded}
+        regressions = [f"{res['target']}: {res['calls_per_row']} calls/row with {args.processes} processes vs {references[res['target']]['calls_per_row']} with 1"
+                       for res in sharded if res['calls_per_row'] > references[res['target']]['calls_per_row']]
+        results += list(references.values())
+        if regressions:
+            report(results)
+            sys.exit("Sharding made more upstream calls per row:\n" + "\n".join(regressions))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
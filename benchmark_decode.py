@@ -0,0 +1,61 @@
+import argparse
+import json
+import timeit
+
+from data_models import RuianCodeApiResponse, CoordinatesAPIResponse, ApiResponse
+from decoder import decode_response, decode_api_response, orjson
+
+
+def code_payload(items: int) -> str:
+    return json.dumps({'polozky': [{'kod': 21711925 + i, 'nazev': f"Dlouhá {741 + i}/13, Staré Město, 11000 Praha 1"} for i in range(items)],
+                       'existujiDalsiPolozky': False}, ensure_ascii=False)
+
+
+def coordinates_payload(candidates: int) -> str:
+    spatial_reference = {'wkid': 5514, 'latestWkid': 5514}
+    return json.dumps({'spatialReference': spatial_reference,
+                       'candidates': [{'address': f"Dlouhá {741 + i}/13, Staré Město, 11000 Praha 1",
+                                       'location': {'x': -742864.15 + i, 'y': -1042772.21 - i, 'spatialReference': spatial_reference},
+                                       'score': 100,
+                                       'attributes': {'Addr_type': 'PointAddress', 'Loc_name': 'RUIAN', 'Type': 'AdresniMisto', 'City': 'Praha',
+                                                      'Country': 'CZE', 'Match_addr': f"Dlouhá {741 + i}/13, Staré Město, 11000 Praha 1", 'Score': 100}}
+                                      for i in range(candidates)]}, ensure_ascii=False)
+
+
+def report(name: str, number: int, **variants) -> None:
+    print(f"{name}:")
+    baseline = None
+    for label, func in variants.items():
+        seconds = min(timeit.repeat(func, number=number, repeat=3))
+        baseline = baseline or seconds
+        print(f"  {label:<36} {seconds / number * 1e6:9.1f} us/decode  {baseline / seconds:5.1f}x")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark of decoding of API responses: current pydantic decoding vs `decoder` module")
+    parser.add_argument("--number", "-n", type=int, help="Number of decodes per measurement. Defaults to 5000.", default=5000)
+    parser.add_argument("--candidates", "-c", type=int, help="Number of match candidates in one response. Defaults to 3.", default=3)
+    args = parser.parse_args()
+
+    print(f"orjson: {'installed' if orjson is not None else 'not installed (standard json is used)'}")
+
+    code = code_payload(args.candidates).encode()
+    coordinates = coordinates_payload(args.candidates).encode()
+
+    report("ruian code API response", args.number,
+           **{'json + model(**data) (default)': lambda: RuianCodeApiResponse(**json.loads(code)),
+              'model_construct (shallow, unusable)': lambda: RuianCodeApiResponse.model_construct(**json.loads(code)),
+              'decode_response (--fast_decode)': lambda: decode_response(RuianCodeApiResponse, code)})
+
+    report("coordinates API response", args.number,
+           **{'json + model(**data) (default)': lambda: CoordinatesAPIResponse(**json.loads(coordinates)),
+              'model_construct (shallow, unusable)': lambda: CoordinatesAPIResponse.model_construct(**json.loads(coordinates)),
+              'decode_response (--fast_decode)': lambda: decode_response(CoordinatesAPIResponse, coordinates)})
+
+    for name, response in (('code', RuianCodeApiResponse.model_validate_json(code)), ('coordinates', CoordinatesAPIResponse.model_validate_json(coordinates))):
+        cached = ApiResponse(response=response).model_dump_json()
+        assert decode_api_response(cached) == ApiResponse.model_validate_json(cached)
+        report(f"cached {name} ApiResponse (cache/journal replay)", args.number,
+               **{'ApiResponse.model_validate_json': lambda: ApiResponse.model_validate_json(cached),
+                  'decode_api_response': lambda: decode_api_response(cached)})
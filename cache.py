@@ -0,0 +1,237 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from typing import Any, Hashable, Optional, Dict
+
+from data_models import ApiResponse
+from decoder import decode_api_response
+
+
+class ResponseCache:
+    """
+    Persistent cache of API responses backed by SQLite database in WAL mode.
+    Responses are keyed by endpoint name and cleaned address string.
+    Addresses known to return no results are kept separately (negative cache) with own TTL.
+    """
+
+    def __init__(self, path: str = 'ruian_cache.sqlite', ttl: Optional[float] = 30 * 24 * 3600, max_entries: Optional[int] = 1_000_000,
+                 evict_every: int = 1000, negative_ttl: Optional[float] = 24 * 3600) -> None:
+        """
+        Args:
+            path (str, optional): Path to SQLite database file. Defaults to 'ruian_cache.sqlite'.
+            ttl (float, optional): Time to live of cached response in seconds. `None` means no expiration. Defaults to 30 days.
+            max_entries (int, optional): Maximal number of cached responses. Oldest responses are evicted first.
+                `None` means no limit. Defaults to 1 000 000.
+            evict_every (int, optional): Eviction is run after every `evict_every` insertions. Defaults to 1000.
+            negative_ttl (float, optional): Time to live of record of address without results in seconds. `None` means no expiration.
+                Defaults to 1 day.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self.negative_ttl = negative_ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+
+        self.__inserts = 0
+        self.__lock = threading.Lock()
+        self.__connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self.__connection is None:
+            self.__connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("PRAGMA synchronous=NORMAL")
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS responses ("
+                                      "endpoint TEXT NOT NULL, "
+                                      "address TEXT NOT NULL, "
+                                      "payload TEXT NOT NULL, "
+                                      "created_at REAL NOT NULL, "
+                                      "PRIMARY KEY (endpoint, address)) WITHOUT ROWID")
+            self.__connection.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS empty_responses ("
+                                      "endpoint TEXT NOT NULL, "
+                                      "address TEXT NOT NULL, "
+                                      "created_at REAL NOT NULL, "
+                                      "PRIMARY KEY (endpoint, address)) WITHOUT ROWID")
+            self.__connection.commit()
+        return self.__connection
+
+    def get(self, endpoint: str, address: str) -> Optional[ApiResponse]:
+        """Get cached response
+
+        Args:
+            endpoint (str): name of endpoint e.g. `code` or `coordinates`
+            address (str): address string
+
+        Returns:
+            Optional[ApiResponse]: Cached response or None if there is no valid record
+        """
+        with self.__lock:
+            row = self.connection.execute("SELECT payload, created_at FROM responses WHERE endpoint = ? AND address = ?",
+                                          (endpoint, address)).fetchone()
+
+            if row is None or (self.ttl is not None and time.time() - row[1] > self.ttl):
+                self.misses += 1
+                return None
+
+            self.hits += 1
+        return decode_api_response(row[0])
+
+    def set(self, endpoint: str, address: str, response: ApiResponse) -> None:
+        """Store response in cache
+
+        Args:
+            endpoint (str): name of endpoint e.g. `code` or `coordinates`
+            address (str): address string
+            response (ApiResponse): response to be cached
+        """
+        with self.__lock:
+            self.connection.execute("INSERT OR REPLACE INTO responses (endpoint, address, payload, created_at) VALUES (?, ?, ?, ?)",
+                                    (endpoint, address, response.model_dump_json(), time.time()))
+            self.connection.commit()
+            self.__inserts += 1
+            run_eviction = self.__inserts % self.evict_every == 0
+
+        if run_eviction:
+            self.evict()
+
+    def is_empty(self, endpoint: str, address: str) -> bool:
+        """Check whether address is known to return no results
+
+        Args:
+            endpoint (str): name of endpoint e.g. `code` or `coordinates`
+            address (str): address string
+
+        Returns:
+            bool: True if there is valid record of empty response
+        """
+        with self.__lock:
+            row = self.connection.execute("SELECT created_at FROM empty_responses WHERE endpoint = ? AND address = ?",
+                                          (endpoint, address)).fetchone()
+
+            if row is None or (self.negative_ttl is not None and time.time() - row[0] > self.negative_ttl):
+                return False
+
+            self.negative_hits += 1
+        return True
+
+    def set_empty(self, endpoint: str, address: str) -> None:
+        """Record that address returned no results
+
+        Args:
+            endpoint (str): name of endpoint e.g. `code` or `coordinates`
+            address (str): address string
+        """
+        with self.__lock:
+            self.connection.execute("INSERT OR REPLACE INTO empty_responses (endpoint, address, created_at) VALUES (?, ?, ?)",
+                                    (endpoint, address, time.time()))
+            self.connection.commit()
+            self.__inserts += 1
+            run_eviction = self.__inserts % self.evict_every == 0
+
+        if run_eviction:
+            self.evict()
+
+    def evict(self) -> None:
+        """Remove expired responses and oldest responses exceeding `max_entries`
+        """
+        with self.__lock:
+            if self.negative_ttl is not None:
+                self.connection.execute("DELETE FROM empty_responses WHERE created_at < ?", (time.time() - self.negative_ttl,))
+            if self.ttl is not None:
+                self.connection.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+            if self.max_entries is not None:
+                count = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                if count > self.max_entries:
+                    self.connection.execute("DELETE FROM responses WHERE (endpoint, address) IN "
+                                            "(SELECT endpoint, address FROM responses ORDER BY created_at LIMIT ?)", (count - self.max_entries,))
+            self.connection.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters of cache
+
+        Returns:
+            Dict[str, float]: dictionary with `hits`, `misses`, `hit_rate` and `negative_hits`
+        """
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0, 'negative_hits': self.negative_hits}
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__connection is not None:
+                self.__connection.close()
+                self.__connection = None
+
+    def __getstate__(self) -> dict:
+        # connection and lock can not be pickled, they are recreated lazily
+        state = self.__dict__.copy()
+        state['_ResponseCache__connection'] = None
+        del state['_ResponseCache__lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+
+class MemoryCache:
+    """
+    Bounded in-memory cache with least recently used eviction (e.g. memo of fallback variants within bulk job)
+    so memory does not grow with size of input
+    """
+
+    def __init__(self, max_entries: int = 10000) -> None:
+        """
+        Args:
+            max_entries (int, optional): Maximal number of entries, least recently used entries are evicted first. Defaults to 10 000.
+        """
+        self.max_entries = max_entries
+        self.__entries: OrderedDict = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get value of key and mark it as recently used
+
+        Args:
+            key (Hashable): key of entry
+
+        Returns:
+            Optional[Any]: value or None if key is not present
+        """
+        with self.__lock:
+            if key not in self.__entries:
+                return None
+            self.__entries.move_to_end(key)
+            return self.__entries[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value of key and evict least recently used entries over `max_entries`
+
+        Args:
+            key (Hashable): key of entry
+            value (Any): value
+        """
+        with self.__lock:
+            self.__entries[key] = value
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state['_MemoryCache__lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
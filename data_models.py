@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Literal, Optional
 
 class RuianCodeItem(BaseModel):
     kod: int
@@ -37,6 +38,49 @@ class CoordinatesAPIResponse(BaseModel):
     spatialReference: SpatialReference
     candidates: List[Candidate]
 
+class InfoApiResponse(BaseModel):
+    code: Optional[RuianCodeApiResponse]
+    coordinates: Optional[CoordinatesAPIResponse]
+
 class ApiResponse(BaseModel):
-    response: Optional[CoordinatesAPIResponse | RuianCodeApiResponse] = None
+    response: Optional[CoordinatesAPIResponse | RuianCodeApiResponse | InfoApiResponse] = None
     error_msg: Optional[str] = None
+    status: Optional[int] = None  # HTTP status code of upstream response (None if request failed or was not sent)
+    transient: bool = False  # error is temporary (HTTP 429/5xx, timeout, connection error) and the same request may succeed later
+    retry_after: Optional[float] = None  # seconds to wait before repeating request as requested by upstream (`Retry-After` header)
+
+class JobReport(BaseModel):
+    rows: int = 0
+    resumed_rows: int = 0  # rows restored from journal of previous (interrupted) run
+    skipped_rows: int = 0  # rows without usable address (empty, missing or junk) which were not requested
+    unique_addresses: int = 0
+    saved_calls: int = 0  # lookups skipped thanks to deduplication (each lookup is at least one upstream call)
+    finished_rows: int = 0  # rows with final response so far (including resumed rows)
+
+class ParsedAddress(BaseModel):
+    street: Optional[str] = None  # street or (in addresses without streets) name of village/part
+    number: Optional[str] = None  # house number as written e.g. `12`, `293/13`, `12a`, `č.ev. 5`
+    psc: Optional[str] = None  # postal code formatted as `120 00`
+    part: Optional[str] = None  # part of municipality e.g. `Nové Město`
+    municipality: Optional[str] = None  # e.g. `Praha 2`
+
+class BatchRequest(BaseModel):
+    addresses: List[str] = Field(min_length=1, max_length=10000)
+    task: Literal['code', 'coordinates', 'info'] = 'code'  # `info` = both ruian code and coordinates
+    window: int = Field(default=100, ge=1, le=500)  # maximal number of lookups in flight
+
+class BatchResult(BaseModel):
+    index: int  # position of address in `BatchRequest.addresses`
+    address: str
+    result: ApiResponse
+
+class JobStatus(BaseModel):
+    job_id: str
+    task: Literal['code', 'coordinates', 'info']
+    state: Literal['queued', 'running', 'done', 'failed', 'cancelled'] = 'queued'
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    report: JobReport = JobReport()  # progress of running job (`rows` grows as input is read)
+    error: Optional[str] = None
+    result: Optional[str] = None  # url of result file (if exported to file) once job is done
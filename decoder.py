@@ -0,0 +1,69 @@
+import json
+
+from typing import Any, Dict, Type, Union
+
+from data_models import RuianCodeApiResponse, CoordinatesAPIResponse, InfoApiResponse, ApiResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency, standard json is used instead
+    orjson = None
+
+
+def loads(payload: Union[str, bytes]) -> Any:
+    """Parse JSON payload using `orjson` if installed
+
+    Args:
+        payload (Union[str, bytes]): JSON document
+
+    Returns:
+        Any: parsed document
+    """
+    return orjson.loads(payload) if orjson is not None else json.loads(payload)
+
+
+def decode_response(model: Type[Union[RuianCodeApiResponse, CoordinatesAPIResponse, InfoApiResponse]],
+                    payload: Union[str, bytes]) -> Union[RuianCodeApiResponse, CoordinatesAPIResponse, InfoApiResponse]:
+    """Decode raw response of API into given model in single pass of pydantic-core
+       (without intermediate python dictionary and keyword arguments)
+
+    Args:
+        model (Type[Union[RuianCodeApiResponse, CoordinatesAPIResponse, InfoApiResponse]]): response model
+        payload (Union[str, bytes]): JSON document
+
+    Returns:
+        Union[RuianCodeApiResponse, CoordinatesAPIResponse, InfoApiResponse]: response model
+    """
+    return model.model_validate_json(payload)
+
+
+def response_model(data: Dict) -> Type[Union[RuianCodeApiResponse, CoordinatesAPIResponse, InfoApiResponse]]:
+    """Derive model of serialized inner response from its keys
+
+    Args:
+        data (Dict): parsed inner response of `ApiResponse`
+
+    Returns:
+        Type[Union[RuianCodeApiResponse, CoordinatesAPIResponse, InfoApiResponse]]: response model
+    """
+    if 'polozky' in data:
+        return RuianCodeApiResponse
+    if 'candidates' in data:
+        return CoordinatesAPIResponse
+    return InfoApiResponse
+
+
+def decode_api_response(payload: Union[str, bytes]) -> ApiResponse:
+    """Decode serialized `ApiResponse` (e.g. from cache or job journal). Inner response is validated directly
+       as model derived from its keys so members of `ApiResponse.response` union are not tried one by one
+
+    Args:
+        payload (Union[str, bytes]): JSON document created by `ApiResponse.model_dump_json`
+
+    Returns:
+        ApiResponse: response
+    """
+    data = loads(payload)
+    response = data.pop('response', None)
+
+    return ApiResponse(response=response_model(response).model_validate(response) if response is not None else None, **data)
@@ -0,0 +1,201 @@
+import asyncio
+import copy
+import os
+import shutil
+import uuid
+from datetime import datetime
+
+from typing import Dict, List, Optional, Set
+
+from data_models import JobReport, JobStatus
+from ruian import RuianFetcher
+
+
+class JobQueue:
+    """
+    Queue of background bulk jobs processed by bounded pool of workers. Every job runs `apipeline_fetch_*` (streaming, bounded memory)
+    in own thread with own event loop on copy of given fetcher, so all jobs share one rate limiter (upstream budget),
+    cache, offline index and metrics of that fetcher while long jobs do not block event loop of caller
+    """
+
+    def __init__(self, fetcher: RuianFetcher, directory: str = 'jobs', workers: int = 2, chunk_size: int = 10000, window: int = 100) -> None:
+        """
+        Args:
+            fetcher (RuianFetcher): fetcher whose rate limiter, cache, index and metrics are shared by all jobs
+            directory (str, optional): Directory where inputs, journals and results of jobs are stored. Defaults to 'jobs'.
+            workers (int, optional): Maximal number of jobs running at once. Defaults to 2.
+            chunk_size (int, optional): Number of rows read and written at once by every job. Defaults to 10000.
+            window (int, optional): Maximal number of requests in flight of every job. Defaults to 100.
+        """
+        self.fetcher = fetcher
+        self.directory = directory
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.window = window
+
+        self.__jobs: Dict[str, JobStatus] = {}
+        self.__params: Dict[str, dict] = {}  # arguments of `apipeline_fetch_*` of every job
+        self.__fetchers: Dict[str, RuianFetcher] = {}  # fetchers of running jobs (source of progress)
+        self.__running: Dict[str, asyncio.Task] = {}  # main tasks of running jobs (living in event loops of worker threads)
+        self.__cancelled: Set[str] = set()
+        self.__queue: Optional[asyncio.Queue] = None
+        self.__workers: List[asyncio.Task] = []
+
+    def job_directory(self, job_id: str) -> str:
+        return os.path.join(self.directory, job_id)
+
+    def result_path(self, job_id: str) -> str:
+        return os.path.join(self.job_directory(job_id), 'result.csv')
+
+    async def start(self) -> None:
+        """Start pool of workers in running event loop
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.__queue = asyncio.Queue()
+        self.__workers = [asyncio.create_task(self.__work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Cancel running jobs and stop pool of workers
+        """
+        for job_id in list(self.__running):
+            self.cancel(job_id)
+        for worker in self.__workers:
+            worker.cancel()
+        await asyncio.gather(*self.__workers, return_exceptions=True)
+
+    def submit(self, task: str, column_name: str, in_file: str = '', server: str = '', db: str = '', in_table: str = '', out_table: str = '',
+               key_column: str = '', job_id: Optional[str] = None) -> JobStatus:
+        """Enqueue new job. Input is file (csv/excel) or table of MS SQL database (same as in `RuianFetcher.apipeline_fetch_*`).
+           Result is written into `out_table` if provided otherwise into csv file in job directory
+
+        Args:
+            task (str): one of 'code', 'coordinates', 'info'
+            column_name (str): Name of column where are addresses
+            in_file (str, optional): Path to input file. Defaults to ''.
+            server (str, optional): Name of server in local network. Defaults to ''.
+            db (str, optional): Name of MS SQL database. Defaults to ''.
+            in_table (str, optional): Name of input table. Defaults to ''.
+            out_table (str, optional): Name of output table. Defaults to '' i.e. result is written into file.
+            key_column (str, optional): Name of column identifying rows of `in_table`. If provided, table is read in chunks
+                and results are upserted into `out_table` chunk by chunk. Defaults to ''.
+            job_id (str, optional): Id of job (e.g. when input was already stored in `job_directory(job_id)`). Defaults to new random id.
+
+        Returns:
+            JobStatus: status of enqueued job
+        """
+        job_id = job_id or uuid.uuid4().hex
+        os.makedirs(self.job_directory(job_id), exist_ok=True)
+
+        self.__jobs[job_id] = JobStatus(job_id=job_id, task=task, created_at=datetime.now())
+        self.__params[job_id] = {'in_file': in_file, 'server': server, 'db': db, 'in_table': in_table, 'column_name': column_name,
+                                 'out_file': '' if out_table else self.result_path(job_id), 'out_table': out_table,
+                                 'chunk_size': self.chunk_size, 'window': self.window, 'key_column': key_column,
+                                 'journal': os.path.join(self.job_directory(job_id), 'job.journal')}
+        self.__queue.put_nowait(job_id)
+        return self.__jobs[job_id]
+
+    def status(self, job_id: str) -> Optional[JobStatus]:
+        """Get status of job including progress of running job
+
+        Args:
+            job_id (str): id of job
+
+        Returns:
+            Optional[JobStatus]: status of job or None if job does not exist
+        """
+        job = self.__jobs.get(job_id)
+        if job is not None and job_id in self.__fetchers:
+            job.report = self.__fetchers[job_id].job_report.model_copy()
+        return job
+
+    def jobs(self) -> List[JobStatus]:
+        return [self.status(job_id) for job_id in self.__jobs]
+
+    def cancel(self, job_id: str) -> Optional[JobStatus]:
+        """Cancel queued or running job
+
+        Args:
+            job_id (str): id of job
+
+        Returns:
+            Optional[JobStatus]: status of job or None if job does not exist
+        """
+        job = self.__jobs.get(job_id)
+        if job is None:
+            return None
+        if job.state == 'queued':
+            job.state, job.finished_at = 'cancelled', datetime.now()
+        elif job.state == 'running':
+            self.__cancelled.add(job_id)
+            task = self.__running.get(job_id)
+            if task is not None:
+                task.get_loop().call_soon_threadsafe(task.cancel)
+        return job
+
+    def delete(self, job_id: str) -> bool:
+        """Remove finished job and its files
+
+        Args:
+            job_id (str): id of job
+
+        Returns:
+            bool: whether job was removed (running or queued jobs are not removed)
+        """
+        job = self.__jobs.get(job_id)
+        if job is None or job.state in ('queued', 'running'):
+            return False
+        del self.__jobs[job_id], self.__params[job_id]
+        shutil.rmtree(self.job_directory(job_id), ignore_errors=True)
+        return True
+
+    async def __work(self) -> None:
+        while True:
+            job_id = await self.__queue.get()
+            job = self.__jobs.get(job_id)
+            if job is None or job.state != 'queued':  # cancelled while queued
+                continue
+
+            # every job has own copy of fetcher (own job report, journal and memo) sharing rate limiter, cache, index and metrics
+            fetcher = copy.copy(self.fetcher)
+            fetcher.flights = {}
+            self.__fetchers[job_id] = fetcher
+            job.state, job.started_at = 'running', datetime.now()
+            try:
+                report = await asyncio.to_thread(self.__run, job_id, fetcher)
+                if report is None:
+                    job.report, job.state = fetcher.job_report, 'cancelled'
+                else:
+                    job.report, job.state = report, 'done'
+                    if self.__params[job_id]['out_file']:
+                        job.result = f"/jobs/{job_id}/result"
+            except asyncio.CancelledError:
+                job.state = 'cancelled'
+                raise
+            except Exception as e:
+                job.report, job.state, job.error = fetcher.job_report, 'failed', str(e)
+            finally:
+                job.finished_at = datetime.now()
+                self.__fetchers.pop(job_id, None)
+                self.__cancelled.discard(job_id)
+
+    def __run(self, job_id: str, fetcher: RuianFetcher) -> Optional[JobReport]:
+        """Run job in event loop of current (worker) thread
+
+        Returns:
+            Optional[JobReport]: report of job or None if job was cancelled
+        """
+        job = self.__jobs[job_id]
+        pipeline = {'code': fetcher.apipeline_fetch_ruian_codes, 'coordinates': fetcher.apipeline_fetch_coordinates, 'info': fetcher.apipeline_fetch_info}[job.task]
+
+        async def main() -> Optional[JobReport]:
+            self.__running[job_id] = asyncio.current_task()
+            try:
+                if job_id in self.__cancelled:  # cancelled before task was registered
+                    return None
+                return await pipeline(**self.__params[job_id])
+            except asyncio.CancelledError:
+                return None
+            finally:
+                self.__running.pop(job_id, None)
+
+        return asyncio.run(main())
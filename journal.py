@@ -0,0 +1,106 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+from typing import Dict, Iterable
+
+from data_models import ApiResponse
+from decoder import decode_api_response
+
+
+class JobJournal:
+    """
+    Append-only journal of finished rows of bulk job backed by SQLite database.
+    Rows are keyed by row index and hash of cleaned address, responses are stored once per address hash
+    so interrupted job can be resumed by skipping already finished rows.
+    """
+
+    def __init__(self, path: str, resume: bool = False, commit_every: int = 100) -> None:
+        """
+        Args:
+            path (str): Path to SQLite journal file
+            resume (bool, optional): Whether keep records of previous run. If False journal is cleared. Defaults to False.
+            commit_every (int, optional): Records are committed after every `commit_every` responses. Defaults to 100.
+        """
+        self.path = path
+        self.commit_every = commit_every
+
+        if not resume:
+            for file in (path, f'{path}-wal', f'{path}-shm'):
+                if os.path.exists(file):
+                    os.remove(file)
+
+        self.__pending = 0
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS responses (address_hash TEXT PRIMARY KEY, payload TEXT NOT NULL)")
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS rows (row_index INTEGER PRIMARY KEY, address_hash TEXT NOT NULL)")
+        self.__connection.commit()
+
+    @staticmethod
+    def address_hash(address: str) -> str:
+        return hashlib.blake2b(address.encode('utf-8'), digest_size=12).hexdigest()
+
+    def record(self, row_indices: Iterable[int], address: str, response: ApiResponse) -> None:
+        """Record response of address and mark rows with this address as finished
+
+        Args:
+            row_indices (Iterable[int]): indices of rows containing `address`
+            address (str): cleaned address string
+            response (ApiResponse): response for `address`
+        """
+        address_hash = self.address_hash(address)
+        with self.__lock:
+            self.__connection.execute("INSERT OR REPLACE INTO responses (address_hash, payload) VALUES (?, ?)",
+                                      (address_hash, response.model_dump_json()))
+            self.__connection.executemany("INSERT OR REPLACE INTO rows (row_index, address_hash) VALUES (?, ?)",
+                                          ((int(i), address_hash) for i in row_indices))
+            self.__pending += 1
+            if self.__pending >= self.commit_every:
+                self.__connection.commit()
+                self.__pending = 0
+
+    def restore(self, row_indices: Iterable[int], addresses: Iterable[str]) -> Dict[int, ApiResponse]:
+        """Get responses of rows finished in previous run. Row is finished only if it was recorded with the same address
+
+        Args:
+            row_indices (Iterable[int]): indices of rows
+            addresses (Iterable[str]): cleaned address string of every row
+
+        Returns:
+            Dict[int, ApiResponse]: responses of finished rows keyed by row index
+        """
+        row_indices = [int(i) for i in row_indices]
+        if not row_indices:
+            return {}
+
+        with self.__lock:
+            finished = {row_index: (address_hash, payload) for row_index, address_hash, payload in
+                        self.__connection.execute("SELECT rows.row_index, rows.address_hash, responses.payload "
+                                                  "FROM rows JOIN responses ON rows.address_hash = responses.address_hash "
+                                                  "WHERE rows.row_index BETWEEN ? AND ?", (min(row_indices), max(row_indices)))}
+        restored = {}
+        responses = {}
+        for row_index, address in zip(row_indices, addresses):
+            if row_index not in finished:
+                continue
+            address_hash, payload = finished[row_index]
+            if address_hash == self.address_hash(address):
+                if address_hash not in responses:
+                    responses[address_hash] = decode_api_response(payload)
+                restored[row_index] = responses[address_hash]
+        return restored
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__connection.commit()
+            self.__connection.close()
+
+    def __enter__(self) -> 'JobJournal':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,292 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from typing import Optional, Dict, Deque, Tuple, Type
+
+
+DEFAULT_RATE = 10.0
+DEFAULT_INITIAL_CONCURRENCY = 5
+DEFAULT_MAX_CONCURRENCY = 50
+
+
+class TokenBucket:
+    """
+    Token bucket limiting rate of requests. Usable from both threads and coroutines.
+    """
+
+    def __init__(self, rate: float = 10.0, capacity: Optional[float] = None) -> None:
+        """
+        Args:
+            rate (float, optional): Number of tokens (requests) added per second. Defaults to 10.
+            capacity (float, optional): Maximal number of tokens i.e. size of burst. Defaults to `rate`.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.__tokens = self.capacity
+        self.__updated_at = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Reserve one token
+
+        Returns:
+            float: Number of seconds caller has to wait before the reserved token becomes available
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.capacity, self.__tokens + (now - self.__updated_at) * self.rate)
+            self.__updated_at = now
+            self.__tokens -= 1
+            return 0.0 if self.__tokens >= 0 else -self.__tokens / self.rate
+
+    def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state['_TokenBucket__lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.__updated_at = time.monotonic()
+        self.__lock = threading.Lock()
+
+
+class AIMDConcurrency:
+    """
+    Concurrency limit with additive increase / multiplicative decrease (AIMD) adjustment.
+    Limit grows by `increase` after `limit` consecutive healthy responses and is multiplied by `decrease`
+    on error (HTTP 429/5xx, timeout or connection error) or too slow response.
+    Usable from both threads and coroutines.
+    """
+
+    def __init__(self, initial: int = 5, minimum: int = 1, maximum: int = 50, increase: float = 1.0, decrease: float = 0.5,
+                 latency_target: float = 2.0) -> None:
+        """
+        Args:
+            initial (int, optional): Initial concurrency limit. Defaults to 5.
+            minimum (int, optional): Minimal concurrency limit. Defaults to 1.
+            maximum (int, optional): Maximal concurrency limit. Defaults to 50.
+            increase (float, optional): Additive increase of limit. Defaults to 1.
+            decrease (float, optional): Multiplicative decrease of limit. Defaults to 0.5.
+            latency_target (float, optional): Responses slower than `latency_target` seconds are considered unhealthy. Defaults to 2.
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+
+        self.__limit = float(initial)
+        self.__in_flight = 0
+        self.__healthy_streak = 0
+        self.__last_decrease = 0.0
+
+        self.__condition = threading.Condition()
+        self.__waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    @property
+    def limit(self) -> int:
+        return max(self.minimum, int(self.__limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self.__in_flight
+
+    def __try_enter(self) -> bool:
+        if self.__in_flight < self.limit:
+            self.__in_flight += 1
+            return True
+        return False
+
+    def __wake_up(self) -> None:
+        # must be called with condition acquired, wakes up only as many waiters as there are free slots
+        free = self.limit - self.__in_flight
+        if free <= 0:
+            return
+        self.__condition.notify(free)
+        while free > 0 and self.__waiters:
+            loop, future = self.__waiters.popleft()
+            if not future.done():
+                loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+                free -= 1
+
+    def acquire(self) -> None:
+        with self.__condition:
+            while not self.__try_enter():
+                self.__condition.wait()
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.__condition:
+                if self.__try_enter():
+                    return
+                future = loop.create_future()
+                self.__waiters.append((loop, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                # pass the wake up call to another waiter so free slot is not lost
+                with self.__condition:
+                    self.__wake_up()
+                raise
+
+    def abandon(self) -> None:
+        """Release slot without adjusting limit e.g. when request was cancelled before it was sent
+        """
+        with self.__condition:
+            self.__in_flight -= 1
+            self.__wake_up()
+
+    def release(self, latency: float, status: Optional[int]) -> None:
+        """Release slot and adjust limit based on outcome of request
+
+        Args:
+            latency (float): duration of request in seconds
+            status (Optional[int]): HTTP status code of response. `None` in case of timeout/connection error
+        """
+        with self.__condition:
+            self.__in_flight -= 1
+
+            failed = status is None or status == 429 or status >= 500
+            if failed or latency > self.latency_target:
+                self.__healthy_streak = 0
+                now = time.monotonic()
+                # decrease at most once per `latency_target` so burst of errors from the same window does not collapse limit
+                if now - self.__last_decrease > self.latency_target:
+                    self.__limit = max(self.minimum, self.__limit * self.decrease)
+                    self.__last_decrease = now
+            else:
+                self.__healthy_streak += 1
+                if self.__healthy_streak >= self.limit:
+                    self.__limit = min(self.maximum, self.__limit + self.increase)
+                    self.__healthy_streak = 0
+
+            self.__wake_up()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state['_AIMDConcurrency__condition']
+        del state['_AIMDConcurrency__waiters']
+        state['_AIMDConcurrency__in_flight'] = 0
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.__condition = threading.Condition()
+        self.__waiters = deque()
+
+
+class HostLimiter:
+    """
+    Limiter of requests to one upstream host combining `TokenBucket` (rate) and `AIMDConcurrency` (concurrency)
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: Optional[float] = None, initial_concurrency: int = DEFAULT_INITIAL_CONCURRENCY,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, latency_target: float = 2.0) -> None:
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AIMDConcurrency(initial=initial_concurrency, maximum=max_concurrency, latency_target=latency_target)
+
+    def acquire(self) -> None:
+        self.concurrency.acquire()
+        self.bucket.acquire()
+
+    async def aacquire(self) -> None:
+        await self.concurrency.aacquire()
+        try:
+            await self.bucket.aacquire()
+        except asyncio.CancelledError:
+            self.concurrency.abandon()
+            raise
+
+    def release(self, latency: float, status: Optional[int]) -> None:
+        self.concurrency.release(latency, status)
+
+    def abandon(self) -> None:
+        self.concurrency.abandon()
+
+
+class RateLimiter:
+    """
+    Registry of `HostLimiter` objects so every upstream host has its own budget
+    """
+    host_limiter_class: Type[HostLimiter] = HostLimiter
+
+    def __init__(self, budgets: Optional[Dict[str, dict]] = None, default_budget: Optional[dict] = None) -> None:
+        """
+        Args:
+            budgets (Dict[str, dict], optional): Keyword arguments of `HostLimiter` for given host name e.g.
+                `{'vdp.cuzk.cz': {'rate': 10}}`. Defaults to None.
+            default_budget (dict, optional): Keyword arguments of `HostLimiter` for hosts not present in `budgets`. Defaults to None.
+        """
+        self.budgets = budgets or {}
+        self.default_budget = default_budget or {}
+        self.__limiters: Dict[str, HostLimiter] = {}
+        self.__lock = threading.Lock()
+
+    def for_url(self, url: str) -> HostLimiter:
+        """Get limiter of host given by url
+
+        Args:
+            url (str): url of request
+
+        Returns:
+            HostLimiter: limiter for host of `url`
+        """
+        host = urlparse(url).netloc
+        with self.__lock:
+            if host not in self.__limiters:
+                self.__limiters[host] = self.host_limiter_class(**self.budgets.get(host, self.default_budget))
+            return self.__limiters[host]
+
+    def scaled(self, fraction: float) -> 'RateLimiter':
+        """Create new limiter with every budget scaled by `fraction`.
+           Used to divide budget among consumers which do not share limiter state
+
+        Args:
+            fraction (float): share of every budget e.g. 0.5
+
+        Returns:
+            RateLimiter: limiter with `fraction` of every budget
+        """
+        def share(budget: dict) -> dict:
+            return {**budget,
+                    'rate': budget.get('rate', DEFAULT_RATE) * fraction,
+                    'initial_concurrency': max(1, int(budget.get('initial_concurrency', DEFAULT_INITIAL_CONCURRENCY) * fraction)),
+                    'max_concurrency': max(1, int(budget.get('max_concurrency', DEFAULT_MAX_CONCURRENCY) * fraction)),
+                    **({'burst': budget['burst'] * fraction} if budget.get('burst') is not None else {})}
+
+        return type(self)({host: share(budget) for host, budget in self.budgets.items()}, share(self.default_budget))
+
+    def split(self, parts: int) -> 'RateLimiter':
+        """Create new limiter with every budget divided into `parts` equal shares.
+           Used when one job runs in multiple processes which can not share limiter state
+
+        Args:
+            parts (int): number of shares
+
+        Returns:
+            RateLimiter: limiter with `1/parts` of every budget
+        """
+        return self.scaled(1 / parts)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state['_RateLimiter__lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
@@ -2,7 +2,13 @@ import argparse
 import os
 import logging
 import asyncio
+import json
+import time
 from ruian import RuianFetcher
+from cache import ResponseCache
+from address_index import AddressIndex
+from limiter import RateLimiter
+from address_formatter import RemoveElementsFromLeftStrategy, RemoveElementsFromRightStrategy, RemoveElementsRandomStrategy, StructuredAddressStrategy
 
 
 if __name__ == "__main__":
@@ -14,7 +20,7 @@ if __name__ == "__main__":
                     "Capabilities: \n"
                     "1) Obtain `kod adresniho mista` given address (which is default)\n"
                     "2) Obtain coordinates given address \n"
-                    "3) Process multiple addresses (either code or coordinates)\n"
+                    "3) Process multiple addresses (code, coordinates or both in single pass)\n"
 
         ,
 
@@ -44,6 +50,14 @@ if __name__ == "__main__":
 
     )
 
+    parser.add_argument(
+        "--info",
+        "-i",
+        action='store_true',
+        help="Type of task. If specified this flag i.e. `--info` or `-i` then both `kod adresniho mista` and coordinates will be fetched in single pass"
+
+    )
+
     parser.add_argument(
         "--column_name",
         "-cn",
@@ -92,7 +106,7 @@ if __name__ == "__main__":
         "--out_file",
         "-of",
         type=str,
-        help="Path to output excel/csv file. Should contain extension as it is used for file type derivation.",
+        help="Path to output excel/csv/parquet/arrow file. Should contain extension as it is used for file type derivation.",
         default=""
 
     )
@@ -106,15 +120,189 @@ if __name__ == "__main__":
 
     )
 
+    parser.add_argument(
+        "--cache",
+        "-ca",
+        type=str,
+        help="Path to SQLite file used as persistent cache of API responses. By default no cache is used.",
+        default=""
+
+    )
+
+    parser.add_argument(
+        "--cache_ttl",
+        "-ct",
+        type=float,
+        help="Time to live of cached responses in hours. Defaults to 720 hours (30 days).",
+        default=720
+
+    )
+
+    parser.add_argument(
+        "--negative_ttl",
+        "-nt",
+        type=float,
+        help="Only with `--cache`. Time to live of records of addresses without results (not requested again until expired) in hours. Defaults to 24 hours.",
+        default=24
+
+    )
+
+    parser.add_argument(
+        "--index",
+        "-ix",
+        type=str,
+        help="Path to SQLite offline index of RUIAN address points. Addresses found in index are resolved without calling API. By default no index is used.",
+        default=""
+
+    )
+
+    parser.add_argument(
+        "--build_index",
+        "-bi",
+        type=str,
+        nargs='+',
+        help="CUZK csv dump(s) of address points (files or directories) used to build offline index at `--index` path before job starts.",
+        default=[]
+
+    )
+
+    parser.add_argument(
+        "--exact",
+        "-ex",
+        action='store_true',
+        help="Only with `--index`. Resolve only exactly matching addresses from index. By default addresses are matched also fuzzily (misspelled names, missing diacritics)."
+
+    )
+
+    parser.add_argument(
+        "--rate_limit",
+        "-rl",
+        type=float,
+        help="Maximal number of requests per second sent to each API host. Defaults to 10.",
+        default=10
+
+    )
+
+    parser.add_argument(
+        "--max_concurrency",
+        "-mc",
+        type=int,
+        help="Upper bound of adaptive number of concurrent requests sent to each API host. Defaults to 50.",
+        default=50
+
+    )
+
+    parser.add_argument(
+        "--chunk_size",
+        "-cs",
+        type=int,
+        help="Only with `--asynchronous`. If specified, data are processed in streaming fashion: input is read and output is written in chunks of `chunk_size` rows so memory stays flat regardless of input size.",
+        default=0
+
+    )
+
+    parser.add_argument(
+        "--window",
+        "-w",
+        type=int,
+        help="Only with `--chunk_size`. Maximal number of requests in flight. Defaults to 100.",
+        default=100
+
+    )
+
+    parser.add_argument(
+        "--key_column",
+        "-kc",
+        type=str,
+        help="Only with `--chunk_size`. Column uniquely identifying rows of input table (e.g. primary key). If specified, only address and key columns "
+             "are read from database in chunks and results are upserted into `--out_table` chunk by chunk keyed by it. Requires `pyodbc`.",
+        default=""
+
+    )
+
+    parser.add_argument(
+        "--workers",
+        "-wk",
+        type=int,
+        help="Only without `--asynchronous`. Number of threads sending requests concurrently. Defaults to 1.",
+        default=1
+
+    )
+
+    parser.add_argument(
+        "--processes",
+        "-p",
+        type=int,
+        help="Only with `--asynchronous` (without `--chunk_size`). Number of processes each running own event loop on shard of unique addresses of input. Rate limit is divided among processes. Defaults to 1.",
+        default=1
+
+    )
+
+    parser.add_argument(
+        "--fast_decode",
+        "-fd",
+        action='store_true',
+        help="Decode API responses directly by pydantic-core instead of parsing JSON into python objects first. See `benchmark_decode.py`."
+
+    )
+
+    parser.add_argument(
+        "--fallback",
+        "-fb",
+        type=str,
+        choices=['structured', 'left', 'right', 'random'],
+        help="Strategy adjusting addresses which returned no results. `structured` builds targeted queries from parsed address (street with house number and PSČ first), "
+             "others remove whitespace separated elements of address from left/right/at random. Defaults to `left`.",
+        default='left'
+
+    )
+
+    parser.add_argument(
+        "--journal",
+        "-j",
+        type=str,
+        help="Path to job journal where every finished row is recorded so interrupted job can be resumed by `--resume`. "
+             "Defaults to no journal (`<out_file/out_table>.journal` with `--resume`).",
+        default=""
+
+    )
+
+    parser.add_argument(
+        "--summary",
+        "-su",
+        type=str,
+        help="Path to JSON run summary (job report, metrics of requests, retries, cache and index) written at the end of job. Defaults to `<out_file/out_table>.summary.json`.",
+        default=""
+
+    )
+
+    parser.add_argument(
+        "--resume",
+        "-r",
+        action='store_true',
+        help="Resume interrupted job i.e. skip rows already finished according to journal. By default journal is cleared and job starts from scratch."
+
+    )
+
     args = parser.parse_args()
 
-    r = RuianFetcher()
+    response_cache = ResponseCache(args.cache, ttl=args.cache_ttl * 3600, negative_ttl=args.negative_ttl * 3600) if args.cache else None
+    if args.build_index:
+        args.index = args.index or 'ruian_index.sqlite'
+        logging.info(f"Building offline index {args.index} from {args.build_index}...")
+        logging.info(f"Offline index contains {AddressIndex(args.index).build(args.build_index)} address points")
+    address_index = AddressIndex(args.index, fuzzy=not args.exact) if args.index else None
+    rate_limiter = RateLimiter(default_budget={'rate': args.rate_limit, 'max_concurrency': args.max_concurrency})
+    fallback_strategy = {'structured': StructuredAddressStrategy, 'left': RemoveElementsFromLeftStrategy, 'right': RemoveElementsFromRightStrategy,
+                         'random': RemoveElementsRandomStrategy}[args.fallback]()
+    r = RuianFetcher(response_cache=response_cache, rate_limiter=rate_limiter, address_index=address_index, fast_decode=args.fast_decode,
+                     fallback_strategy=fallback_strategy)
 
     addresses_to_be_processed = tuple(args.address) if args.address else None
     data_status = True
 
-    if addresses_to_be_processed is not None:
-        if args.in_file or (args.server and args.in_table and args.db):
+    if addresses_to_be_processed is None:
+        if args.in_file or (args.server and args.in_table and args.database):
             logging.info("No addresses provided as argument. Proceeding with data loading...")
             if args.column_name == "undefined":
                 data_status = False
@@ -129,19 +317,57 @@ if __name__ == "__main__":
 
     if args.out_file:
         pass
-    elif (not args.server or not args.db or not args.out_table) and data_status: 
-        args.out_file = f"address_{'coor' if args.coordinates else 'code'}_processed.csv"
+    elif (not args.server or not args.database or not args.out_table) and data_status: 
+        args.out_file = f"address_{'info' if args.info else 'coor' if args.coordinates else 'code'}_processed.csv"
         logging.info(f"No valid export method specified. Data will be exported to {args.out_file} file in current working directory")
         logging.info(f"Current working directory is {os.getcwd()}")
-        
 
-    if args.coordinates and data_status:
+    if args.resume and not args.journal and data_status:
+        args.journal = f"{args.out_file or args.out_table}.journal"
+    if args.journal and data_status:
+        if args.resume:
+            logging.info(f"Resuming job from {args.journal} journal")
+        elif os.path.exists(args.journal):
+            logging.warning(f"Existing journal {args.journal} is cleared. Use `--resume` to continue interrupted job instead")
+        logging.info(f"Finished rows will be recorded in {args.journal} journal")
+
+    if not args.summary and data_status:
+        args.summary = f"{args.out_file or args.out_table}.summary.json"
+
+    started_at = time.perf_counter()
+
+
+    if args.info and data_status:
+        logging.info("Quering RUIAN Code API & Coordinates API")
+        try:
+            if args.asynchronous and args.chunk_size:
+                asyncio.run(r.apipeline_fetch_info(addresses_to_be_processed, args.in_file, args.server, args.database, args.in_table, args.column_name, args.out_file, args.out_table,
+                                                   chunk_size=args.chunk_size, window=args.window, journal=args.journal, resume=args.resume,
+                                                   key_column=args.key_column))
+            elif args.asynchronous:
+                asyncio.run(r.abulk_fetch_info(addresses_to_be_processed, args.in_file, args.server, args.database, args.in_table, args.column_name, args.out_file, args.out_table, export=True,
+                                               journal=args.journal, resume=args.resume, processes=args.processes))
+            else:
+                r.bulk_fetch_info(addresses_to_be_processed, args.in_file, args.server, args.database, args.in_table, args.column_name, args.out_file, args.out_table, export=True,
+                                  journal=args.journal, resume=args.resume, workers=args.workers)
+            logging.info("Data processed and exported successfuly.")
+        except Exception as e:
+            logging.error(str(e))
+            raise
+
+    elif args.coordinates and data_status:
         logging.info("Quering Coordinates API")
         try:
-            if args.asynchronous:
-                asyncio.run(r.abulk_fetch_coordinates(addresses_to_be_processed, args.in_file, args.server, args.database, args.in_table, args.column_name, args.out_file, args.out_table, export=True))
+            if args.asynchronous and args.chunk_size:
+                asyncio.run(r.apipeline_fetch_coordinates(addresses_to_be_processed, args.in_file, args.server, args.database, args.in_table, args.column_name, args.out_file, args.out_table,
+                                                          chunk_size=args.chunk_size, window=args.window, journal=args.journal, resume=args.resume,
+                                                          key_column=args.key_column))
+            elif args.asynchronous:
+                asyncio.run(r.abulk_fetch_coordinates(addresses_to_be_processed, args.in_file, args.server, args.database, args.in_table, args.column_name, args.out_file, args.out_table, export=True,
+                                                      journal=args.journal, resume=args.resume, processes=args.processes))
             else:
-                r.bulk_fetch_coordinates(addresses_to_be_processed, args.in_file, args.server, args.database, args.in_table, args.column_name, args.out_file, args.out_table, export=True)
+                r.bulk_fetch_coordinates(addresses_to_be_processed, args.in_file, args.server, args.database, args.in_table, args.column_name, args.out_file, args.out_table, export=True,
+                                         journal=args.journal, resume=args.resume, workers=args.workers)
             logging.info("Data processed and exported successfuly.")
         except Exception as e:
             logging.error(str(e))
@@ -152,11 +378,16 @@ if __name__ == "__main__":
         logging.info("Quering RUIAN Code API")
 
         try:
-            if args.asynchronous:
-                print(args)
-                asyncio.run(r.abulk_fetch_ruian_codes(addresses_to_be_processed, args.in_file, args.server, args.database, args.in_table, args.column_name, args.out_file, args.out_table, export=True))
+            if args.asynchronous and args.chunk_size:
+                asyncio.run(r.apipeline_fetch_ruian_codes(addresses_to_be_processed, args.in_file, args.server, args.database, args.in_table, args.column_name, args.out_file, args.out_table,
+                                                          chunk_size=args.chunk_size, window=args.window, journal=args.journal, resume=args.resume,
+                                                          key_column=args.key_column))
+            elif args.asynchronous:
+                asyncio.run(r.abulk_fetch_ruian_codes(addresses_to_be_processed, args.in_file, args.server, args.database, args.in_table, args.column_name, args.out_file, args.out_table, export=True,
+                                                      journal=args.journal, resume=args.resume, processes=args.processes))
             else:    
-                r.bulk_fetch_ruian_codes(addresses_to_be_processed, args.in_file, args.server, args.database, args.in_table, args.column_name, args.out_file, args.out_table, export=True)
+                r.bulk_fetch_ruian_codes(addresses_to_be_processed, args.in_file, args.server, args.database, args.in_table, args.column_name, args.out_file, args.out_table, export=True,
+                                         journal=args.journal, resume=args.resume, workers=args.workers)
             logging.info("Data processed and exported successfuly.")
         except Exception as e:
             logging.error(str(e))
@@ -164,3 +395,24 @@ if __name__ == "__main__":
         
     else:
         pass
+
+    if data_status:
+        logging.info(f"Job report: {r.job_report.rows} rows, {r.job_report.resumed_rows} rows resumed from journal, "
+                     f"{r.job_report.skipped_rows} rows without address skipped, "
+                     f"{r.job_report.unique_addresses} unique addresses, {r.job_report.saved_calls} upstream calls saved by deduplication")
+
+        with open(args.summary, 'w') as f:
+            json.dump({'seconds': time.perf_counter() - started_at,
+                       'job': r.job_report.model_dump(),
+                       'metrics': r.metrics.summary(),
+                       'cache': response_cache.stats() if response_cache is not None else None,
+                       'index': address_index.stats() if address_index is not None else None}, f, indent=2)
+        logging.info(f"Run summary written to {args.summary}")
+
+    if response_cache is not None:
+        logging.info(f"Cache statistics: {response_cache.stats()}")
+        response_cache.close()
+
+    if address_index is not None:
+        logging.info(f"Offline index statistics: {address_index.stats()}")
+        address_index.close()
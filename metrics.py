@@ -0,0 +1,254 @@
+import math
+import threading
+from collections import defaultdict
+
+from typing import Dict, List, Optional, Tuple
+
+from data_models import ApiResponse
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DEPTH_BUCKETS = (1, 2, 3, 4, 5)
+
+
+class Counter:
+    """
+    Monotonic counter with labels. Thread safe
+    """
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self.__lock = threading.Lock()
+
+    def key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        with self.__lock:
+            self.values[self.key(labels)] += amount
+
+    def merge(self, other: 'Counter') -> None:
+        with self.__lock:
+            for key, value in other.values.items():
+                self.values[key] += value
+
+    def total(self, **labels) -> float:
+        """Sum of values of all label sets matching given (subset of) labels
+        """
+        positions = {self.labels.index(label): str(value) for label, value in labels.items()}
+        return sum(value for key, value in list(self.values.items()) if all(key[i] == v for i, v in positions.items()))
+
+    def format_labels(self, key: Tuple[str, ...], extra: Optional[Dict[str, str]] = None) -> str:
+        pairs = list(zip(self.labels, key)) + list((extra or {}).items())
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{label}="{value}"' for label, value in pairs) + '}'
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        return lines + [f"{self.name}{self.format_labels(key)} {value:g}" for key, value in sorted(self.values.items())]
+
+    def summary(self) -> Dict[str, float]:
+        return {','.join(key) or 'total': value for key, value in sorted(self.values.items())}
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state['_Counter__lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+
+class Gauge(Counter):
+    """
+    Value with labels which can go up and down. Thread safe
+    """
+    kind = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        self.values[self.key(labels)] = value
+
+    def merge(self, other: 'Gauge') -> None:
+        # gauges of worker processes describe state of already finished workers so they are not added up
+        for key, value in other.values.items():
+            self.values.setdefault(key, value)
+
+
+class Histogram(Counter):
+    """
+    Histogram with fixed cumulative buckets and labels. Thread safe
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...], labels: Tuple[str, ...] = (), interpolate: bool = True) -> None:
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+        self.interpolate = interpolate  # whether estimate quantiles within buckets, disable for discrete values equal to bucket bounds
+        self.counts: Dict[Tuple[str, ...], List[int]] = defaultdict(lambda: [0] * (len(buckets) + 1))  # last one is +Inf bucket
+        self.sums: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self.__lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.key(labels)
+        position = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self.__lock:
+            self.counts[key][position] += 1
+            self.sums[key] += value
+
+    def merge(self, other: 'Histogram') -> None:
+        with self.__lock:
+            for key, counts in other.counts.items():
+                self.counts[key] = [a + b for a, b in zip(self.counts[key], counts)]
+                self.sums[key] += other.sums[key]
+
+    def quantile(self, q: float, key: Tuple[str, ...]) -> float:
+        """Estimate quantile by linear interpolation within bucket (same as `histogram_quantile` of Prometheus)
+           or as upper bound of bucket if `interpolate` is disabled
+        """
+        counts = self.counts[key]
+        rank, cumulative, lower = q * sum(counts), 0, 0.0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            if count and cumulative + count >= rank:
+                if bound == math.inf:
+                    return lower
+                return lower + (bound - lower) * (rank - cumulative) / count if self.interpolate else bound
+            cumulative, lower = cumulative + count, bound
+        return math.nan
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for key, counts in sorted(self.counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self.format_labels(key, {'le': '+Inf' if bound == math.inf else f'{bound:g}'})} {cumulative}")
+            lines.append(f"{self.name}_sum{self.format_labels(key)} {self.sums[key]:g}")
+            lines.append(f"{self.name}_count{self.format_labels(key)} {cumulative}")
+        return lines
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for key, counts in sorted(self.counts.items()):
+            count = sum(counts)
+            result[','.join(key) or 'total'] = {'count': count, 'mean': self.sums[key] / count if count else math.nan,
+                                                 'p50': self.quantile(0.5, key), 'p90': self.quantile(0.9, key), 'p99': self.quantile(0.99, key)}
+        return result
+
+    def __getstate__(self) -> dict:
+        state = super().__getstate__()
+        del state['_Histogram__lock']
+        state['counts'], state['sums'] = dict(self.counts), dict(self.sums)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        counts, sums = state.pop('counts'), state.pop('sums')
+        super().__setstate__(state)
+        self.counts = defaultdict(lambda: [0] * (len(self.buckets) + 1), counts)
+        self.sums = defaultdict(float, sums)
+        self.__lock = threading.Lock()
+
+
+class Metrics:
+    """
+    Counters and histograms describing work of `RuianFetcher`: upstream requests (latency, HTTP status, concurrency),
+    lookups of addresses (retries, fallback depth, empty results) and local resolution (cache, offline index).
+    Can be rendered in Prometheus text format or summarized as JSON serializable dictionary
+    """
+
+    def __init__(self) -> None:
+        self.requests = Counter('ruian_requests_total', 'Upstream requests by endpoint and HTTP status (`error` if no response was received)',
+                                ('endpoint', 'status'))
+        self.latency = Histogram('ruian_request_latency_seconds', 'Latency of upstream requests', LATENCY_BUCKETS, ('endpoint',))
+        self.in_flight = Gauge('ruian_requests_in_flight', 'Upstream requests currently in flight', ('endpoint',))
+        self.concurrency_limit = Gauge('ruian_concurrency_limit', 'Current adaptive concurrency limit of upstream host', ('endpoint',))
+        self.retries = Counter('ruian_retries_total', 'Repeated calls by kind (`transient` failure or `fallback` to adjusted address)',
+                               ('endpoint', 'kind'))
+        self.lookups = Counter('ruian_lookups_total', 'Lookups of addresses finished after all retries by outcome (`found`, `empty`, `error`)', ('endpoint', 'outcome'))
+        self.fallback_depth = Histogram('ruian_fallback_depth', 'Number of address variants tried per lookup', DEPTH_BUCKETS, ('endpoint',),
+                                        interpolate=False)
+        self.coalesced = Counter('ruian_coalesced_total', 'Lookups served by already in-flight lookup of the same address', ('endpoint',))
+        self.cache = Counter('ruian_cache_lookups_total', 'Lookups in response cache by result (`hit`, `negative_hit`, `miss`)', ('endpoint', 'result'))
+        self.index = Counter('ruian_index_lookups_total', 'Lookups in offline address index by result (`hit`, `miss`)', ('endpoint', 'result'))
+
+    @property
+    def metrics(self) -> List[Counter]:
+        return [self.requests, self.latency, self.in_flight, self.concurrency_limit, self.retries, self.lookups, self.fallback_depth, self.coalesced,
+                self.cache, self.index]
+
+    def request_started(self, endpoint: str) -> None:
+        self.in_flight.inc(endpoint=endpoint)
+
+    def request_finished(self, endpoint: str, latency: float, status: Optional[int], concurrency_limit: Optional[int] = None) -> None:
+        """Record finished (or failed) upstream request
+
+        Args:
+            endpoint (str): name of endpoint e.g. `code` or `coordinates`
+            latency (float): duration of request in seconds
+            status (Optional[int]): HTTP status code. `None` in case of timeout/connection error
+            concurrency_limit (Optional[int], optional): current concurrency limit of host. Defaults to None.
+        """
+        self.in_flight.inc(-1, endpoint=endpoint)
+        self.requests.inc(endpoint=endpoint, status=status if status is not None else 'error')
+        self.latency.observe(latency, endpoint=endpoint)
+        if concurrency_limit is not None:
+            self.concurrency_limit.set(concurrency_limit, endpoint=endpoint)
+
+    def lookup_finished(self, endpoint: str, response: Optional[ApiResponse], depth: int) -> None:
+        """Record final response of address after all retries
+
+        Args:
+            endpoint (str): name of endpoint e.g. `code` or `coordinates`
+            response (Optional[ApiResponse]): final response. `None` if every attempt raised exception
+            depth (int): number of address variants tried
+        """
+        if response is None or response.error_msg is not None:
+            outcome = 'error'
+        else:
+            outcome = 'found' if response.response is not None else 'empty'
+        self.lookups.inc(endpoint=endpoint, outcome=outcome)
+        self.fallback_depth.observe(depth, endpoint=endpoint)
+
+    def merge(self, other: 'Metrics') -> None:
+        """Add up metrics of other instance (e.g. collected in worker process)
+        """
+        for metric, other_metric in zip(self.metrics, other.metrics):
+            metric.merge(other_metric)
+
+    def render(self) -> str:
+        """Render metrics in Prometheus text exposition format
+        """
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+    @staticmethod
+    def __rate(numerator: float, denominator: float) -> Optional[float]:
+        return numerator / denominator if denominator else None
+
+    def summary(self) -> dict:
+        """Summarize metrics as JSON serializable dictionary including derived rates
+
+        Returns:
+            dict: summary of metrics
+        """
+        summary = {metric.name: metric.summary() for metric in self.metrics}
+        endpoints = sorted({key[0] for metric in (self.requests, self.lookups, self.cache, self.index) for key in metric.values})
+        summary['rates'] = {endpoint: {'empty_rate': self.__rate(self.lookups.total(endpoint=endpoint, outcome='empty'), self.lookups.total(endpoint=endpoint)),
+                                       'error_rate': self.__rate(self.lookups.total(endpoint=endpoint, outcome='error'), self.lookups.total(endpoint=endpoint)),
+                                       'cache_hit_rate': self.__rate(self.cache.total(endpoint=endpoint) - self.cache.total(endpoint=endpoint, result='miss'),
+                                                                     self.cache.total(endpoint=endpoint)),
+                                       'index_hit_rate': self.__rate(self.index.total(endpoint=endpoint, result='hit'), self.index.total(endpoint=endpoint)),
+                                       'retries_per_request': self.__rate(self.retries.total(endpoint=endpoint), self.requests.total(endpoint=endpoint))}
+                            for endpoint in endpoints}
+        return self.__replace_nan(summary)
+
+    @staticmethod
+    def __replace_nan(value):
+        # NaN is not valid JSON
+        if isinstance(value, dict):
+            return {key: Metrics.__replace_nan(item) for key, item in value.items()}
+        return None if isinstance(value, float) and math.isnan(value) else value
@@ -0,0 +1,98 @@
+import os
+
+import pandas as pd
+
+from typing import Dict, Iterator, List
+
+try:
+    import pyodbc
+except ImportError:  # optional dependency, needed only for chunked database input and incremental database output
+    pyodbc = None
+
+
+ODBC_DRIVER = os.environ.get('RUIAN_ODBC_DRIVER', 'ODBC Driver 17 for SQL Server')
+STRING_TYPE = 'NVARCHAR(MAX)'  # addresses and other texts are never truncated
+KEY_STRING_TYPE = 'NVARCHAR(450)'  # string key is part of primary key which is limited to 900 bytes
+# types of result columns, other columns are strings (or BIGINT if integer)
+SQL_TYPES = {'ruian_code': 'BIGINT', 'x': 'FLOAT', 'y': 'FLOAT', 'wkid': 'INT', 'candidate': 'INT', 'error_msg': STRING_TYPE}
+
+
+def connect(server: str, db: str):
+    """Open connection to MS SQL database in local network (Windows authentication)
+
+    Args:
+        server (str): Name of server in local network
+        db (str): Name of MS SQL database
+
+    Returns:
+        pyodbc.Connection: open connection
+    """
+    if pyodbc is None:
+        raise Exception("Chunked database input/output requires optional dependency `pyodbc`. Install it by `pip install pyodbc`")
+    return pyodbc.connect(f"DRIVER={{{ODBC_DRIVER}}};SERVER={server};DATABASE={db};Trusted_Connection=yes;")
+
+
+def quote(name: str) -> str:
+    """Quote (possibly schema qualified) name of table or column e.g. `dbo.addresses` -> `[dbo].[addresses]`
+    """
+    return '.'.join('[' + part.replace(']', ']]') + ']' for part in name.split('.'))
+
+
+def sql_type(name: str, column: pd.Series, key: bool = False) -> str:
+    """Type of column of output table. Strings are `NVARCHAR(MAX)` except key column which is part of primary key
+    """
+    if name in SQL_TYPES:
+        return SQL_TYPES[name]
+    if pd.api.types.is_integer_dtype(column):
+        return 'BIGINT'
+    return KEY_STRING_TYPE if key else STRING_TYPE
+
+
+def table_columns(cursor, table: str) -> Dict[str, str]:
+    """Names of columns of existing table and their types in the form used by `sql_type` e.g. `NVARCHAR(MAX)`
+    """
+    rows = cursor.execute("SELECT name, TYPE_NAME(user_type_id), max_length FROM sys.columns WHERE object_id = OBJECT_ID(?)", table).fetchall()
+    columns = {}
+    for name, type_name, max_length in rows:
+        type_name = type_name.upper()
+        if type_name in ('NVARCHAR', 'NCHAR', 'VARCHAR', 'CHAR', 'VARBINARY', 'BINARY'):
+            # max_length is in bytes, -1 for MAX
+            length = 'MAX' if max_length == -1 else max_length // 2 if type_name.startswith('N') else max_length
+            type_name = f"{type_name}({length})"
+        columns[name] = type_name
+    return columns
+
+
+def iter_table(server: str, db: str, table: str, column_name: str, key_column: str, chunk_size: int = 10000) -> Iterator[pd.DataFrame]:
+    """Read only `key_column` and `column_name` of table in chunks ordered by key. Rows are streamed by forward-only
+       cursor so only one chunk is held in memory. Integer key is used as index of rows (i.e. rows of job journal are source row ids)
+
+    Args:
+        server (str): Name of server in local network
+        db (str): Name of MS SQL database
+        table (str): Name of input table
+        column_name (str): Name of column where are addresses
+        key_column (str): Name of column uniquely identifying rows (e.g. primary key)
+        chunk_size (int, optional): Number of rows in one chunk. Defaults to 10000.
+
+    Yields:
+        pd.DataFrame: chunk with `key_column` and `column_name` columns
+    """
+    connection = connect(server, db)
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"SELECT {quote(key_column)}, {quote(column_name)} FROM {quote(table)} ORDER BY {quote(key_column)}")
+        offset = 0
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = pd.DataFrame.from_records([tuple(row) for row in rows], columns=[key_column, column_name])
+            if pd.api.types.is_integer_dtype(chunk[key_column]):
+                chunk.index = chunk[key_column].to_numpy()
+            else:
+                chunk.index = range(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+    finally:
+        connection.close()
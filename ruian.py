@@ -2,18 +2,35 @@ from utilspy import Connector
 from tqdm import tqdm
 from tqdm.asyncio import tqdm as async_tqdm
 import requests
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
+import os
 import re
 import asyncio
 import aiohttp
 import json
+import time
+import contextlib
+import copy
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
+import numpy as np
 import pandas as pd
 
-from typing import Any, List, Tuple, Callable, Optional, Union, Type
+from typing import Any, List, Tuple, Callable, Optional, Union, Type, Iterator, Awaitable, Dict
 
-from data_models import RuianCodeApiResponse, CoordinatesAPIResponse, ApiResponse
-from address_formatter import AddressFormatter, RemoveElementsFromLeftStrategy, RemoveElementsFromRightStrategy
-from utils import ensure_length_limit, ensure_clean_address, retry_api_call, retry_adjust_api_call, aensure_length_limit, aensure_clean_address, aretry_adjust_api_call
+from data_models import RuianCodeApiResponse, CoordinatesAPIResponse, InfoApiResponse, ApiResponse, JobReport
+from address_formatter import AddressFormatter, FallbackStrategy, RemoveElementsFromLeftStrategy
+from utils import ensure_length_limit, ensure_clean_address, retry_adjust_api_call, aensure_length_limit, aensure_clean_address, aretry_adjust_api_call, \
+    cache_response, acache_response, resolve_locally, aresolve_locally, asingle_flight, is_transient_status, parse_retry_after
+from cache import ResponseCache, MemoryCache
+from address_index import AddressIndex
+from limiter import RateLimiter
+from scheduler import abounded_map, bounded_map
+from sinks import ResultSink, export_data, make_sink
+from mssql import iter_table
+from journal import JobJournal
+from decoder import decode_response, decode_api_response
+from metrics import Metrics
 
 
 
@@ -21,10 +38,54 @@ class RuianFetcher(Connector):
     """
     Class for handling API calls to RUIAN web services
     """
+    request_timeout = 30  # seconds, timed out request is considered transient failure
+    # urls of upstream services, can be redirected (e.g. to local mock server of `benchmark.py`) by environment variables
+    code_api_url = os.environ.get('RUIAN_CODE_API_URL', "https://vdp.cuzk.cz/vdp/ruian/adresnimista/fulltext")
+    coor_api_url = os.environ.get('RUIAN_COORDINATES_API_URL',
+                                  "https://ags.cuzk.cz/arcgis/rest/services/RUIAN/Vyhledavaci_sluzba_nad_daty_RUIAN/MapServer/exts/GeocodeSOE/findAddressCandidates")
+    worker: Optional['RuianFetcher'] = None  # fetcher of worker process of sharded bulk job, see `init_worker`
+
+    def __init__(self, response_cache: Optional[ResponseCache] = None, rate_limiter: Optional[RateLimiter] = None,
+                 address_index: Optional[AddressIndex] = None, hedge: int = 0, fast_decode: bool = False, metrics: Optional[Metrics] = None,
+                 fallback_strategy: Optional[FallbackStrategy] = None, memo_size: int = 10000) -> None:
+        """
+        Args:
+            response_cache (ResponseCache, optional): Persistent cache of API responses. If provided, responses are served
+                from cache (keyed by cleaned address) before any API call is made. Defaults to None.
+            rate_limiter (RateLimiter, optional): Limiter of request rate and concurrency per upstream host.
+                Defaults to `RateLimiter()` with default budget for every host.
+            address_index (AddressIndex, optional): Offline index of RUIAN address points. If provided, addresses are resolved
+                locally and online API is called only for addresses not found in index. Defaults to None.
+            hedge (int, optional): Number of fallback variants (shortened addresses) requested by async fetch methods concurrently
+                with original address instead of sequential retries. Trades more requests for lower tail latency
+                of single lookups. Defaults to 0 i.e. sequential retries.
+            fast_decode (bool, optional): Whether decode raw API responses directly by pydantic-core (see `decoder.decode_response`)
+                instead of parsing JSON into python objects first. Defaults to False.
+            metrics (Metrics, optional): Collector of counters and histograms of requests, retries, cache and index lookups
+                (can be shared by several fetchers). Defaults to new `Metrics()`.
+            fallback_strategy (FallbackStrategy, optional): Strategy adjusting addresses which returned no results and shortening
+                addresses over length limit of API e.g. `StructuredAddressStrategy()` i.e. targeted queries built from parsed address
+                (street with house number and PSČ). Defaults to `RemoveElementsFromLeftStrategy()`.
+            memo_size (int, optional): Maximal number of responses of addresses and their fallback variants memoized within bulk job
+                (least recently used are evicted, see `MemoryCache`). Defaults to 10 000.
+        """
 
-    def __init__(self) -> None:
-
-        self.address_formatter = AddressFormatter(RemoveElementsFromLeftStrategy())
+        self.address_formatter = AddressFormatter(fallback_strategy if fallback_strategy is not None else RemoveElementsFromLeftStrategy())
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.address_index = address_index
+        self.hedge = hedge
+        self.fast_decode = fast_decode
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.job_report = JobReport()
+        self.memo_size = memo_size
+        self.variant_memo: Optional[MemoryCache] = None  # responses of addresses and their fallback variants within current bulk job
+        self.flights: Dict[Tuple[str, str], List] = {}  # in-flight async lookups [task, number of callers] by (endpoint, cleaned address)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['flights'] = {}  # in-flight lookups belong to event loop of this process
+        return state
 
     def adjust_address(self, address: str, *args, **kwargs) -> Tuple:
         """Adjust the address using the formatter
@@ -72,6 +133,285 @@ class RuianFetcher(Connector):
 
         return data, column_name
 
+    def __iter_load_check_data(self, addresses: Optional[Tuple[str]] = None, in_file: str = '', server: str = '', db: str = '', in_table: str = '', column_name: str = 'undefined',
+                               chunk_size: int = 10000, key_column: str = '') -> Iterator[Tuple[pd.DataFrame, str]]:
+        """helper generator to load data in chunks and do basic checks.
+           CSV files and database tables with `key_column` are read incrementally (only address and key columns of table),
+           other inputs are loaded at once and then split into chunks. Index of rows is preserved across chunks
+
+        Args:
+            addresses (Optional[Tuple[str]], optional): Tuple of address strings to be processed. Defaults to None.
+            in_file (str, optional): Path to input file. Defaults to ''.
+            server (str, optional): Name of server in local network. Defaults to ''.
+            db (str, optional): Name of MS SQL database. Defaults to ''.
+            in_table (str, optional): Name of input table. Defaults to ''.
+            column_name (str, optional): Name of column where are addresses. Defaults to 'undefined'.
+            chunk_size (int, optional): Number of rows in one chunk. Defaults to 10000.
+            key_column (str, optional): Name of column uniquely identifying rows of `in_table`. Defaults to ''.
+
+        Raises:
+            Exception: If `column_name` not present in input dataframe
+            Exception: No data provided
+
+        Yields:
+            Tuple (pd.DataFrame, str): chunk of input data with addresses and column name
+        """
+        if addresses is None and in_file.lower().endswith('.csv'):
+            empty = True
+            for chunk in pd.read_csv(in_file, chunksize=chunk_size):
+                if column_name not in chunk:
+                    raise Exception(f'Column {column_name} is not present in DataFrame')
+                empty = False
+                yield chunk, column_name
+            if empty:
+                raise Exception("No data provided")
+        elif addresses is None and not in_file and key_column:
+            empty = True
+            for chunk in iter_table(server, db, in_table, column_name, key_column, chunk_size):
+                empty = False
+                yield chunk, column_name
+            if empty:
+                raise Exception("No data provided")
+        else:
+            data, column_name = self.__load_check_data(addresses, in_file, server, db, in_table, column_name)
+            for start in range(0, data.shape[0], chunk_size):
+                yield data.iloc[start:start + chunk_size].copy(), column_name
+
+    def __plan_fetch(self, data: pd.DataFrame, column_name: str, journal: Optional[JobJournal] = None,
+                     normalized: Optional[pd.DataFrame] = None) -> Tuple[List[Optional[ApiResponse]], List[Tuple[str, str]], List[np.ndarray]]:
+        """helper method to normalize whole address column at once, to restore rows finished by previous run from `journal`
+           and to collapse remaining addresses to unique canonical keys so every address is fetched only once.
+           Rows without usable address (empty, missing or junk) get error response without any request.
+           Also adds number of rows, resumed rows, skipped rows, unique addresses and saved calls to `job_report`
+
+        Args:
+            data (pd.DataFrame): dataframe containing input data with addresses
+            column_name (str): name of column with addresses
+            journal (JobJournal, optional): journal of finished rows. Defaults to None.
+            normalized (pd.DataFrame, optional): address column already normalized by `AddressFormatter.normalize_column`
+                (e.g. in worker processes). Defaults to None i.e. column is normalized here.
+
+        Returns:
+            Tuple (List[Optional[ApiResponse]], List[Tuple[str, str]], List[np.ndarray]): response for every row of `data` (None if not finished yet),
+                (canonical key, normalized address) of every unique address to be fetched and positions of rows of `data` for every unique address
+        """
+        if normalized is None:
+            normalized = self.address_formatter.normalize_column(data[column_name])
+        valid = normalized['key'].notna().to_numpy()
+
+        responses = [None] * data.shape[0]
+        for position in np.flatnonzero(~valid):
+            responses[position] = ApiResponse(response=None, error_msg="No address provided")
+        if journal is not None:
+            restored = journal.restore(data.index[valid], normalized['key'][valid])
+            for position in np.flatnonzero(valid):
+                responses[position] = restored.get(data.index[position])
+
+        pending = np.array([position for position, response in enumerate(responses) if response is None], dtype=int)
+        inverse, unique_keys = pd.factorize(normalized['key'].iloc[pending])
+        rows = np.split(pending[np.argsort(inverse, kind='stable')], np.cumsum(np.bincount(inverse, minlength=len(unique_keys)))[:-1])
+        # first occurrence of every key is fetched
+        queries = normalized['query'].iloc[[positions[0] for positions in rows]] if len(unique_keys) else []
+
+        skipped = int((~valid).sum())
+        self.job_report.rows += data.shape[0]
+        self.job_report.resumed_rows += data.shape[0] - len(pending) - skipped
+        self.job_report.skipped_rows += skipped
+        self.job_report.finished_rows += data.shape[0] - len(pending)
+        self.job_report.unique_addresses += len(unique_keys)
+        self.job_report.saved_calls += len(pending) - len(unique_keys)
+
+        return responses, list(zip(unique_keys, queries)), rows
+
+    def __fan_out(self, responses: List[Optional[ApiResponse]], rows: np.ndarray, data: pd.DataFrame, address: str, response: ApiResponse,
+                  journal: Optional[JobJournal] = None) -> None:
+        """helper method to assign response of unique address to all rows with this address and record them in `journal`.
+           Also adds rows to finished rows of `job_report`
+
+        Args:
+            responses (List[Optional[ApiResponse]]): response for every row of `data`
+            rows (np.ndarray): positions of rows with `address`
+            data (pd.DataFrame): dataframe containing input data with addresses
+            address (str): canonical key of address
+            response (ApiResponse): response for `address`
+            journal (JobJournal, optional): journal of finished rows. Defaults to None.
+        """
+        for position in rows:
+            responses[position] = response
+        self.job_report.finished_rows += len(rows)
+        if journal is not None and not response.transient:  # rows failed temporarily are repeated when job is resumed
+            journal.record(data.index[rows], address, response)
+
+    @staticmethod
+    def __open_journal(journal: str = '', resume: bool = False) -> contextlib.AbstractContextManager:
+        """helper method to open job journal if its path is provided
+
+        Args:
+            journal (str, optional): Path to journal file. Defaults to ''.
+            resume (bool, optional): Whether keep rows finished by previous run. Defaults to False.
+
+        Returns:
+            contextlib.AbstractContextManager: context manager yielding `JobJournal` or None
+        """
+        return JobJournal(journal, resume) if journal else contextlib.nullcontext()
+
+    @staticmethod
+    def __code_columns(response: Optional[RuianCodeApiResponse]) -> Dict[str, List]:
+        """helper method to extract ruian code columns (one value per match candidate) from response.
+           Missing response gives single row of missing values
+
+        Args:
+            response (Optional[RuianCodeApiResponse]): response of ruian code API
+
+        Returns:
+            Dict[str, List]: `ruian_code` and `code_matched_address` columns
+        """
+        if response is None or not response.polozky:
+            return {'ruian_code': [None], 'code_matched_address': [None]}
+
+        return {'ruian_code': [item.kod for item in response.polozky], 'code_matched_address': [item.nazev for item in response.polozky]}
+
+    @staticmethod
+    def __coordinates_columns(response: Optional[CoordinatesAPIResponse]) -> Dict[str, List]:
+        """helper method to extract coordinates columns (one value per match candidate) from response.
+           Missing response gives single row of missing values
+
+        Args:
+            response (Optional[CoordinatesAPIResponse]): response of coordinates API
+
+        Returns:
+            Dict[str, List]: `x`, `y`, `coor_matched_address` and `wkid` columns
+        """
+        if response is None or not response.candidates:
+            return {'x': [np.nan], 'y': [np.nan], 'coor_matched_address': [None], 'wkid': [None]}
+
+        x, y, matches, wkid = zip(*((c.location.x, c.location.y, c.address, c.location.spatialReference.latestWkid) for c in response.candidates))
+        return {'x': list(x), 'y': list(y), 'coor_matched_address': list(matches), 'wkid': list(wkid)}
+
+    def __info_columns(self, response: Optional[InfoApiResponse]) -> Dict[str, List]:
+        """helper method to extract ruian code and coordinates columns from response. Every code match is paired with
+           coordinates candidate of the same address (or with the best scored candidate) so answer with N code matches
+           and M coordinates candidates gives N rows, not N * M. Candidates of coordinates API alone get own rows
+
+        Args:
+            response (Optional[InfoApiResponse]): merged response of both APIs
+
+        Returns:
+            Dict[str, List]: ruian code columns and coordinates columns
+        """
+        code = response.code if response is not None else None
+        coordinates = response.coordinates if response is not None else None
+        code_columns, coordinates_columns = self.__code_columns(code), self.__coordinates_columns(coordinates)
+
+        if code is None or not code.polozky:
+            size = len(coordinates_columns['x'])
+            return {**{name: values * size for name, values in code_columns.items()}, **coordinates_columns}
+        if coordinates is None or not coordinates.candidates:
+            pairs = [0] * len(code.polozky)
+        else:
+            best = max(range(len(coordinates.candidates)), key=lambda i: coordinates.candidates[i].score)
+            by_address = {}
+            for i, candidate in enumerate(coordinates.candidates):
+                by_address.setdefault(self.address_formatter.key(candidate.address), i)
+            pairs = [by_address.get(self.address_formatter.key(item.nazev), best) for item in code.polozky]
+
+        return {**code_columns, **{name: [values[i] for i in pairs] for name, values in coordinates_columns.items()}}
+
+    # dtypes of result columns, other columns are of object dtype
+    RESULT_DTYPES = {'ruian_code': 'Int64', 'x': 'float64', 'y': 'float64', 'wkid': 'Int64'}
+
+    @staticmethod
+    def __assemble(data: pd.DataFrame, responses: List[ApiResponse], column_groups: Callable[[ApiResponse], List[Dict[str, List]]]) -> pd.DataFrame:
+        """helper method to add result columns to `data` so every match candidate gets its own row.
+           If response has multiple groups of columns, every combination of candidates of groups gets its own row.
+           Columns are extracted once per distinct response object (responses of duplicate addresses are shared)
+           into flat typed arrays, rows are then gathered by vectorized indexing
+
+        Args:
+            data (pd.DataFrame): dataframe containing input data with addresses
+            responses (List[ApiResponse]): one response for every row of `data`
+            column_groups (Callable[[ApiResponse], List[Dict[str, List]]]): function extracting groups of result columns from response
+
+        Returns:
+            pd.DataFrame: dataframe with result columns and `error_msg` column
+        """
+        unique: Dict[int, int] = {}
+        unique_responses: List[ApiResponse] = []
+        positions = np.empty(len(responses), dtype=np.int64)  # position of response of every row among unique responses
+        for row, response in enumerate(responses):
+            position = unique.get(id(response))
+            if position is None:
+                position = unique[id(response)] = len(unique_responses)
+                unique_responses.append(response)
+            positions[row] = position
+
+        flat: Dict[str, List] = {}
+        sizes = np.empty(len(unique_responses), dtype=np.int64)  # number of output rows of every unique response
+        for position, response in enumerate(unique_responses):
+            columns, size = {}, 1
+            for group in column_groups(response):
+                # cartesian product with previous groups (previous groups vary slowest)
+                n = len(next(iter(group.values())))
+                columns = {name: [value for value in values for _ in range(n)] for name, values in columns.items()}
+                columns.update({name: values * size for name, values in group.items()})
+                size *= n
+            for name, values in columns.items():
+                flat.setdefault(name, []).extend(values)
+            sizes[position] = size
+
+        counts = sizes[positions]
+        starts = np.cumsum(sizes) - sizes
+        rows = np.repeat(np.arange(len(responses)), counts)
+        # index into flat arrays: start of unique response of row + rank of candidate within row
+        gather = np.repeat(starts[positions] - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+
+        result = data.iloc[rows].reset_index(drop=True)
+        # dtypes are given explicitly so they do not depend on content (e.g. chunk without any error)
+        for name, values in flat.items():
+            dtype = RuianFetcher.RESULT_DTYPES.get(name, object)
+            result[name] = pd.Series(pd.array(values, dtype=dtype).take(gather), index=result.index, dtype=dtype)
+        errors = np.array([response.error_msg for response in unique_responses], dtype=object)[positions][rows] if len(rows) else []
+        result['error_msg'] = pd.Series(errors, index=result.index, dtype=object)
+
+        return result
+
+    def __assemble_codes(self, data: pd.DataFrame, responses: List[ApiResponse]) -> pd.DataFrame:
+        """helper method to add ruian codes from `responses` to `data`. Every match candidate gets its own row
+
+        Args:
+            data (pd.DataFrame): dataframe containing input data with addresses
+            responses (List[ApiResponse]): one response for every row of `data`
+
+        Returns:
+            pd.DataFrame: dataframe with `ruian_code`, `code_matched_address` and `error_msg` columns
+        """
+        return self.__assemble(data, responses, lambda res: [self.__code_columns(res.response)])
+
+    def __assemble_coordinates(self, data: pd.DataFrame, responses: List[ApiResponse]) -> pd.DataFrame:
+        """helper method to add coordinates from `responses` to `data`. Every match candidate gets its own row
+
+        Args:
+            data (pd.DataFrame): dataframe containing input data with addresses
+            responses (List[ApiResponse]): one response for every row of `data`
+
+        Returns:
+            pd.DataFrame: dataframe with `x`, `y`, `coor_matched_address`, `wkid` and `error_msg` columns
+        """
+        return self.__assemble(data, responses, lambda res: [self.__coordinates_columns(res.response)])
+
+    def __assemble_info(self, data: pd.DataFrame, responses: List[ApiResponse]) -> pd.DataFrame:
+        """helper method to add ruian codes and coordinates from `responses` to `data`.
+           Every code match gets its own row with paired coordinates candidate (see `__info_columns`)
+
+        Args:
+            data (pd.DataFrame): dataframe containing input data with addresses
+            responses (List[ApiResponse]): one response (containing `InfoApiResponse`) for every row of `data`
+
+        Returns:
+            pd.DataFrame: dataframe with ruian code columns, coordinates columns and `error_msg` column
+        """
+        return self.__assemble(data, responses, lambda res: [self.__info_columns(res.response)])
+
     @staticmethod
     def code_api_details(address: str) -> Tuple:
         """Provide api details for ruian code API
@@ -82,7 +422,7 @@ class RuianFetcher(Connector):
             Tuple: (url: str, params: dict, headers: dict)
         """
 
-        return ("https://vdp.cuzk.cz/vdp/ruian/adresnimista/fulltext", \
+        return (RuianFetcher.code_api_url, \
                 
                 {'adresa': address}, \
 
@@ -111,7 +451,7 @@ class RuianFetcher(Connector):
             Tuple: (url: str, params: dict, headers: dict)
         """
 
-        return ("https://ags.cuzk.cz/arcgis/rest/services/RUIAN/Vyhledavaci_sluzba_nad_daty_RUIAN/MapServer/exts/GeocodeSOE/findAddressCandidates", \
+        return (RuianFetcher.coor_api_url, \
                 
                 {
             'SingleLine': address,
@@ -121,6 +461,20 @@ class RuianFetcher(Connector):
                 {}
         )
     
+    @staticmethod
+    def __error_response(status: int, retry_after: Optional[str] = None) -> ApiResponse:
+        """helper method to create response of failed HTTP request
+
+        Args:
+            status (int): HTTP status code
+            retry_after (Optional[str], optional): value of `Retry-After` header. Defaults to None.
+
+        Returns:
+            ApiResponse: Response with error message. Marked as transient for HTTP 429/5xx
+        """
+        return ApiResponse(response=None, error_msg=f"HTTP Error {status}", status=status, transient=is_transient_status(status),
+                           retry_after=parse_retry_after(retry_after))
+
     def __perform_api_call(self, address: str, test_if_empty: Callable[[Union[CoordinatesAPIResponse, RuianCodeApiResponse]], bool],
                     api_response_object: Type[Union[CoordinatesAPIResponse, RuianCodeApiResponse]], api_details: Callable[[str], Tuple],
                     session: Optional[requests.Session] = None) -> ApiResponse:
@@ -141,29 +495,49 @@ class RuianFetcher(Connector):
         try:
             url, params, headers = api_details(address)
 
-            with session.get(url, headers=headers, params=params) as response:
-
-                try:
-                    if response.status_code == 200:
-                        api_response = api_response_object(**response.json())
-                        if test_if_empty(api_response):
-                            return ApiResponse()
-                        return ApiResponse(response=api_response)
-                    else:
-                        return ApiResponse(response=None, error_msg=f"HTTP Error {response.status_code}")
-                    
-                except Exception as e:
-                    return ApiResponse(response=None, error_msg=f"{str(e)}")
+            endpoint = 'code' if api_response_object is RuianCodeApiResponse else 'coordinates'
+            limiter = self.rate_limiter.for_url(url)
+            limiter.acquire()
+            self.metrics.request_started(endpoint)
+            start, status = time.perf_counter(), None
+            try:
+                with session.get(url, headers=headers, params=params, timeout=self.request_timeout) as response:
+                    status = response.status_code
+
+                    try:
+                        if response.status_code == 200:
+                            if self.fast_decode:
+                                api_response = decode_response(api_response_object, response.content)
+                            else:
+                                api_response = api_response_object(**response.json())
+                            if test_if_empty(api_response):
+                                return ApiResponse(status=status)
+                            return ApiResponse(response=api_response, status=status)
+                        else:
+                            return self.__error_response(status, response.headers.get('Retry-After'))
+
+                    except Exception as e:
+                        return ApiResponse(response=None, error_msg=f"{str(e)}", status=status)
+            except requests.RequestException as e:
+                return ApiResponse(response=None, error_msg=f"{str(e)}", transient=True)
+            finally:
+                latency = time.perf_counter() - start
+                limiter.release(latency, status)
+                self.metrics.request_finished(endpoint, latency, status, limiter.concurrency.limit)
         finally:
             if requires_local_session:
                 session.close()
 
     @ensure_clean_address()
+    @resolve_locally('code')
+    @cache_response('code')
     @ensure_length_limit(limit=40)
     @retry_adjust_api_call(
         retry_count=3, 
-        retry_condition=lambda x: x.response is None,
-        param_adjuster=adjust_address
+        retry_condition=lambda x: x.response is None and x.error_msg is None,
+        transient_condition=lambda x: x.transient,
+        param_adjuster=adjust_address,
+        endpoint='code'
     )
     def fetch_ruian_code(self, address: str, session: Optional[requests.Session] = None) -> ApiResponse:
         """Fetch RUIAN code data from RUIAN API for given address
@@ -179,10 +553,14 @@ class RuianFetcher(Connector):
         return self.__perform_api_call(address=address, test_if_empty=lambda x: not x.polozky, api_response_object=RuianCodeApiResponse, api_details=RuianFetcher.code_api_details, session=session)
     
     @ensure_clean_address()
+    @resolve_locally('coordinates')
+    @cache_response('coordinates')
     @retry_adjust_api_call(
         retry_count=3, 
-        retry_condition=lambda x: x.response is None,
-        param_adjuster=adjust_address
+        retry_condition=lambda x: x.response is None and x.error_msg is None,
+        transient_condition=lambda x: x.transient,
+        param_adjuster=adjust_address,
+        endpoint='coordinates'
     )
     def fetch_coordinates(self, address: str, session: Optional[requests.Session] = None) -> ApiResponse:
         """Fetch data about coordinates from RUIAN API for given address
@@ -197,8 +575,100 @@ class RuianFetcher(Connector):
 
         return self.__perform_api_call(address=address, test_if_empty=lambda x: not x.candidates, api_response_object=CoordinatesAPIResponse, api_details=RuianFetcher.coor_api_details, session=session)
         
+    def fetch_info(self, address: str, session: Optional[requests.Session] = None) -> ApiResponse:
+        """Fetch both RUIAN code and coordinates for given address. Both APIs are queried concurrently
+
+        Args:
+            address (str): address string
+            session (requests.Session, optional): Session object for connection pooling. Defaults to None.
+
+        Returns:
+            ApiResponse: Response containing `InfoApiResponse`
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            coordinates = executor.submit(self.fetch_coordinates, address, session)
+            code = self.fetch_ruian_code(address, session)
+
+            return self.__merge_info(code, coordinates.result())
+
+    @staticmethod
+    def __merge_info(code: ApiResponse, coordinates: ApiResponse) -> ApiResponse:
+        """helper method to merge responses of code API and coordinates API
+
+        Args:
+            code (ApiResponse): response of code API
+            coordinates (ApiResponse): response of coordinates API
+
+        Returns:
+            ApiResponse: Response containing `InfoApiResponse` (None if both responses are empty)
+        """
+        errors = [e for e in (code.error_msg, coordinates.error_msg) if e is not None]
+
+        return ApiResponse(response=InfoApiResponse(code=code.response, coordinates=coordinates.response) if code.response is not None or coordinates.response is not None else None,
+                           error_msg='; '.join(errors) if errors else None, transient=code.transient or coordinates.transient)
+
+    @staticmethod
+    def __session(workers: int = 1) -> requests.Session:
+        """helper method to create session with connection pool large enough for `workers` threads
+
+        Args:
+            workers (int, optional): Number of threads sharing the session. Defaults to 1.
+
+        Returns:
+            requests.Session: Session object for connection pooling
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(workers, DEFAULT_POOLSIZE))
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        return session
+
+    def __bulk_fetch(self, fetch: Callable[..., ApiResponse], assemble: Callable[[pd.DataFrame, List[ApiResponse]], pd.DataFrame], desc: str,
+                     addresses: Optional[Tuple[str]] = None, in_file: str = '', server: str = '', db: str = '', in_table: str = '', column_name: str = 'undefined',
+                     out_file: str = '', out_table: str = '', export: bool = False, journal: str = '', resume: bool = False, workers: int = 1) -> List[ApiResponse]:
+        """helper method shared by synchronous bulk methods. Loads data, fetches every unique address once
+           (on thread pool if `workers` > 1), assembles result and exports it
+
+        Args:
+            fetch (Callable[..., ApiResponse]): fetch method e.g. `fetch_ruian_code`
+            assemble (Callable[[pd.DataFrame, List[ApiResponse]], pd.DataFrame]): function adding results to data
+            desc (str): description of progress bar
+            (other arguments are the same as in public bulk methods)
+
+        Returns:
+            List[ApiResponse]: List of `ApiResponse` objects representing responses from API
+        """
+        data, column_name = self.__load_check_data(addresses, in_file, server, db, in_table, column_name)
+        self.job_report = JobReport()
+        self.variant_memo = MemoryCache(self.memo_size)
+
+        try:
+            with self.__open_journal(journal, resume) as jr:
+                responses, unique_addresses, rows = self.__plan_fetch(data, column_name, jr)
+
+                with self.__session(workers) as se:
+                    if workers > 1:
+                        with ThreadPoolExecutor(max_workers=workers) as executor:
+                            results = bounded_map(lambda item: fetch(item[0][1], se), zip(unique_addresses, rows), executor, window=2 * workers)
+                            for ((key, _), positions), response in tqdm(results, total=len(unique_addresses), desc=desc):
+                                self.__fan_out(responses, positions, data, key, response, jr)
+                    else:
+                        for (key, query), positions in tqdm(zip(unique_addresses, rows), total=len(unique_addresses), desc=desc):
+                            self.__fan_out(responses, positions, data, key, fetch(query, se), jr)
+        finally:
+            self.variant_memo = None
+
+        data = assemble(data, responses)
+
+        if export:
+            export_data(self, data, out_file, server, db, out_table)
+
+        return responses
+
     def bulk_fetch_ruian_codes(self, addresses: Optional[Tuple[str]] = None, in_file: str = '', server: str = '', db: str = '', in_table: str = '', column_name: str = 'undefined',
-                               out_file: str = '', out_table: str = '', export: bool = False) -> List[ApiResponse]:
+                               out_file: str = '', out_table: str = '', export: bool = False, journal: str = '', resume: bool = False,
+                               workers: int = 1) -> List[ApiResponse]:
         """Batch process multiple addresses (Request RUIAN code). 
            Either from Tuple of address strings, from excel/csv by providing paths and column name or from db
            Processed data can be exported back to 
@@ -213,6 +683,9 @@ class RuianFetcher(Connector):
             out_file (str, optional): Path to output excel/csv file. Defaults to ''.
             out_table (str, optional): Name of output table. Defaults to ''.
             export (bool, optional): Whether export data into db/excel/csv. Type of export is derived from file extension. Defaults to False.
+            journal (str, optional): Path to job journal file where every finished row is recorded. Defaults to '' i.e. no journal.
+            resume (bool, optional): Whether skip rows already finished according to `journal` (e.g. after interrupted run). Defaults to False.
+            workers (int, optional): Number of threads sending requests concurrently. Defaults to 1.
 
         Raises:
             Exception: If `column_name` not present in input dataframe or No data provided
@@ -221,36 +694,12 @@ class RuianFetcher(Connector):
             List[ApiResponse]: List of `ApiResponse` objects representing responses from API
         """
 
-        data, column_name = self.__load_check_data(addresses, in_file, server, db, in_table, column_name)
-
-        data['ruian_code'] = None
-        data['code_matched_address'] = None
-        data['error_msg'] = None
-
-        responses = []
-        with requests.Session() as se:
-            for _, row in tqdm(data.iterrows(), total=data.shape[0], desc='Fetching ruian codes...'):
-                responses.append(self.fetch_ruian_code(row[column_name], se))  
-
-        ruians = [[k.kod for k in res.response.polozky] if res.response is not None else None for res in responses]
-        matches = [[n.nazev for n in res.response.polozky] if res.response is not None else None for res in responses]
-
-        e = [res.error_msg for res in responses]
-
-        data['ruian_code'] = ruians
-        data['code_matched_address'] = matches
-        data['error_msg'] = e
-
-        data = data.explode(["ruian_code", "code_matched_address"]).reset_index(drop=True)
-        
-        if export:
-            self.export(data, 'auto', out_file, server, db, out_table)
-
-        return responses
+        return self.__bulk_fetch(self.fetch_ruian_code, self.__assemble_codes, 'Fetching ruian codes...', addresses, in_file, server, db, in_table, column_name,
+                                 out_file, out_table, export, journal, resume, workers)
 
     def bulk_fetch_coordinates(self, addresses: Optional[Tuple[str]] = None, in_file: str = '', server: str = '', db: str = '', in_table: str = '', column_name: str = 'undefined',
-                               out_file: str = '', out_table: str = '', export: bool = False) -> List[ApiResponse]:
-
+                               out_file: str = '', out_table: str = '', export: bool = False, journal: str = '', resume: bool = False,
+                               workers: int = 1) -> List[ApiResponse]:
         """Batch process multiple addresses (Request coordinates).
            Either from Tuple of address strings, from excel/csv by providing paths and column name or from db
            Processed data can be exported back to 
@@ -265,47 +714,52 @@ class RuianFetcher(Connector):
             out_file (str, optional): Path to output excel/csv file. Defaults to ''.
             out_table (str, optional): Name of output table. Defaults to ''.
             export (bool, optional): Whether export data into db/excel/csv. Type of export is derived from file extension. Defaults to False.
-            
+            journal (str, optional): Path to job journal file where every finished row is recorded. Defaults to '' i.e. no journal.
+            resume (bool, optional): Whether skip rows already finished according to `journal` (e.g. after interrupted run). Defaults to False.
+            workers (int, optional): Number of threads sending requests concurrently. Defaults to 1.
+
+        Raises:
+            Exception: If `column_name` not present in input dataframe or No data provided
 
         Returns:
             List[ApiResponse]: List of `ApiResponse` objects representing responses from API
         """
 
-        data, column_name = self.__load_check_data(addresses, in_file, server, db, in_table, column_name)
-
-        data['x'] = None
-        data['y'] = None
-        data['coor_matched_address'] = None
-        data['wkid'] = None
-        data['error_msg'] = None
+        return self.__bulk_fetch(self.fetch_coordinates, self.__assemble_coordinates, 'Fetching coordinates...', addresses, in_file, server, db, in_table, column_name,
+                                 out_file, out_table, export, journal, resume, workers)
 
-        responses = []
-
-        with requests.Session() as se:
-            for _, row in tqdm(data.iterrows(), total=data.shape[0], desc='Fetching coordinates...'):
-                responses.append(self.fetch_coordinates(row[column_name], se))  
+    def bulk_fetch_info(self, addresses: Optional[Tuple[str]] = None, in_file: str = '', server: str = '', db: str = '', in_table: str = '', column_name: str = 'undefined',
+                               out_file: str = '', out_table: str = '', export: bool = False, journal: str = '', resume: bool = False,
+                               workers: int = 1) -> List[ApiResponse]:
+        """Batch process multiple addresses (Request RUIAN code and coordinates in single pass).
+           Either from Tuple of address strings, from excel/csv by providing paths and column name or from db
+           Processed data can be exported back to 
 
-        coor_x = [[n.location.x for n in res.response.candidates] if res.response is not None else None for res in responses]
-        coor_y = [[n.location.y for n in res.response.candidates] if res.response is not None else None for res in responses]
-        matches = [[n.address for n in res.response.candidates] if res.response is not None else None for res in responses]
-        wkid = [[n.location.spatialReference.latestWkid for n in res.response.candidates] if res.response is not None else None for res in responses]
+        Args:
+            addresses (Optional[Tuple[str]], optional): Tuple of address strings to be processed. Defaults to None.
+            in_file (str, optional): Path to input file. Defaults to ''.
+            server (str, optional): Name of server in local network. Defaults to ''.
+            db (str, optional): Name of MS SQL database. Defaults to ''.
+            in_table (str, optional): Name of input table. Defaults to ''.
+            column_name (str, optional): Name of column where are addresses. Defaults to 'undefined'.
+            out_file (str, optional): Path to output excel/csv file. Defaults to ''.
+            out_table (str, optional): Name of output table. Defaults to ''.
+            export (bool, optional): Whether export data into db/excel/csv. Type of export is derived from file extension. Defaults to False.
+            journal (str, optional): Path to job journal file where every finished row is recorded. Defaults to '' i.e. no journal.
+            resume (bool, optional): Whether skip rows already finished according to `journal` (e.g. after interrupted run). Defaults to False.
+            workers (int, optional): Number of threads sending requests concurrently. Defaults to 1.
 
-        e = [res.error_msg for res in responses]
+        Raises:
+            Exception: If `column_name` not present in input dataframe or No data provided
 
-        data['x'] = coor_x
-        data['y'] = coor_y
-        data['coor_matched_address'] = matches
-        data['wkid'] = wkid
-        data['error_msg'] = e
+        Returns:
+            List[ApiResponse]: List of `ApiResponse` objects representing responses from API
+        """
 
-        data = data.explode(["x", "y", "coor_matched_address", "wkid"]).reset_index(drop=True)
+        return self.__bulk_fetch(self.fetch_info, self.__assemble_info, 'Fetching ruian codes & coordinates...', addresses, in_file, server, db, in_table, column_name,
+                                 out_file, out_table, export, journal, resume, workers)
 
-        if export:
-            self.export(data, 'auto', out_file, server, db, out_table)
 
-        return responses
-    
-    
     async def __aperform_api_call(self, address: str, test_if_empty: Callable[[Union[CoordinatesAPIResponse, RuianCodeApiResponse]], bool],
                     api_response_object: Union[CoordinatesAPIResponse, RuianCodeApiResponse], api_details: Callable[[str], Tuple],
                     session: Optional[aiohttp.ClientSession] = None, semaphore: Optional[asyncio.Semaphore] = None) -> ApiResponse:
@@ -317,7 +771,7 @@ class RuianFetcher(Connector):
             api_response_object (Union[CoordinatesAPIResponse, RuianCodeApiResponse]): object in which data will be encapsulated
             api_details (Callable[[str], Tuple]): static method/function to provide api call details like url, params and headers
             session (aiohttp.ClientSession, optional): Session object for connection pooling. Defaults to None.
-            semaphore (asyncio.Semaphore, optional): Semaphore object for basic rate limiting. Defaults to None.
+            semaphore (asyncio.Semaphore, optional): Optional additional cap on concurrency on top of `rate_limiter`. Defaults to None.
         Returns:
             ApiResponse: Response of API
         """
@@ -325,45 +779,66 @@ class RuianFetcher(Connector):
         if requires_local_session:
             session = aiohttp.ClientSession()
 
-        requires_local_semaphore = semaphore is None
-        if requires_local_semaphore:
-            semaphore = asyncio.Semaphore(5) # max 5 concurrent requests
-
         try:
 
             url, params, headers = api_details(address)
 
-            async with semaphore:  
+            async with semaphore if semaphore is not None else contextlib.nullcontext():
+                endpoint = 'code' if api_response_object is RuianCodeApiResponse else 'coordinates'
+                limiter = self.rate_limiter.for_url(url)
+                await limiter.aacquire()
+                self.metrics.request_started(endpoint)
+                start, status, cancelled = time.perf_counter(), None, False
                 try:
-                    async with session.get(url=url, headers=headers, params=params) as response:
+                    async with session.get(url=url, headers=headers, params=params, timeout=aiohttp.ClientTimeout(total=self.request_timeout)) as response:
+                        status = response.status
                         if response.status == 200:
-                            try:
-                                json_data = await response.json()
-                            except aiohttp.ContentTypeError:
-                                data = await response.read()
-                                json_data = json.loads(data)
+                            if self.fast_decode:
+                                api_response = decode_response(api_response_object, await response.read())
+                            else:
+                                try:
+                                    json_data = await response.json()
+                                except aiohttp.ContentTypeError:
+                                    data = await response.read()
+                                    json_data = json.loads(data)
 
-                            api_response = api_response_object(**json_data)
+                                api_response = api_response_object(**json_data)
 
                             if test_if_empty(api_response):
-                                return ApiResponse()
-                            return ApiResponse(response=api_response)
+                                return ApiResponse(status=status)
+                            return ApiResponse(response=api_response, status=status)
                         else:
-                            return ApiResponse(response=None, error_msg=f"HTTP Error {response.status}")
+                            return self.__error_response(status, response.headers.get('Retry-After'))
+                except asyncio.CancelledError:
+                    cancelled = True
+                    raise
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    return ApiResponse(response=None, error_msg=f"{str(e) or type(e).__name__}", status=status, transient=True)
                 except Exception as e:
-                    return ApiResponse(response=None, error_msg=f"{str(e)}")
+                    return ApiResponse(response=None, error_msg=f"{str(e)}", status=status)
+                finally:
+                    if cancelled:
+                        limiter.abandon()  # cancelled request (e.g. by hedging) says nothing about health of upstream
+                        self.metrics.in_flight.inc(-1, endpoint=endpoint)
+                    else:
+                        latency = time.perf_counter() - start
+                        limiter.release(latency, status)
+                        self.metrics.request_finished(endpoint, latency, status, limiter.concurrency.limit)
         finally:
             if requires_local_session:
-                session.close()
-            if requires_local_semaphore:
-                semaphore.release()
+                await session.close()
 
     @aensure_clean_address()
+    @asingle_flight('code')
+    @aresolve_locally('code')
+    @acache_response('code')
     @aensure_length_limit(limit=40)
     @aretry_adjust_api_call(
         retry_count=3, 
-        retry_condition=lambda x: x.response is None,
-        param_adjuster=adjust_address
+        retry_condition=lambda x: x.response is None and x.error_msg is None,
+        transient_condition=lambda x: x.transient,
+        param_adjuster=adjust_address,
+        endpoint='code'
     )
     async def afetch_ruian_code(self, address: str,
                                 session: Optional[aiohttp.ClientSession] = None, semaphore: Optional[asyncio.Semaphore] = None) -> ApiResponse:
@@ -372,7 +847,7 @@ class RuianFetcher(Connector):
         Args:
             address (str): address string
             session (aiohttp.ClientSession, optional): Session object for connection pooling. Defaults to None.
-            semaphore (asyncio.Semaphore, optional): Semaphore object for basic rate limiting. Defaults to None.
+            semaphore (asyncio.Semaphore, optional): Optional additional cap on concurrency on top of `rate_limiter`. Defaults to None.
         Returns:
             ApiResponse: Response of API
         """
@@ -380,11 +855,16 @@ class RuianFetcher(Connector):
         return await self.__aperform_api_call(address=address, test_if_empty=lambda x: not x.polozky, api_response_object=RuianCodeApiResponse, api_details=RuianFetcher.code_api_details,
                                               session=session, semaphore=semaphore)
 
-    @aensure_clean_address()         
+    @aensure_clean_address()
+    @asingle_flight('coordinates')
+    @aresolve_locally('coordinates')
+    @acache_response('coordinates')
     @aretry_adjust_api_call(
         retry_count=3, 
-        retry_condition=lambda x: x.response is None,
-        param_adjuster=adjust_address
+        retry_condition=lambda x: x.response is None and x.error_msg is None,
+        transient_condition=lambda x: x.transient,
+        param_adjuster=adjust_address,
+        endpoint='coordinates'
     )
     async def afetch_coordinates(self, address: str,
                                  session: Optional[aiohttp.ClientSession] = None, semaphore: Optional[asyncio.Semaphore] = None) -> ApiResponse:
@@ -394,7 +874,7 @@ class RuianFetcher(Connector):
             address (str): address string
             session (aiohttp.ClientSession, optional): 
             session (aiohttp.ClientSession, optional): Session object for connection pooling. Defaults to None.
-            semaphore (asyncio.Semaphore, optional): Semaphore object for basic rate limiting. Defaults to None.
+            semaphore (asyncio.Semaphore, optional): Optional additional cap on concurrency on top of `rate_limiter`. Defaults to None.
         Returns:
             ApiResponse: Response of API
         """
@@ -403,70 +883,243 @@ class RuianFetcher(Connector):
                                               session=session, semaphore=semaphore)
 
 
-    async def abulk_fetch_ruian_codes(self, addresses: Optional[Tuple[str]] = None, in_file: str = '', server: str = '', db: str = '', in_table: str = '', column_name: str = 'undefined',
-                                     out_file: str = '', out_table: str = '', export: bool = False) -> List[ApiResponse]:
-        """Asynchronously batch process multiple addresses
+    async def afetch_info(self, address: str,
+                          session: Optional[aiohttp.ClientSession] = None, semaphore: Optional[asyncio.Semaphore] = None) -> ApiResponse:
+        """Asynchronous implementation of `fetch_info` method. Both APIs are queried concurrently
 
         Args:
-            addresses (Optional[Tuple[str]], optional): Tuple of address strings to be processed. Defaults to None.
-            in_file (str, optional): Path to input file. Defaults to ''.
-            server (str, optional): Name of server in local network. Defaults to ''.
-            db (str, optional): Name of MS SQL database. Defaults to ''.
-            in_table (str, optional): Name of input table. Defaults to ''.
-            column_name (str, optional): Name of column where are addresses. Defaults to 'undefined'.
-            out_file (str, optional): Path to output excel/csv file. Defaults to ''.
-            out_table (str, optional): Name of output table. Defaults to ''.
-            export (bool, optional): Whether export data into db/excel/csv. Type of export is derived from file extension. Defaults to False.
+            address (str): address string
+            session (aiohttp.ClientSession, optional): Session object for connection pooling. Defaults to None.
+            semaphore (asyncio.Semaphore, optional): Optional additional cap on concurrency on top of `rate_limiter`. Defaults to None.
+        Returns:
+            ApiResponse: Response containing `InfoApiResponse`
+        """
+
+        code, coordinates = await asyncio.gather(self.afetch_ruian_code(address, session, semaphore), self.afetch_coordinates(address, session, semaphore))
+
+        return self.__merge_info(code, coordinates)
+
+    def __async_task(self, task: str) -> Tuple[Callable[..., Awaitable[ApiResponse]], Callable[[pd.DataFrame, List[ApiResponse]], pd.DataFrame], str]:
+        """Get async fetch method, assemble method and progress bar description of given task.
+           Tasks are referenced by name so they can be passed to worker processes
+
+        Args:
+            task (str): one of 'code', 'coordinates', 'info'
 
         Returns:
-            List[ApiResponse]: List of `ApiResponse` objects representing responses from API
+            Tuple[Callable, Callable, str]: (fetch, assemble, desc)
         """
-        data, column_name = self.__load_check_data(addresses, in_file, server, db, in_table, column_name)
-        
-        data['ruian_code'] = None
-        data['code_matched_address'] = None
-        data['error_msg'] = None
+        tasks = {'code': (self.afetch_ruian_code, self.__assemble_codes, 'Fetching ruian codes...'),
+                 'coordinates': (self.afetch_coordinates, self.__assemble_coordinates, 'Fetching coordinates...'),
+                 'info': (self.afetch_info, self.__assemble_info, 'Fetching ruian codes & coordinates...')}
+        if task not in tasks:
+            raise Exception(f"Unknown task `{task}`. Use one of {list(tasks)}")
+        return tasks[task]
+
+    async def __afetch_data(self, task: str, data: pd.DataFrame, column_name: str, journal: Optional[JobJournal] = None,
+                            progress: bool = True) -> Tuple[pd.DataFrame, List[ApiResponse]]:
+        """Fetch every unique address of `data` once and assemble result
+
+        Args:
+            task (str): one of 'code', 'coordinates', 'info'
+            data (pd.DataFrame): data with addresses
+            column_name (str): Name of column where are addresses
+            journal (Optional[JobJournal], optional): journal of finished rows. Defaults to None.
+            progress (bool, optional): Whether show progress bar. Defaults to True.
 
+        Returns:
+            Tuple[pd.DataFrame, List[ApiResponse]]: assembled data and responses of every row
+        """
+        fetch, assemble, desc = self.__async_task(task)
         tasks = []
-        responses = []
 
-        semaphore = asyncio.Semaphore(5)
+        async def fetch_and_fan_out(key: str, query: str, positions: np.ndarray, se: aiohttp.ClientSession) -> None:
+            self.__fan_out(responses, positions, data, key, await fetch(query, se), journal)
+
+        responses, unique_addresses, rows = self.__plan_fetch(data, column_name, journal)
 
         async with aiohttp.ClientSession() as se:
-            # prepare tasks for each row in the DataFrame
-            for _, row in data.iterrows():
-                address = row[column_name]
-                coro = self.afetch_ruian_code(address, se, semaphore)  # note that async func returns awaitable object particularly coroutine
+            # prepare tasks for each unique address
+            for (key, query), positions in zip(unique_addresses, rows):
+                coro = fetch_and_fan_out(key, query, positions, se)  # note that async func returns awaitable object particularly coroutine
                 tasks.append(coro)
 
-            # Using tqdm for async progress tracking  ... not in order
-            #responses = []
-            #async for result in async_tqdm(asyncio.as_completed(tasks), total=len(tasks), desc='Fetching ruian codes...'):
-            #    response = await result
-            #    responses.append(response)
+            await async_tqdm.gather(*tasks, desc=desc, total=len(tasks), disable=not progress)  # every task fans out its response to rows of DF
 
-            #responses = [await f for f in async_tqdm(asyncio.as_completed(tasks), total=len(tasks), desc='Fetching ruian codes..')]
+        return assemble(data, responses), responses
 
-            responses = await async_tqdm.gather(*tasks, desc="Fetching ruian codes...", total=len(tasks))  # keeps order of DF which is what we want
+    @staticmethod
+    def init_worker(fetcher: 'RuianFetcher') -> None:
+        """Initializer of worker process of sharded bulk job. Fetcher (with its share of rate limits) is unpickled once
+           per process so token buckets and concurrency limits of worker live as long as the pool
 
-        ruians = [[k.kod for k in res.response.polozky] if res.response is not None else None for res in responses]
-        matches = [[n.nazev for n in res.response.polozky] if res.response is not None else None for res in responses]
+        Args:
+            fetcher (RuianFetcher): fetcher used by all shards of this process
+        """
+        fetcher.variant_memo = MemoryCache(fetcher.memo_size)
+        RuianFetcher.worker = fetcher
 
-        e = [res.error_msg for res in responses]
+    @staticmethod
+    def fetch_shard(task: str, queries: List[str]) -> Tuple[List[str], Metrics]:
+        """Fetch shard of unique addresses of sharded bulk job in own event loop of worker process (see `init_worker`)
 
-        data['ruian_code'] = ruians
-        data['code_matched_address'] = matches
-        data['error_msg'] = e
+        Args:
+            task (str): one of 'code', 'coordinates', 'info'
+            queries (List[str]): unique normalized addresses
+
+        Returns:
+            Tuple[List[str], Metrics]: serialized response (`ApiResponse.model_dump_json`) of every address and metrics of shard
+        """
+        fetcher = RuianFetcher.worker
+        fetcher.metrics = Metrics()
+        fetch = fetcher.__async_task(task)[0]
+
+        async def fetch_all() -> List[ApiResponse]:
+            async with aiohttp.ClientSession() as se:
+                return await asyncio.gather(*(fetch(query, se) for query in queries))
 
-        data = data.explode(["ruian_code", "code_matched_address"]).reset_index(drop=True)
+        return [response.model_dump_json() for response in asyncio.run(fetch_all())], fetcher.metrics
+
+    @staticmethod
+    def assemble_shard(task: str, data: pd.DataFrame, payloads: List[str], positions: List[int]) -> pd.DataFrame:
+        """Assemble result of shard of rows of sharded bulk job in worker process (see `init_worker`)
+
+        Args:
+            task (str): one of 'code', 'coordinates', 'info'
+            data (pd.DataFrame): shard of rows
+            payloads (List[str]): serialized distinct responses of shard
+            positions (List[int]): position of response of every row in `payloads`
+
+        Returns:
+            pd.DataFrame: assembled shard
+        """
+        responses = [decode_api_response(payload) for payload in payloads]
+        return RuianFetcher.worker.__async_task(task)[1](data, [responses[position] for position in positions])
+
+    @staticmethod
+    def __shard_bounds(size: int, processes: int) -> List[Tuple[int, int]]:
+        # more shards than processes so slow shard does not stall whole pool
+        bounds = np.linspace(0, size, min(processes * 4, size) + 1).astype(int)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    async def __afetch_sharded(self, task: str, data: pd.DataFrame, column_name: str, journal: Optional[JobJournal] = None,
+                               processes: int = 2) -> Tuple[pd.DataFrame, List[ApiResponse]]:
+        """Fetch `data` by pool of worker processes (each running own event loop). Address column is normalized and results
+           are assembled by workers in shards of rows, restore and deduplication (see `__plan_fetch`) are done here once and
+           unique addresses are fetched by workers in shards of unique addresses. Responses cross process boundary serialized
+           as JSON. Rate limits are divided among processes
+
+        Args:
+            task (str): one of 'code', 'coordinates', 'info'
+            data (pd.DataFrame): data with addresses
+            column_name (str): Name of column where are addresses
+            journal (Optional[JobJournal], optional): journal of finished rows. Defaults to None.
+            processes (int, optional): Number of worker processes. Defaults to 2.
+
+        Returns:
+            Tuple[pd.DataFrame, List[ApiResponse]]: assembled data and responses of every row
+        """
+        desc = self.__async_task(task)[2]
+        # every process gets own copy of fetcher so limiter budget is split to keep overall rate
+        worker = copy.copy(self)
+        worker.rate_limiter = self.rate_limiter.split(processes)
+        loop = asyncio.get_running_loop()
+        row_shards = self.__shard_bounds(data.shape[0], processes)
+        payloads: Dict[int, str] = {}  # serialized responses by id of response object
+
+        def payload(response: ApiResponse) -> str:
+            if id(response) not in payloads:
+                payloads[id(response)] = response.model_dump_json()
+            return payloads[id(response)]
+
+        async def fetch_shard(start: int, stop: int) -> None:
+            shard, metrics = await loop.run_in_executor(executor, RuianFetcher.fetch_shard, task, [query for _, query in unique_addresses[start:stop]])
+            self.metrics.merge(metrics)
+            for (key, _), positions, serialized in zip(unique_addresses[start:stop], rows[start:stop], shard):
+                response = decode_api_response(serialized)
+                payloads[id(response)] = serialized
+                self.__fan_out(responses, positions, data, key, response, journal)
+
+        async def assemble_shard(start: int, stop: int) -> pd.DataFrame:
+            distinct: Dict[int, int] = {}
+            serialized, positions = [], []
+            for response in responses[start:stop]:
+                if id(response) not in distinct:
+                    distinct[id(response)] = len(serialized)
+                    serialized.append(payload(response))
+                positions.append(distinct[id(response)])
+            return await loop.run_in_executor(executor, RuianFetcher.assemble_shard, task, data.iloc[start:stop], serialized, positions)
+
+        with ProcessPoolExecutor(max_workers=processes, initializer=RuianFetcher.init_worker, initargs=(worker,)) as executor:
+            normalized = await asyncio.gather(*(loop.run_in_executor(executor, AddressFormatter.normalize_column, data[column_name].iloc[start:stop])
+                                                for start, stop in row_shards))
+            responses, unique_addresses, rows = self.__plan_fetch(data, column_name, journal, pd.concat(normalized))
+
+            await async_tqdm.gather(*(fetch_shard(start, stop) for start, stop in self.__shard_bounds(len(unique_addresses), processes)),
+                                    desc=f"{desc} ({processes} processes)", unit=' shards')
+            assembled = await asyncio.gather(*(assemble_shard(start, stop) for start, stop in row_shards))
+
+        return pd.concat(assembled, ignore_index=True), responses
+
+    async def __abulk_fetch(self, task: str, addresses: Optional[Tuple[str]] = None, in_file: str = '', server: str = '', db: str = '', in_table: str = '',
+                            column_name: str = 'undefined', out_file: str = '', out_table: str = '', export: bool = False, journal: str = '', resume: bool = False,
+                            processes: int = 1) -> List[ApiResponse]:
+        """helper method shared by asynchronous bulk methods. Loads data, fetches every unique address once,
+           assembles result and exports it
+
+        Args:
+            task (str): one of 'code', 'coordinates', 'info'
+            (other arguments are the same as in public bulk methods)
+
+        Returns:
+            List[ApiResponse]: List of `ApiResponse` objects representing responses from API
+        """
+        data, column_name = self.__load_check_data(addresses, in_file, server, db, in_table, column_name)
+
+        self.job_report = JobReport()
+        self.variant_memo = MemoryCache(self.memo_size)
+        try:
+            with self.__open_journal(journal, resume) as jr:
+                if processes > 1 and data.shape[0] > 1:
+                    data, responses = await self.__afetch_sharded(task, data, column_name, jr, processes)
+                else:
+                    data, responses = await self.__afetch_data(task, data, column_name, jr)
+        finally:
+            self.variant_memo = None
 
         if export:
-            self.export(data, 'auto', out_file, server, db, out_table)
+            export_data(self, data, out_file, server, db, out_table)
 
         return responses
 
+    async def abulk_fetch_ruian_codes(self, addresses: Optional[Tuple[str]] = None, in_file: str = '', server: str = '', db: str = '', in_table: str = '', column_name: str = 'undefined',
+                                     out_file: str = '', out_table: str = '', export: bool = False, journal: str = '', resume: bool = False,
+                                     processes: int = 1) -> List[ApiResponse]:
+        """Asynchronously batch process multiple addresses
+
+        Args:
+            addresses (Optional[Tuple[str]], optional): Tuple of address strings to be processed. Defaults to None.
+            in_file (str, optional): Path to input file. Defaults to ''.
+            server (str, optional): Name of server in local network. Defaults to ''.
+            db (str, optional): Name of MS SQL database. Defaults to ''.
+            in_table (str, optional): Name of input table. Defaults to ''.
+            column_name (str, optional): Name of column where are addresses. Defaults to 'undefined'.
+            out_file (str, optional): Path to output excel/csv file. Defaults to ''.
+            out_table (str, optional): Name of output table. Defaults to ''.
+            export (bool, optional): Whether export data into db/excel/csv. Type of export is derived from file extension. Defaults to False.
+            journal (str, optional): Path to job journal file where every finished row is recorded. Defaults to '' i.e. no journal.
+            resume (bool, optional): Whether skip rows already finished according to `journal` (e.g. after interrupted run). Defaults to False.
+            processes (int, optional): Number of worker processes. If greater than 1 input is split into shards processed in parallel
+                by separate processes (each with own event loop) and merged in original order. Defaults to 1.
+
+        Returns:
+            List[ApiResponse]: List of `ApiResponse` objects representing responses from API
+        """
+        return await self.__abulk_fetch('code', addresses, in_file, server, db, in_table, column_name, out_file, out_table, export, journal, resume, processes)
+
     async def abulk_fetch_coordinates(self, addresses: Optional[Tuple[str]] = None, in_file: str = '', server: str = '', db: str = '', in_table: str = '', column_name: str = 'undefined',
-                                     out_file: str = '', out_table: str = '', export: bool = False) -> List[ApiResponse]:
+                                     out_file: str = '', out_table: str = '', export: bool = False, journal: str = '', resume: bool = False,
+                                     processes: int = 1) -> List[ApiResponse]:
         """Asynchronously batch process multiple addresses
 
         Args:
@@ -479,52 +1132,195 @@ class RuianFetcher(Connector):
             out_file (str, optional): Path to output excel/csv file. Defaults to ''.
             out_table (str, optional): Name of output table. Defaults to ''.
             export (bool, optional): Whether export data into db/excel/csv. Type of export is derived from file extension. Defaults to False.
+            journal (str, optional): Path to job journal file where every finished row is recorded. Defaults to '' i.e. no journal.
+            resume (bool, optional): Whether skip rows already finished according to `journal` (e.g. after interrupted run). Defaults to False.
+            processes (int, optional): Number of worker processes. If greater than 1 input is split into shards processed in parallel
+                by separate processes (each with own event loop) and merged in original order. Defaults to 1.
 
         Returns:
             List[ApiResponse]: List of `ApiResponse` objects representing responses from API
         """
-        data, column_name = self.__load_check_data(addresses, in_file, server, db, in_table, column_name)
+        return await self.__abulk_fetch('coordinates', addresses, in_file, server, db, in_table, column_name, out_file, out_table, export, journal, resume, processes)
 
+    async def abulk_fetch_info(self, addresses: Optional[Tuple[str]] = None, in_file: str = '', server: str = '', db: str = '', in_table: str = '', column_name: str = 'undefined',
+                                     out_file: str = '', out_table: str = '', export: bool = False, journal: str = '', resume: bool = False,
+                                     processes: int = 1) -> List[ApiResponse]:
+        """Asynchronously batch process multiple addresses (Request RUIAN code and coordinates in single pass)
 
-        data['x'] = None
-        data['y'] = None
-        data['coor_matched_address'] = None
-        data['wkid'] = None
-        data['error_msg'] = None
+        Args:
+            addresses (Optional[Tuple[str]], optional): Tuple of address strings to be processed. Defaults to None.
+            in_file (str, optional): Path to input file. Defaults to ''.
+            server (str, optional): Name of server in local network. Defaults to ''.
+            db (str, optional): Name of MS SQL database. Defaults to ''.
+            in_table (str, optional): Name of input table. Defaults to ''.
+            column_name (str, optional): Name of column where are addresses. Defaults to 'undefined'.
+            out_file (str, optional): Path to output excel/csv file. Defaults to ''.
+            out_table (str, optional): Name of output table. Defaults to ''.
+            export (bool, optional): Whether export data into db/excel/csv. Type of export is derived from file extension. Defaults to False.
+            journal (str, optional): Path to job journal file where every finished row is recorded. Defaults to '' i.e. no journal.
+            resume (bool, optional): Whether skip rows already finished according to `journal` (e.g. after interrupted run). Defaults to False.
+            processes (int, optional): Number of worker processes. If greater than 1 input is split into shards processed in parallel
+                by separate processes (each with own event loop) and merged in original order. Defaults to 1.
 
-        responses = []
-        tasks = []
+        Returns:
+            List[ApiResponse]: List of `ApiResponse` objects representing responses from API
+        """
+        return await self.__abulk_fetch('info', addresses, in_file, server, db, in_table, column_name, out_file, out_table, export, journal, resume, processes)
 
-        semaphore = asyncio.Semaphore(5)
+    async def __apipeline_fetch(self, fetch: Callable[..., Awaitable[ApiResponse]], assemble: Callable[[pd.DataFrame, List[ApiResponse]], pd.DataFrame],
+                                chunks: Iterator[Tuple[pd.DataFrame, str]], sink: ResultSink, window: int, desc: str,
+                                journal: Optional[JobJournal] = None) -> JobReport:
+        """helper method running bounded-window pipeline. Chunks are read lazily, at most `window` requests are in flight
+           and every chunk is written to `sink` (in order) as soon as all its addresses are resolved
 
-        async with aiohttp.ClientSession() as se:
-            # prepare tasks for each row in the DataFrame
-            for _, row in data.iterrows():
-                address = row[column_name]
-                coro = self.afetch_coordinates(address, se, semaphore)  # note that async func returns awaitable object particularly coroutine
-                tasks.append(coro)
+        Args:
+            fetch (Callable[..., Awaitable[ApiResponse]]): async fetch method e.g. `afetch_ruian_code`
+            assemble (Callable[[pd.DataFrame, List[ApiResponse]], pd.DataFrame]): function adding results to chunk
+            chunks (Iterator[Tuple[pd.DataFrame, str]]): chunks of input data and column name
+            sink (ResultSink): output sink
+            window (int): maximal number of requests in flight
+            desc (str): description of progress bar
+            journal (JobJournal, optional): journal of finished rows. Defaults to None.
+
+        Returns:
+            JobReport: report of processed job
+        """
+        self.job_report = JobReport()
+        self.variant_memo = MemoryCache(self.memo_size)
+        states = {}
+        flushed = 0
+
+        def items():
+            for chunk_no, (data, column_name) in enumerate(chunks):
+                responses, unique_addresses, rows = self.__plan_fetch(data, column_name, journal)
+                states[chunk_no] = {'data': data, 'responses': responses, 'remaining': len(unique_addresses)}
+                for (key, query), positions in zip(unique_addresses, rows):
+                    yield chunk_no, key, query, positions
+
+        def flush():
+            nonlocal flushed
+            while flushed in states and states[flushed]['remaining'] == 0:
+                state = states.pop(flushed)
+                sink.write(assemble(state['data'], state['responses']))
+                flushed += 1
+
+        try:
+            async with aiohttp.ClientSession() as se:
+                with tqdm(desc=desc, unit=' addresses') as progress:
+                    async for (chunk_no, key, _, positions), response in abounded_map(lambda item: fetch(item[2], se), items(), window):
+                        state = states[chunk_no]
+                        self.__fan_out(state['responses'], positions, state['data'], key, response, journal)
+                        state['remaining'] -= 1
+                        progress.update()
+                        flush()
+            flush()
+        finally:
+            self.variant_memo = None
+        sink.close()
 
-            responses = await async_tqdm.gather(*tasks, desc="Fetching coordinates...", total=len(tasks))  # keeps order of DF
+        return self.job_report
 
-        coor_x = [[n.location.x for n in res.response.candidates] if res.response is not None else None for res in responses]
-        coor_y = [[n.location.y for n in res.response.candidates] if res.response is not None else None for res in responses]
-        matches = [[n.address for n in res.response.candidates] if res.response is not None else None for res in responses]
-        wkid = [[n.location.spatialReference.latestWkid for n in res.response.candidates] if res.response is not None else None for res in responses]
+    async def apipeline_fetch_ruian_codes(self, addresses: Optional[Tuple[str]] = None, in_file: str = '', server: str = '', db: str = '', in_table: str = '', column_name: str = 'undefined',
+                                          out_file: str = '', out_table: str = '', chunk_size: int = 10000, window: int = 100,
+                                          journal: str = '', resume: bool = False, key_column: str = '') -> JobReport:
+        """Asynchronously process multiple addresses (Request RUIAN code) in streaming fashion with bounded memory.
+           Input is read in chunks of `chunk_size` rows, at most `window` requests are in flight and results
+           are written to output chunk by chunk (csv, parquet, arrow and database output with `key_column` are written incrementally,
+           other outputs are exported at the end)
 
-        e = [res.error_msg for res in responses]
+        Args:
+            addresses (Optional[Tuple[str]], optional): Tuple of address strings to be processed. Defaults to None.
+            in_file (str, optional): Path to input file. Defaults to ''.
+            server (str, optional): Name of server in local network. Defaults to ''.
+            db (str, optional): Name of MS SQL database. Defaults to ''.
+            in_table (str, optional): Name of input table. Defaults to ''.
+            column_name (str, optional): Name of column where are addresses. Defaults to 'undefined'.
+            out_file (str, optional): Path to output excel/csv file. Defaults to ''.
+            out_table (str, optional): Name of output table. Defaults to ''.
+            chunk_size (int, optional): Number of rows read and written at once. Defaults to 10000.
+            window (int, optional): Maximal number of requests in flight. Defaults to 100.
+            journal (str, optional): Path to job journal file where every finished row is recorded. Defaults to '' i.e. no journal.
+            resume (bool, optional): Whether skip rows already finished according to `journal` (e.g. after interrupted run). Defaults to False.
+            key_column (str, optional): Name of column uniquely identifying rows of `in_table` (e.g. primary key). If provided, only address
+                and key columns of `in_table` are read in chunks and results are upserted into `out_table` chunk by chunk keyed by it
+                (requires `pyodbc`). Defaults to '' i.e. whole table is loaded and exported at once.
 
-        data['x'] = coor_x
-        data['y'] = coor_y
-        data['coor_matched_address'] = matches
-        data['wkid'] = wkid
-        data['error_msg'] = e
+        Returns:
+            JobReport: report of processed job
+        """
+        chunks = self.__iter_load_check_data(addresses, in_file, server, db, in_table, column_name, chunk_size, key_column)
+        sink = make_sink(self, out_file, server, db, out_table, key_column)
 
-        data = data.explode(["x", "y", "coor_matched_address", "wkid"]).reset_index(drop=True)
+        with self.__open_journal(journal, resume) as jr:
+            return await self.__apipeline_fetch(self.afetch_ruian_code, self.__assemble_codes, chunks, sink, window, 'Fetching ruian codes...', jr)
 
-        if export:
-            self.export(data, 'auto', out_file, server, db, out_table)
+    async def apipeline_fetch_coordinates(self, addresses: Optional[Tuple[str]] = None, in_file: str = '', server: str = '', db: str = '', in_table: str = '', column_name: str = 'undefined',
+                                          out_file: str = '', out_table: str = '', chunk_size: int = 10000, window: int = 100,
+                                          journal: str = '', resume: bool = False, key_column: str = '') -> JobReport:
+        """Asynchronously process multiple addresses (Request coordinates) in streaming fashion with bounded memory.
+           Input is read in chunks of `chunk_size` rows, at most `window` requests are in flight and results
+           are written to output chunk by chunk (csv, parquet, arrow and database output with `key_column` are written incrementally,
+           other outputs are exported at the end)
 
-        return responses
+        Args:
+            addresses (Optional[Tuple[str]], optional): Tuple of address strings to be processed. Defaults to None.
+            in_file (str, optional): Path to input file. Defaults to ''.
+            server (str, optional): Name of server in local network. Defaults to ''.
+            db (str, optional): Name of MS SQL database. Defaults to ''.
+            in_table (str, optional): Name of input table. Defaults to ''.
+            column_name (str, optional): Name of column where are addresses. Defaults to 'undefined'.
+            out_file (str, optional): Path to output excel/csv file. Defaults to ''.
+            out_table (str, optional): Name of output table. Defaults to ''.
+            chunk_size (int, optional): Number of rows read and written at once. Defaults to 10000.
+            window (int, optional): Maximal number of requests in flight. Defaults to 100.
+            journal (str, optional): Path to job journal file where every finished row is recorded. Defaults to '' i.e. no journal.
+            resume (bool, optional): Whether skip rows already finished according to `journal` (e.g. after interrupted run). Defaults to False.
+            key_column (str, optional): Name of column uniquely identifying rows of `in_table` (e.g. primary key). If provided, only address
+                and key columns of `in_table` are read in chunks and results are upserted into `out_table` chunk by chunk keyed by it
+                (requires `pyodbc`). Defaults to '' i.e. whole table is loaded and exported at once.
+
+        Returns:
+            JobReport: report of processed job
+        """
+        chunks = self.__iter_load_check_data(addresses, in_file, server, db, in_table, column_name, chunk_size, key_column)
+        sink = make_sink(self, out_file, server, db, out_table, key_column)
+
+        with self.__open_journal(journal, resume) as jr:
+            return await self.__apipeline_fetch(self.afetch_coordinates, self.__assemble_coordinates, chunks, sink, window, 'Fetching coordinates...', jr)
+
+    async def apipeline_fetch_info(self, addresses: Optional[Tuple[str]] = None, in_file: str = '', server: str = '', db: str = '', in_table: str = '', column_name: str = 'undefined',
+                                          out_file: str = '', out_table: str = '', chunk_size: int = 10000, window: int = 100,
+                                          journal: str = '', resume: bool = False, key_column: str = '') -> JobReport:
+        """Asynchronously process multiple addresses (Request RUIAN code and coordinates in single pass) in streaming fashion with bounded memory.
+           Input is read in chunks of `chunk_size` rows, at most `window` requests are in flight and results
+           are written to output chunk by chunk (csv, parquet, arrow and database output with `key_column` are written incrementally,
+           other outputs are exported at the end)
+
+        Args:
+            addresses (Optional[Tuple[str]], optional): Tuple of address strings to be processed. Defaults to None.
+            in_file (str, optional): Path to input file. Defaults to ''.
+            server (str, optional): Name of server in local network. Defaults to ''.
+            db (str, optional): Name of MS SQL database. Defaults to ''.
+            in_table (str, optional): Name of input table. Defaults to ''.
+            column_name (str, optional): Name of column where are addresses. Defaults to 'undefined'.
+            out_file (str, optional): Path to output excel/csv file. Defaults to ''.
+            out_table (str, optional): Name of output table. Defaults to ''.
+            chunk_size (int, optional): Number of rows read and written at once. Defaults to 10000.
+            window (int, optional): Maximal number of requests in flight. Defaults to 100.
+            journal (str, optional): Path to job journal file where every finished row is recorded. Defaults to '' i.e. no journal.
+            resume (bool, optional): Whether skip rows already finished according to `journal` (e.g. after interrupted run). Defaults to False.
+            key_column (str, optional): Name of column uniquely identifying rows of `in_table` (e.g. primary key). If provided, only address
+                and key columns of `in_table` are read in chunks and results are upserted into `out_table` chunk by chunk keyed by it
+                (requires `pyodbc`). Defaults to '' i.e. whole table is loaded and exported at once.
+
+        Returns:
+            JobReport: report of processed job
+        """
+        chunks = self.__iter_load_check_data(addresses, in_file, server, db, in_table, column_name, chunk_size, key_column)
+        sink = make_sink(self, out_file, server, db, out_table, key_column)
+
+        with self.__open_journal(journal, resume) as jr:
+            return await self.__apipeline_fetch(self.afetch_info, self.__assemble_info, chunks, sink, window, 'Fetching ruian codes & coordinates...', jr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+import asyncio
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, Tuple
+
+
+async def abounded_map(func: Callable[[Any], Awaitable[Any]], items: Iterable[Any], window: int = 100) -> AsyncIterator[Tuple[Any, Any]]:
+    """Run `func` for every item of `items` keeping at most `window` tasks alive at once.
+       Items are pulled from (possibly lazy) iterable only when there is free slot in the window
+       so neither items nor results are materialized up front.
+
+    Args:
+        func (Callable[[Any], Awaitable[Any]]): async function called for every item
+        items (Iterable[Any]): items to be processed. Can be generator
+        window (int, optional): Maximal number of tasks in flight. Defaults to 100.
+
+    Yields:
+        Tuple[Any, Any]: (item, result) pairs in order of completion
+    """
+    iterator = iter(items)
+    pending = {}
+
+    def fill():
+        while len(pending) < window:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            pending[asyncio.ensure_future(func(item))] = item
+
+    fill()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield pending.pop(task), task.result()
+            fill()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def bounded_map(func: Callable[[Any], Any], items: Iterable[Any], executor: Executor, window: int = 100) -> Iterator[Tuple[Any, Any]]:
+    """Synchronous counterpart of `abounded_map`. Run `func` for every item of `items` in `executor`
+       keeping at most `window` futures alive at once
+
+    Args:
+        func (Callable[[Any], Any]): function called for every item
+        items (Iterable[Any]): items to be processed. Can be generator
+        executor (Executor): executor e.g. `ThreadPoolExecutor`
+        window (int, optional): Maximal number of submitted futures. Defaults to 100.
+
+    Yields:
+        Tuple[Any, Any]: (item, result) pairs in order of completion
+    """
+    iterator = iter(items)
+    pending = {}
+
+    def fill():
+        while len(pending) < window:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            pending[executor.submit(func, item)] = item
+
+    fill()
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+            fill()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,251 @@
+from abc import ABC, abstractmethod
+import os
+
+import pandas as pd
+
+from typing import List
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, needed only for columnar (parquet/arrow) output
+    pa = pq = None
+
+from mssql import STRING_TYPE, connect, quote, sql_type, table_columns
+
+
+COLUMNAR_EXTENSIONS = ('.parquet', '.arrow', '.feather')
+
+
+class ResultSink(ABC):
+    """Interface of output written chunk by chunk"""
+    @abstractmethod
+    def write(self, data: pd.DataFrame) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class CsvSink(ResultSink):
+    """
+    Append chunks to csv file. Header is written only with the first chunk
+    """
+    def __init__(self, out_file: str):
+        self.out_file = out_file
+        self.__header = True
+        if os.path.exists(out_file):
+            os.remove(out_file)
+
+    def write(self, data: pd.DataFrame) -> None:
+        data.to_csv(self.out_file, mode='a', header=self.__header, index=False)
+        self.__header = False
+
+
+class ConnectorSink(ResultSink):
+    """
+    Collect chunks and export them at once using `Connector.export` on close.
+    Used for outputs which can not be appended to (e.g. excel)
+    """
+    def __init__(self, connector, out_file: str = '', server: str = '', db: str = '', out_table: str = ''):
+        self.connector = connector
+        self.out_file = out_file
+        self.server = server
+        self.db = db
+        self.out_table = out_table
+        self.__chunks: List[pd.DataFrame] = []
+
+    def write(self, data: pd.DataFrame) -> None:
+        self.__chunks.append(data)
+
+    def close(self) -> None:
+        if self.__chunks:
+            self.connector.export(pd.concat(self.__chunks, ignore_index=True), 'auto', self.out_file, self.server, self.db, self.out_table)
+        self.__chunks = []
+
+
+class ArrowSink(ResultSink):
+    """
+    Write chunks into Arrow IPC file (`.arrow`/`.feather`) as record batches with compact typed columns (int64 ruian code,
+    float64 coordinates, int32 wkid). Schema is derived from the first chunk, following chunks are converted to it.
+    Requires `pyarrow`
+    """
+    # types of result columns, other (input) columns keep types inferred from the first chunk
+    result_types = {'ruian_code': 'int64', 'x': 'float64', 'y': 'float64', 'wkid': 'int32',
+                    'code_matched_address': 'string', 'coor_matched_address': 'string', 'error_msg': 'string'}
+
+    def __init__(self, out_file: str):
+        if pa is None:
+            raise Exception(f"Output `{out_file}` requires optional dependency `pyarrow`. Install it by `pip install pyarrow`")
+        self.out_file = out_file
+        self.schema = None
+        self.__writer = None
+        if os.path.exists(out_file):
+            os.remove(out_file)
+
+    def field_type(self, name: str, inferred: 'pa.DataType') -> 'pa.DataType':
+        if name in self.result_types:
+            return pa.type_for_alias(self.result_types[name])
+        return pa.string() if pa.types.is_null(inferred) else inferred  # column without any value in the first chunk
+
+    def open_writer(self):
+        return pa.ipc.new_file(self.out_file, self.schema)
+
+    def table(self, data: pd.DataFrame) -> 'pa.Table':
+        try:
+            return pa.Table.from_pandas(data, schema=self.schema, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # type of input column differs from the first chunk (e.g. integers with missing values read as floats)
+            return pa.Table.from_pandas(data, preserve_index=False).cast(self.schema, safe=False)
+
+    def write(self, data: pd.DataFrame) -> None:
+        if self.__writer is None:
+            inferred = pa.Schema.from_pandas(data, preserve_index=False)
+            # pandas metadata is kept so nullable integer columns are loaded back as `Int64`
+            self.schema = pa.schema([pa.field(field.name, self.field_type(field.name, field.type)) for field in inferred], metadata=inferred.metadata)
+            self.__writer = self.open_writer()
+        self.__writer.write_table(self.table(data))
+
+    def close(self) -> None:
+        if self.__writer is not None:
+            self.__writer.close()
+            self.__writer = None
+
+
+class ParquetSink(ArrowSink):
+    """
+    Write chunks into Parquet file, every chunk is written as own row group as soon as it is finished.
+    Matched addresses and error messages are dictionary encoded (categorical when loaded by pandas). Requires `pyarrow`
+    """
+    def __init__(self, out_file: str, compression: str = 'zstd'):
+        super().__init__(out_file)
+        self.compression = compression
+
+    def field_type(self, name: str, inferred: 'pa.DataType') -> 'pa.DataType':
+        field_type = super().field_type(name, inferred)
+        # Arrow IPC file allows only one dictionary per column, parquet row groups have own dictionaries
+        return pa.dictionary(pa.int32(), field_type) if name in self.result_types and pa.types.is_string(field_type) else field_type
+
+    def open_writer(self):
+        return pq.ParquetWriter(self.out_file, self.schema, compression=self.compression)
+
+
+class MsSqlSink(ResultSink):
+    """
+    Write chunks into MS SQL table as soon as they are finished. Rows are identified by `key_column` (source row id)
+    and number of match candidate (`candidate` column). New table is created and filled by batched inserts,
+    rows of existing table (e.g. of resumed job) are upserted by MERGE and their stale candidates are deleted
+    """
+    def __init__(self, server: str, db: str, out_table: str, key_column: str, batch_size: int = 10000):
+        self.out_table = out_table
+        self.key_column = key_column
+        self.batch_size = batch_size
+        self.__connection = connect(server, db)
+        self.__columns: List[str] = []
+        self.__upsert = False
+
+    def __prepare(self, data: pd.DataFrame) -> None:
+        self.__columns = list(data.columns)
+        cursor = self.__connection.cursor()
+        self.__upsert = cursor.execute("SELECT OBJECT_ID(?)", self.out_table).fetchval() is not None
+        if self.__upsert:
+            # SQL Server identifiers are case insensitive (default collation)
+            existing = {name.casefold(): type_name for name, type_name in table_columns(cursor, self.out_table).items()}
+            missing = [name for name in self.__columns if name.casefold() not in existing]
+            if missing:
+                raise Exception(f"Existing table `{self.out_table}` can not be upserted, it lacks columns {missing}. Rows are matched by "
+                                f"`{self.key_column}` and `candidate` columns so use table created by previous run of the job or new table")
+            # texts would be truncated (or MERGE would fail) if existing table stores them in shorter columns
+            truncated = [f"{name} {existing[name.casefold()]}" for name in self.__columns
+                         if sql_type(name, data[name], key=name == self.key_column) == STRING_TYPE and existing[name.casefold()] != STRING_TYPE]
+            if truncated:
+                raise Exception(f"Existing table `{self.out_table}` can not be upserted, text columns {truncated} are not {STRING_TYPE}. "
+                                f"Alter them to {STRING_TYPE} or use new table")
+            cursor.execute(f"SELECT TOP 0 {', '.join(map(quote, self.__columns))} INTO #staging FROM {quote(self.out_table)}")
+        else:
+            definitions = [f"{quote(name)} {sql_type(name, data[name], key=name == self.key_column)}" + (' NOT NULL' if name in (self.key_column, 'candidate') else '')
+                           for name in self.__columns]
+            cursor.execute(f"CREATE TABLE {quote(self.out_table)} ({', '.join(definitions)}, "
+                           f"PRIMARY KEY ({quote(self.key_column)}, [candidate]))")
+        self.__connection.commit()
+
+    def __insert(self, table: str, rows: List[list]) -> None:
+        cursor = self.__connection.cursor()
+        cursor.fast_executemany = True
+        statement = f"INSERT INTO {table} ({', '.join(map(quote, self.__columns))}) VALUES ({', '.join('?' * len(self.__columns))})"
+        for start in range(0, len(rows), self.batch_size):
+            cursor.executemany(statement, rows[start:start + self.batch_size])
+
+    def write(self, data: pd.DataFrame) -> None:
+        # match candidates of one source row are numbered so (key, candidate) is unique
+        data = data.assign(candidate=data.groupby(self.key_column, sort=False).cumcount())
+        if not self.__columns:
+            self.__prepare(data)
+        rows = data[self.__columns].astype(object).where(data[self.__columns].notna(), None).values.tolist()
+
+        if not self.__upsert:
+            self.__insert(quote(self.out_table), rows)
+            self.__connection.commit()
+            return
+
+        target, key = quote(self.out_table), quote(self.key_column)
+        cursor = self.__connection.cursor()
+        cursor.execute("TRUNCATE TABLE #staging")
+        self.__insert('#staging', rows)
+        cursor.execute(f"DELETE t FROM {target} t WHERE t.{key} IN (SELECT {key} FROM #staging) "
+                       f"AND NOT EXISTS (SELECT 1 FROM #staging s WHERE s.{key} = t.{key} AND s.[candidate] = t.[candidate])")
+        updates = ', '.join(f"t.{quote(name)} = s.{quote(name)}" for name in self.__columns if name not in (self.key_column, 'candidate'))
+        cursor.execute(f"MERGE {target} AS t USING #staging AS s ON t.{key} = s.{key} AND t.[candidate] = s.[candidate] "
+                       f"WHEN MATCHED THEN UPDATE SET {updates} "
+                       f"WHEN NOT MATCHED BY TARGET THEN INSERT ({', '.join(map(quote, self.__columns))}) "
+                       f"VALUES ({', '.join('s.' + quote(name) for name in self.__columns)});")
+        self.__connection.commit()
+
+    def close(self) -> None:
+        self.__connection.close()
+
+
+def export_data(connector, data: pd.DataFrame, out_file: str = '', server: str = '', db: str = '', out_table: str = '') -> None:
+    """Export whole data at once. Columnar files (see `COLUMNAR_EXTENSIONS`) are written by `pyarrow`,
+       other outputs by `Connector.export`
+
+    Args:
+        connector (Connector): connector used for other than columnar outputs
+        data (pd.DataFrame): data to be exported
+        out_file (str, optional): Path to output file. Type of output is derived from extension. Defaults to ''.
+        server (str, optional): Name of server in local network. Defaults to ''.
+        db (str, optional): Name of MS SQL database. Defaults to ''.
+        out_table (str, optional): Name of output table. Defaults to ''.
+    """
+    if out_file.lower().endswith(COLUMNAR_EXTENSIONS):
+        sink = make_sink(connector, out_file)
+        sink.write(data)
+        sink.close()
+    else:
+        connector.export(data, 'auto', out_file, server, db, out_table)
+
+
+def make_sink(connector, out_file: str = '', server: str = '', db: str = '', out_table: str = '', key_column: str = '') -> ResultSink:
+    """Choose sink based on output specification
+
+    Args:
+        connector (Connector): connector used for outputs which can not be written incrementally
+        out_file (str, optional): Path to output file. Type of output is derived from extension. Defaults to ''.
+        server (str, optional): Name of server in local network. Defaults to ''.
+        db (str, optional): Name of MS SQL database. Defaults to ''.
+        out_table (str, optional): Name of output table. Defaults to ''.
+        key_column (str, optional): Name of column identifying source rows. If provided, results are written into `out_table`
+            chunk by chunk (see `MsSqlSink`). Defaults to '' i.e. whole output is exported at once.
+
+    Returns:
+        ResultSink: sink for given output
+    """
+    if out_file.lower().endswith('.csv'):
+        return CsvSink(out_file)
+    if out_file.lower().endswith('.parquet'):
+        return ParquetSink(out_file)
+    if out_file.lower().endswith(('.arrow', '.feather')):
+        return ArrowSink(out_file)
+    if not out_file and out_table and key_column:
+        return MsSqlSink(server, db, out_table, key_column)
+    return ConnectorSink(connector, out_file, server, db, out_table)
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+# modules of the package live in repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import MockServer
+
+
+@pytest.fixture(scope='session')
+def mock_server():
+    """Local stand-in for RUIAN APIs, URLs are set in environment so also worker processes of sharded jobs use it"""
+    server = MockServer(port=8790, latency=0.001, jitter=0.0).start()
+    os.environ.update(server.urls)
+    import ruian
+    ruian.RuianFetcher.code_api_url = server.urls['RUIAN_CODE_API_URL']
+    ruian.RuianFetcher.coor_api_url = server.urls['RUIAN_COORDINATES_API_URL']
+    return server
+
+
+@pytest.fixture
+def server(mock_server):
+    mock_server.calls.clear()
+    mock_server.empty_rate = 0.0
+    mock_server.latency = 0.001
+    return mock_server
+
+
+@pytest.fixture
+def make_fetcher(server):
+    from limiter import RateLimiter
+    from ruian import RuianFetcher
+
+    def make(**kwargs) -> RuianFetcher:
+        return RuianFetcher(rate_limiter=RateLimiter(default_budget={'rate': 5000, 'max_concurrency': 200}), **kwargs)
+    return make
@@ -0,0 +1,70 @@
+import pytest
+
+from address_formatter import AddressFormatter, StructuredAddressStrategy
+from data_models import ParsedAddress
+
+
+@pytest.mark.parametrize("address, expected", [
+    ("Karlovo náměstí 293/13, 120 00 Praha 2",
+     ParsedAddress(street="Karlovo náměstí", number="293/13", psc="120 00", municipality="Praha 2")),
+    ("Hradec Králové, 50008, Hradec Králové, Partyzánská, 11",
+     ParsedAddress(street="Partyzánská", number="11", psc="500 08", municipality="Hradec Králové")),
+    ("U Stadionu 1/a, 123 45 Obec",
+     ParsedAddress(street="U Stadionu", number="1/a", psc="123 45", municipality="Obec")),
+    ("Dlouhá 12 / 5a, Staré Město, 110 00 Praha 1",
+     ParsedAddress(street="Dlouhá", number="12/5a", psc="110 00", part="Staré Město", municipality="Praha 1")),
+    ("169, Horákov, 66404",
+     ParsedAddress(number="169", psc="664 04", municipality="Horákov")),
+    ("Rekreační, 679 61 Letovice",
+     ParsedAddress(psc="679 61", municipality="Letovice")),
+])
+def test_parse(address, expected):
+    assert StructuredAddressStrategy.parse(address) == expected
+
+
+def test_queries_keep_house_number():
+    parsed = StructuredAddressStrategy.parse("Partyzánská 11, 500 08 Hradec Králové")
+
+    assert StructuredAddressStrategy.queries(parsed) == [
+        "Partyzánská 11, 500 08 Hradec Králové",
+        "Partyzánská 11, 500 08",
+        "Partyzánská 11, Hradec Králové",
+    ]
+    assert StructuredAddressStrategy.queries(StructuredAddressStrategy.parse("169, Horákov, 66404")) == ["Horákov 169, 664 04", "Horákov 169"]
+
+
+def test_fallback_ladder_ends_with_unchanged_address():
+    strategy = StructuredAddressStrategy()
+    address = "Hradec Králové, 50008, Hradec Králové, Partyzánská, 11"
+    ladder = [address]
+    for _ in range(5):
+        ladder.append(strategy.apply_fallback(ladder[-1]))
+
+    assert ladder[1:] == [
+        "Partyzánská 11, 500 08 Hradec Králové",
+        "Partyzánská 11, 500 08",
+        "Partyzánská 11, Hradec Králové",
+        "Partyzánská 11, Hradec Králové",
+        "Partyzánská 11, Hradec Králové",
+    ]
+
+
+def test_fallback_skips_reordered_query():
+    # same words in different order were already tried
+    assert StructuredAddressStrategy().apply_fallback("11 Partyzánská, 500 08, Hradec Králové") == "Partyzánská 11, 500 08"
+
+
+@pytest.mark.parametrize("address", ["Rekreační, 679 61", "Letovice 679 61", "Foo 12"])
+def test_fallback_never_leaves_psc_or_number_alone(address):
+    strategy = StructuredAddressStrategy()
+    for _ in range(5):
+        address = strategy.apply_fallback(address)
+        assert any(char.isalpha() for char in address)
+
+
+def test_fit():
+    formatter = AddressFormatter(StructuredAddressStrategy())
+
+    assert formatter.fit("Karlovo náměstí 293/13, 120 00 Praha 2, Nové Město", 40) == "Karlovo náměstí 293/13, 120 00 Praha 2"
+    assert formatter.fit("Nábřeží Kapitána Jaroše 1000/7, 170 00 Praha 7", 40) == "Nábřeží Kapitána Jaroše 1000/7, 170 00"
+    assert len(formatter.fit("Náměstí Obránců Míru a Svobody Národa 1234/56, 123 45 Obec", 40)) <= 40
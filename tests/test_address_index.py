@@ -0,0 +1,29 @@
+import pytest
+
+from address_index import AddressIndex
+
+
+DUMP = """Kód ADM;Název obce;Název MOP;Název části obce;Název ulice;Typ SO;Číslo domovní;Číslo orientační;Znak čísla orientačního;PSČ;Souřadnice Y;Souřadnice X
+21719853;Praha;Praha 1;Staré Město;Dlouhá;č.p.;741;13;;11000;742860,50;1043278,10
+21719861;Praha;Praha 1;Staré Město;Dlouhá;č.p.;742;15;;11000;;
+"""
+
+
+@pytest.fixture
+def index(tmp_path):
+    dump = tmp_path / 'adresy.csv'
+    dump.write_bytes(DUMP.encode('cp1250'))
+    index = AddressIndex(str(tmp_path / 'index.sqlite'))
+    index.build([str(dump)])
+    yield index
+    index.close()
+
+
+def test_resolve_counts_only_answered_lookups(index):
+    coordinates = index.resolve('coordinates', "Dlouhá 741/13, 110 00 Praha 1")
+    assert coordinates.response.candidates[0].location.x == -742860.5
+    assert index.resolve('code', "Dlouhá 742/15, 110 00 Praha 1").response.polozky[0].kod == 21719861
+
+    # address point without coordinates falls through to API so it is not a hit
+    assert index.resolve('coordinates', "Dlouhá 742/15, 110 00 Praha 1") is None
+    assert index.stats()['hits'] == 2 and index.stats()['misses'] == 1
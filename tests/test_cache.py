@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from cache import ResponseCache
+from data_models import ApiResponse, RuianCodeApiResponse
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), ttl=60, negative_ttl=10)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    return now
+
+
+def test_response_expires_after_ttl(cache, clock):
+    response = ApiResponse(response=RuianCodeApiResponse(polozky=[{'kod': 1, 'nazev': 'Dlouhá 12'}], existujiDalsiPolozky=False))
+    cache.set('code', 'dlouhá 12', response)
+
+    clock[0] += 59
+    assert cache.get('code', 'dlouhá 12') == response
+    assert cache.get('coordinates', 'dlouhá 12') is None
+    clock[0] += 2
+    assert cache.get('code', 'dlouhá 12') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
+
+
+def test_negative_record_expires_after_negative_ttl(cache, clock):
+    cache.set_empty('code', 'neexistující 1')
+
+    clock[0] += 9
+    assert cache.is_empty('code', 'neexistující 1')
+    assert not cache.is_empty('code', 'dlouhá 12')
+    clock[0] += 2
+    assert not cache.is_empty('code', 'neexistující 1')
+
+
+def test_evict_removes_expired_records(cache, clock):
+    cache.set('code', 'dlouhá 12', ApiResponse(error_msg='error'))
+    cache.set_empty('code', 'neexistující 1')
+
+    clock[0] += 61
+    cache.evict()
+    clock[0] -= 61
+    assert cache.get('code', 'dlouhá 12') is None
+    assert not cache.is_empty('code', 'neexistující 1')
+
+
+def test_memory_cache_evicts_least_recently_used():
+    from cache import MemoryCache
+
+    memo = MemoryCache(max_entries=2)
+    memo.set('a', 1)
+    memo.set('b', 2)
+    assert memo.get('a') == 1
+    memo.set('c', 3)
+
+    assert len(memo) == 2
+    assert memo.get('b') is None and memo.get('a') == 1 and memo.get('c') == 3
@@ -0,0 +1,203 @@
+import asyncio
+import time
+
+import pytest
+
+
+ADDRESSES = ("Dlouhá 12, 110 00 Praha 1", "dlouhá  12,110 00 praha 1", "DLOUHÁ 12, 110 00 Praha 1",
+             "Karlovo náměstí 293/13, 120 00 Praha 2", "Karlovo náměstí 293/13, 120 00 Praha 2",
+             "Partyzánská 11, 500 08 Hradec Králové", "", "---")
+
+
+def codes(responses):
+    return [response.response.polozky[0].kod if response.response is not None else None for response in responses]
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_abulk_fetches_unique_addresses_once(make_fetcher, server, processes):
+    fetcher = make_fetcher()
+    responses = asyncio.run(fetcher.abulk_fetch_ruian_codes(ADDRESSES, processes=processes))
+
+    assert server.calls['code'] == 3
+    assert len(responses) == len(ADDRESSES)
+    assert len(set(codes(responses[:3]))) == 1 and len(set(codes(responses[3:5]))) == 1
+    assert [response.error_msg for response in responses[-2:]] == ["No address provided"] * 2
+    assert fetcher.job_report.unique_addresses == 3 and fetcher.job_report.skipped_rows == 2
+
+
+def test_sharded_fetch_does_not_add_calls(make_fetcher, server):
+    addresses = tuple(f"Ulice{i % 5} {i % 7}, 110 00 Praha 1" for i in range(200))
+    single = asyncio.run(make_fetcher().abulk_fetch_ruian_codes(addresses))
+    calls = server.calls['code']
+    server.calls.clear()
+    sharded = asyncio.run(make_fetcher().abulk_fetch_ruian_codes(addresses, processes=2))
+
+    assert server.calls['code'] == calls == 35
+    assert codes(sharded) == codes(single)
+
+
+def test_bulk_fetches_unique_addresses_once(make_fetcher, server):
+    responses = make_fetcher().bulk_fetch_ruian_codes(ADDRESSES)
+
+    assert server.calls['code'] == 3
+    assert codes(responses[:3]) == [codes(responses[:1])[0]] * 3
+
+
+def test_resumed_job_makes_no_calls(make_fetcher, server, tmp_path):
+    journal = str(tmp_path / 'job.journal')
+    first = asyncio.run(make_fetcher().abulk_fetch_ruian_codes(ADDRESSES, journal=journal))
+    server.calls.clear()
+    fetcher = make_fetcher()
+    resumed = asyncio.run(fetcher.abulk_fetch_ruian_codes(ADDRESSES, journal=journal, resume=True))
+
+    assert server.calls['code'] == 0
+    assert codes(resumed) == codes(first)
+    assert fetcher.job_report.resumed_rows == len(ADDRESSES) - 2
+
+
+def test_cached_responses_are_not_requested(make_fetcher, server, tmp_path):
+    from cache import ResponseCache
+
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    server.empty_rate = 1.0  # every query returns no results
+    asyncio.run(make_fetcher(response_cache=cache).abulk_fetch_ruian_codes(ADDRESSES))
+    assert server.calls['code'] > 0
+
+    server.calls.clear()
+    asyncio.run(make_fetcher(response_cache=cache).abulk_fetch_ruian_codes(ADDRESSES))
+    assert server.calls['code'] == 0
+    cache.close()
+
+
+
+def test_negative_cache_is_keyed_by_canonical_address(make_fetcher, server, tmp_path):
+    from cache import ResponseCache
+
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    server.empty_rate = 1.0
+    make_fetcher(response_cache=cache).fetch_ruian_code("Dlouhá 12, 110 00 Praha 1")
+    server.calls.clear()
+    make_fetcher(response_cache=cache).fetch_ruian_code("Jiná, DLOUHÁ 12, 110 00 PRAHA 1")
+
+    assert server.calls['code'] == 1  # shortened variant differs only in case and is known to return no results
+    cache.close()
+
+
+def test_variant_memo_is_bounded(make_fetcher, server, monkeypatch):
+    from cache import MemoryCache
+
+    sizes = []
+    set_item = MemoryCache.set
+    monkeypatch.setattr(MemoryCache, 'set', lambda memo, key, value: (set_item(memo, key, value), sizes.append(len(memo))))
+    server.empty_rate = 0.5
+    fetcher = make_fetcher(memo_size=10)
+    asyncio.run(fetcher.abulk_fetch_ruian_codes(tuple(f"Ulice{i}, {i}, 110 00 Praha 1" for i in range(300))))
+
+    assert len(sizes) > 10 and max(sizes) == 10
+    assert fetcher.variant_memo is None
+
+def test_structured_fallback_stops_after_last_query(make_fetcher, server):
+    from address_formatter import StructuredAddressStrategy
+
+    server.empty_rate = 1.0
+    fetcher = make_fetcher(fallback_strategy=StructuredAddressStrategy())
+    response = fetcher.fetch_ruian_code("Hradec Králové, 50008, Hradec Králové, Partyzánská, 11")
+
+    assert response.response is None or not response.response.polozky
+    assert server.calls['code'] == 3  # one call per structured query
+
+
+
+def respond_with(monkeypatch, server, *responses):
+    """Make mock server answer with given (status, headers) responses, then normally"""
+    from aiohttp import web
+
+    responses = list(responses)
+
+    async def respond(endpoint):
+        server.calls[endpoint] += 1
+        if responses:
+            status, headers = responses.pop(0)
+            return web.Response(status=status, headers=headers)
+        return None
+    monkeypatch.setattr(server, '_MockServer__respond', respond)
+
+
+def test_http_error_does_not_trigger_fallback(make_fetcher, server, monkeypatch):
+    respond_with(monkeypatch, server, (400, {}), (400, {}))
+    fetcher = make_fetcher()
+
+    assert fetcher.fetch_ruian_code("Jiná, Dlouhá 12, 110 00 Praha 1").error_msg == "HTTP Error 400"
+    assert asyncio.run(fetcher.afetch_ruian_code("Jiná, Dlouhá 12, 110 00 Praha 1")).error_msg == "HTTP Error 400"
+    assert server.calls['code'] == 2  # shortened variants are not requested
+
+
+def test_retry_after_is_capped(make_fetcher, server, monkeypatch):
+    import utils
+
+    delays = []
+    monkeypatch.setattr(utils.time, 'sleep', delays.append)
+    respond_with(monkeypatch, server, (429, {'Retry-After': '86400'}))
+    response = make_fetcher().fetch_ruian_code("Dlouhá 12, 110 00 Praha 1")
+
+    assert response.response is not None and server.calls['code'] == 2
+    assert delays == [30.0]
+
+def test_fetch_info_queries_both_apis_concurrently(make_fetcher, server):
+    server.latency = 0.3
+    start = time.perf_counter()
+    response = make_fetcher().fetch_info("Dlouhá 12, 110 00 Praha 1")
+
+    assert time.perf_counter() - start < 0.5
+    assert server.calls['code'] == server.calls['coordinates'] == 1
+    assert response.response.code is not None and response.response.coordinates is not None
+
+
+def test_info_pairs_candidates(make_fetcher):
+    import pandas as pd
+    from data_models import ApiResponse, InfoApiResponse
+
+    def candidate(address, score):
+        return {'address': address, 'score': score, 'location': {'x': -float(score), 'y': 0.0, 'spatialReference': {'wkid': 5514, 'latestWkid': 5514}},
+                'attributes': {'Addr_type': 'PointAddress', 'Loc_name': 'RUIAN', 'Type': 'AdresniMisto', 'City': '', 'Country': 'CZE',
+                               'Match_addr': address, 'Score': score}}
+
+    response = ApiResponse(response=InfoApiResponse.model_validate({
+        'code': {'polozky': [{'kod': 1, 'nazev': 'Dlouhá 12, Praha 1'}, {'kod': 2, 'nazev': 'Dlouhá 12, Praha 9'}], 'existujiDalsiPolozky': False},
+        'coordinates': {'spatialReference': {'wkid': 5514, 'latestWkid': 5514},
+                        'candidates': [candidate('Dlouhá 12, Praha 5', 80), candidate('Dlouhá 12, Praha 9', 90), candidate('Dlouhá 12, Praha 3', 95)]}}))
+    data = make_fetcher()._RuianFetcher__assemble_info(pd.DataFrame({'address': ['Dlouhá 12']}), [response])
+
+    # code match without coordinates of the same address gets the best scored candidate
+    assert data['ruian_code'].tolist() == [1, 2]
+    assert data['coor_matched_address'].tolist() == ['Dlouhá 12, Praha 3', 'Dlouhá 12, Praha 9']
+
+
+@pytest.mark.parametrize("task", ['code', 'info'])
+def test_sharded_job_assembles_same_result(make_fetcher, server, task):
+    import pandas as pd
+
+    data = pd.DataFrame({'address': [f"Ulice{i % 5} {i % 7}, 110 00 Praha 1" for i in range(60)] + ['', None], 'id': range(62)})
+    single, _ = asyncio.run(make_fetcher()._RuianFetcher__afetch_data(task, data, 'address', progress=False))
+    calls = sum(server.calls.values())
+    server.calls.clear()
+    sharded, responses = asyncio.run(make_fetcher()._RuianFetcher__afetch_sharded(task, data, 'address', processes=2))
+
+    assert sum(server.calls.values()) == calls
+    assert len(responses) == len(data)
+    pd.testing.assert_frame_equal(sharded, single)
+
+
+def test_worker_fetcher_lives_across_shards(make_fetcher, server, monkeypatch):
+    from decoder import decode_api_response
+    from ruian import RuianFetcher
+
+    monkeypatch.setattr(RuianFetcher, 'worker', None)
+    RuianFetcher.init_worker(make_fetcher())
+    limiter = RuianFetcher.worker.rate_limiter
+    payloads, metrics = RuianFetcher.fetch_shard('code', ["Dlouhá 12, 110 00 Praha 1"])
+    RuianFetcher.fetch_shard('code', ["Dlouhá 13, 110 00 Praha 1"])
+
+    # limits of worker are not reset by every shard and responses are passed serialized
+    assert RuianFetcher.worker.rate_limiter is limiter
+    assert isinstance(payloads[0], str) and decode_api_response(payloads[0]).response.polozky
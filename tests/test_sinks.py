@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.parquet as pq  # noqa: E402
+
+from sinks import ArrowSink, ParquetSink  # noqa: E402
+
+
+CHUNKS = [
+    pd.DataFrame({'address': ['Dlouhá 12', 'Dlouhá 13'], 'ruian_code': [21719853, None], 'x': [-742860.5, None], 'y': [-1043278.1, None],
+                  'wkid': [5514, None], 'code_matched_address': ['Dlouhá 12', None], 'error_msg': [None, 'No results']}),
+    pd.DataFrame({'address': ['Karlovo náměstí 293/13'], 'ruian_code': [22349995], 'x': [-743500.0], 'y': [-1043900.0],
+                  'wkid': [5514], 'code_matched_address': ['Karlovo náměstí 293/13'], 'error_msg': [None]}),
+]
+
+
+def write(sink):
+    for chunk in CHUNKS:
+        sink.write(chunk)
+    sink.close()
+
+
+def test_arrow_sink_types(tmp_path):
+    out_file = str(tmp_path / 'result.arrow')
+    write(ArrowSink(out_file))
+    table = pa.ipc.open_file(out_file).read_all()
+
+    assert table.num_rows == 3
+    assert table.schema.field('ruian_code').type == pa.int64()
+    assert table.schema.field('x').type == pa.float64()
+    assert table.schema.field('wkid').type == pa.int32()
+    assert table.schema.field('error_msg').type == pa.string()
+    assert table.column('ruian_code').to_pylist() == [21719853, None, 22349995]
+
+
+def test_parquet_sink_types(tmp_path):
+    out_file = str(tmp_path / 'result.parquet')
+    write(ParquetSink(out_file))
+    schema = pq.read_schema(out_file)
+    data = pd.read_parquet(out_file)
+
+    assert pq.ParquetFile(out_file).metadata.num_row_groups == 2
+    assert schema.field('wkid').type == pa.int32()
+    assert pa.types.is_dictionary(schema.field('code_matched_address').type)
+    assert isinstance(data['error_msg'].dtype, pd.CategoricalDtype)
+    assert data['address'].tolist() == ['Dlouhá 12', 'Dlouhá 13', 'Karlovo náměstí 293/13']
+
+
+class FakeCursor:
+    def __init__(self, columns):
+        self.columns = columns
+        self.statements = []
+
+    def execute(self, statement, *params):
+        self.statements.append(statement)
+        return self
+
+    def fetchval(self):
+        return 1  # output table exists
+
+    def fetchall(self):
+        return self.columns
+
+
+@pytest.mark.parametrize("error_msg_length, upserted", [(-1, True), (2000, False)])
+def test_mssql_sink_checks_text_columns_of_existing_table(monkeypatch, error_msg_length, upserted):
+    import sinks
+
+    columns = [('id', 'bigint', 8), ('address', 'nvarchar', -1), ('ruian_code', 'bigint', 8), ('x', 'float', 8), ('y', 'float', 8),
+               ('wkid', 'int', 4), ('code_matched_address', 'nvarchar', -1), ('error_msg', 'nvarchar', error_msg_length), ('candidate', 'int', 4)]
+    cursor = FakeCursor(columns)
+    connection = type('FakeConnection', (), {'cursor': lambda self: cursor, 'commit': lambda self: None})()
+    monkeypatch.setattr(sinks, 'connect', lambda server, db: connection)
+    sink = sinks.MsSqlSink('server', 'db', 'result', 'id')
+    prepare = lambda: sink._MsSqlSink__prepare(CHUNKS[0].assign(id=[1, 2], candidate=0))  # noqa: E731
+
+    if upserted:
+        prepare()
+        assert any('#staging' in statement for statement in cursor.statements)
+    else:
+        with pytest.raises(Exception, match=r"error_msg NVARCHAR\(1000\)"):
+            prepare()
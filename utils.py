@@ -1,7 +1,15 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+
 from typing import Any, List, Tuple, Callable, Optional, Dict
 
+from data_models import ApiResponse
+
 # TODO consider tenacity module for more complex retry logic
 
+
 def retry_api_call(func: Callable) -> Callable:
     """utility decorator for multiple api call retries
 
@@ -25,11 +33,126 @@ def retry_api_call(func: Callable) -> Callable:
 
     return wrapper
 
+
+def is_transient_status(status: Optional[int]) -> bool:
+    """Whether HTTP status (None for timeout/connection error) signals temporary failure worth repeating the same request
+
+    Args:
+        status (Optional[int]): HTTP status code
+
+    Returns:
+        bool: True for timeout/connection error, HTTP 429 and HTTP 5xx
+    """
+    return status is None or status == 429 or status >= 500
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse `Retry-After` header given either as number of seconds or as HTTP date
+
+    Args:
+        value (Optional[str]): value of header
+
+    Returns:
+        Optional[float]: number of seconds to wait or None if header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, response: Any, backoff: float = 0.5, max_backoff: float = 30.0) -> float:
+    """Delay before repeating request after transient error. `retry_after` of response is honored
+       (up to `max_backoff`), otherwise exponential backoff with full jitter is used
+
+    Args:
+        attempt (int): number of already repeated requests
+        response (Any): response of failed request
+        backoff (float, optional): Base delay in seconds. Defaults to 0.5.
+        max_backoff (float, optional): Maximal delay in seconds. Defaults to 30.
+
+    Returns:
+        float: delay in seconds
+    """
+    retry_after = getattr(response, 'retry_after', None)
+    if retry_after is not None:
+        return min(retry_after, max_backoff)
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+
+def recall_variant(self, endpoint: str, address: str) -> Optional[ApiResponse]:
+    """Get response of address (or its fallback variant) from memo of current bulk job (`self.variant_memo`)
+       or from negative cache (`self.response_cache`) if address is known to return no results.
+       Both are keyed by canonical key of address (see `AddressFormatter.key`)
+
+    Args:
+        endpoint (str): name of endpoint e.g. `code` or `coordinates`
+        address (str): address string
+
+    Returns:
+        Optional[ApiResponse]: known response or None if address has to be requested
+    """
+    key = self.address_formatter.key(address)
+    if self.variant_memo is not None:
+        response = self.variant_memo.get((endpoint, key))
+        if response is not None:
+            return response
+    if self.response_cache is not None and self.response_cache.is_empty(endpoint, key):
+        self.metrics.cache.inc(endpoint=endpoint, result='negative_hit')
+        return ApiResponse()
+    return None
+
+
+def remember_variant(self, endpoint: str, address: str, response: ApiResponse) -> None:
+    """Store response of address (or its fallback variant) in memo of current job
+       and record empty response in negative cache. Errors are not remembered
+
+    Args:
+        endpoint (str): name of endpoint e.g. `code` or `coordinates`
+        address (str): address string
+        response (ApiResponse): response of address
+    """
+    if response.error_msg is not None:
+        return
+    key = self.address_formatter.key(address)
+    if self.variant_memo is not None:
+        self.variant_memo.set((endpoint, key), response)
+    if response.response is None and self.response_cache is not None:
+        self.response_cache.set_empty(endpoint, key)
+
+
+def record_lookup(self, endpoint: Optional[str], response: Optional[ApiResponse], depth: int) -> None:
+    """Record final response of address and number of tried address variants in `self.metrics`
+
+    Args:
+        endpoint (Optional[str]): name of endpoint e.g. `code` or `coordinates`. Nothing is recorded if None
+        response (Optional[ApiResponse]): final response. `None` if every attempt raised exception
+        depth (int): number of tried address variants (original address included)
+    """
+    if endpoint is None:
+        return
+    if depth > 1:
+        self.metrics.retries.inc(depth - 1, endpoint=endpoint, kind='fallback')
+    self.metrics.lookup_finished(endpoint, response, depth)
+
+
 def retry_adjust_api_call(retry_count: int = 3,
                     retry_condition: Optional[Callable[[Any], bool]] = None,
-                    param_adjuster: Optional[Callable[..., Tuple[List, Dict]]] = None
+                    param_adjuster: Optional[Callable[..., Tuple[List, Dict]]] = None,
+                    endpoint: Optional[str] = None,
+                    transient_condition: Optional[Callable[[Any], bool]] = None,
+                    transient_retries: int = 3,
+                    backoff: float = 0.5
                     ):
-    """utility decorator for multiple api call retries
+    """utility decorator for multiple api call retries.
+       Responses satisfying `transient_condition` (temporary upstream failures) are repeated with the same arguments
+       after backoff (see `backoff_delay`), only responses satisfying `retry_condition` lead to adjusted arguments.
 
     Args:
         retry_count (int, optional): Retry count. Defaults to 3.
@@ -38,47 +161,78 @@ def retry_adjust_api_call(retry_count: int = 3,
         param_adjuster (Callable[..., Tuple[List, Dict]], optional): Function that adjusts the arguments
             for the next retry attempt. It should return a tuple containing the new arguments list and 
             kwargs dictionary. Defaults to None.
+        endpoint (str, optional): Name of endpoint. If provided, responses of every attempted address are memoized for current job
+            (see `recall_variant`) and addresses known to return no results are not requested again. Defaults to None.
+        transient_condition (Callable[[Any], bool], optional): Function that takes the result of the function call and
+            returns a boolean indicating whether the call failed temporarily and should be repeated with the same arguments. Defaults to None.
+        transient_retries (int, optional): Maximal number of repetitions of temporarily failed call. Defaults to 3.
+        backoff (float, optional): Base delay of exponential backoff in seconds. Defaults to 0.5.
     """
     def decorator(func: Callable):
+        def repeat(self, args: List, kwargs: Dict) -> Any:
+            for attempt in range(transient_retries + 1):
+                response = func(self, *args, **kwargs)
+                if transient_condition is None or attempt == transient_retries or not transient_condition(response):
+                    return response
+                if endpoint is not None:
+                    self.metrics.retries.inc(endpoint=endpoint, kind='transient')
+                time.sleep(backoff_delay(attempt, response, backoff))
+
+        def call(self, args: List, kwargs: Dict) -> Any:
+            if endpoint is None:
+                return repeat(self, args, kwargs)
+            response = recall_variant(self, endpoint, args[0])
+            if response is None:
+                response = repeat(self, args, kwargs)
+                remember_variant(self, endpoint, args[0], response)
+            return response
+
         def wrapper(self, *args, **kwargs):
             mutable_args = list(args)
             response = None
             last_exception = None
             for attempt in range(retry_count):
                 try:
-                    response = func(self, *mutable_args, **kwargs)
+                    response = call(self, mutable_args, kwargs)
                     if retry_condition is not None and retry_condition(response):
-                        if param_adjuster is not None:
-                            mutable_args, kwargs = param_adjuster(self, *mutable_args, **kwargs)
-                        continue
+                        if param_adjuster is None:
+                            continue
+                        adjusted = param_adjuster(self, *mutable_args, **kwargs)
+                        if adjusted[0] != mutable_args:
+                            mutable_args, kwargs = adjusted
+                            continue
+                        # arguments can not be adjusted any more, repeating the same call is pointless
+                        record_lookup(self, endpoint, response, attempt + 1)
+                        return response
+                    record_lookup(self, endpoint, response, attempt + 1)
                     return response
                 except Exception as e:
                     last_exception = e
                     if param_adjuster:
                         mutable_args, kwargs = param_adjuster(self, *mutable_args, **kwargs)
+            record_lookup(self, endpoint, response, retry_count)
             if response is not None:
                 return response
             raise last_exception
         return wrapper
     return decorator
 
+
 def ensure_clean_address():
-    """utility decorator to ensure that from address were removed unncessary keywords 
+    """utility decorator to ensure that from address were removed unncessary keywords and that it is normalized (see `AddressFormatter.normalize`)
 
     """
     def decorator(func: Callable) -> Callable:
 
         def wrapper(self, address: str, *args, **kwargs):
             
-            address = self.address_formatter.remove(address)
-            address = self.address_formatter.cleanse(address)
+            address = self.address_formatter.normalize(address)
             
             return func(self, address, *args, **kwargs)
         return wrapper
     return decorator
 
 
-
 def ensure_length_limit(limit : Optional[None] = None):
     """utility decorator to ensure that lenght of address string is less than `limit` chars 
 
@@ -90,8 +244,7 @@ def ensure_length_limit(limit : Optional[None] = None):
         def wrapper(self, address: str, *args, **kwargs):
 
             if limit is not None:
-                while len(address) > limit:
-                    address = self.address_formatter.format_address(address)
+                address = self.address_formatter.fit(address, limit)
             
             return func(self, address, *args, **kwargs)
         return wrapper
@@ -100,9 +253,16 @@ def ensure_length_limit(limit : Optional[None] = None):
 
 def aretry_adjust_api_call(retry_count: int = 3,
                     retry_condition: Optional[Callable[[Any], bool]] = None,
-                    param_adjuster: Optional[Callable[..., Tuple[List, Dict]]] = None
+                    param_adjuster: Optional[Callable[..., Tuple[List, Dict]]] = None,
+                    endpoint: Optional[str] = None,
+                    transient_condition: Optional[Callable[[Any], bool]] = None,
+                    transient_retries: int = 3,
+                    backoff: float = 0.5
                     ):
-    """Async utility decorator for multiple api call retries
+    """Async utility decorator for multiple api call retries.
+       If `self.hedge` is greater than 0, original arguments and first `self.hedge` adjusted variants are computed
+       up front and called concurrently (hedged). The least adjusted response not satisfying `retry_condition` is returned
+       and calls of other variants are cancelled. Remaining retries (if any) continue sequentially.
 
     Args:
         retry_count (int, optional): Retry count. Defaults to 3.
@@ -111,43 +271,143 @@ def aretry_adjust_api_call(retry_count: int = 3,
         param_adjuster (Callable[..., Tuple[List, Dict]], optional): Function that adjusts the arguments
             for the next retry attempt. It should return a tuple containing the new arguments list and 
             kwargs dictionary. Defaults to None.
+        endpoint (str, optional): Name of endpoint. If provided, responses of every attempted address are memoized for current job
+            (see `recall_variant`) and addresses known to return no results are not requested again. Defaults to None.
+        transient_condition (Callable[[Any], bool], optional): Function that takes the result of the function call and
+            returns a boolean indicating whether the call failed temporarily and should be repeated with the same arguments. Defaults to None.
+        transient_retries (int, optional): Maximal number of repetitions of temporarily failed call. Defaults to 3.
+        backoff (float, optional): Base delay of exponential backoff in seconds. Defaults to 0.5.
     """
     def decorator(func: Callable):
+        async def repeat(self, args: List, kwargs: Dict) -> Any:
+            for attempt in range(transient_retries + 1):
+                response = await func(self, *args, **kwargs)
+                if transient_condition is None or attempt == transient_retries or not transient_condition(response):
+                    return response
+                if endpoint is not None:
+                    self.metrics.retries.inc(endpoint=endpoint, kind='transient')
+                await asyncio.sleep(backoff_delay(attempt, response, backoff))
+
+        async def call(self, args: List, kwargs: Dict) -> Any:
+            if endpoint is None:
+                return await repeat(self, args, kwargs)
+            response = recall_variant(self, endpoint, args[0])
+            if response is None:
+                response = await repeat(self, args, kwargs)
+                remember_variant(self, endpoint, args[0], response)
+            return response
+
+        async def hedged(self, variants: List[Tuple[List, Dict]]) -> Tuple[Any, Optional[Exception], int]:
+            tasks = [asyncio.ensure_future(call(self, args, kwargs)) for args, kwargs in variants]
+            response = None
+            last_exception = None
+            try:
+                # variants are awaited in order so the least adjusted acceptable response wins
+                for depth, task in enumerate(tasks, start=1):
+                    try:
+                        response = await task
+                    except Exception as e:
+                        last_exception = e
+                        continue
+                    if not retry_condition(response):
+                        return response, None, depth
+                return response, last_exception, len(tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
         async def wrapper(self, *args, **kwargs):
             mutable_args = list(args)
             response = None
             last_exception = None
-            for attempt in range(retry_count):
+            attempt = 0
+
+            hedge = min(getattr(self, 'hedge', 0), retry_count - 1) if retry_condition is not None and param_adjuster is not None else 0
+            if hedge > 0:
+                variants = [(mutable_args, kwargs)]
+                adjusted = param_adjuster(self, *mutable_args, **kwargs)
+                while len(variants) <= hedge and adjusted[0] != variants[-1][0]:  # stop when arguments can not be adjusted any more
+                    variants.append(adjusted)
+                    adjusted = param_adjuster(self, *adjusted[0], **adjusted[1])
+
+                response, last_exception, depth = await hedged(self, variants)
+                if response is not None and last_exception is None and not retry_condition(response):
+                    record_lookup(self, endpoint, response, depth)
+                    return response
+                mutable_args, kwargs = adjusted
+                attempt = len(variants) if adjusted[0] != variants[-1][0] else retry_count
+
+            for attempt in range(attempt, retry_count):
                 try:
-                    response = await func(self, *mutable_args, **kwargs)
+                    response = await call(self, mutable_args, kwargs)
                     if retry_condition is not None and retry_condition(response):
-                        if param_adjuster is not None:
-                            mutable_args, kwargs = param_adjuster(self, *mutable_args, **kwargs)
-                        continue
+                        if param_adjuster is None:
+                            continue
+                        adjusted = param_adjuster(self, *mutable_args, **kwargs)
+                        if adjusted[0] != mutable_args:
+                            mutable_args, kwargs = adjusted
+                            continue
+                        # arguments can not be adjusted any more, repeating the same call is pointless
+                        record_lookup(self, endpoint, response, attempt + 1)
+                        return response
+                    record_lookup(self, endpoint, response, attempt + 1)
                     return response
                 except Exception as e:
                     last_exception = e
                     if param_adjuster:
                         mutable_args, kwargs = param_adjuster(self, *mutable_args, **kwargs)
+            record_lookup(self, endpoint, response, retry_count)
             if response is not None:
                 return response
             raise last_exception
         return wrapper
     return decorator
 
+
 def aensure_clean_address():
-    """Async utility decorator to ensure that from address were removed unncessary keywords 
+    """Async utility decorator to ensure that from address were removed unncessary keywords and that it is normalized (see `AddressFormatter.normalize`)
     """
     def decorator(func: Callable) -> Callable:
         async def wrapper(self, address: str, *args, **kwargs):
             
-            address = self.address_formatter.remove(address)
-            address = self.address_formatter.cleanse(address)
+            address = self.address_formatter.normalize(address)
             
             return await func(self, address, *args, **kwargs)
         return wrapper
     return decorator
 
+
+def asingle_flight(endpoint: str):
+    """Async utility decorator coalescing concurrent calls for the same (canonical key of) address into single call.
+       First caller starts the call, other callers arriving while it is in flight await its result (`self.flights`).
+       Call is cancelled only when all its callers are cancelled
+
+    Args:
+        endpoint (str): name of endpoint used as part of key e.g. `code` or `coordinates`
+    """
+    def decorator(func: Callable) -> Callable:
+        async def wrapper(self, address: str, *args, **kwargs):
+
+            key = (endpoint, self.address_formatter.key(address))
+            flight = self.flights.get(key)
+            # in-flight call of another event loop (e.g. previous `asyncio.run`) can not be awaited
+            if flight is None or flight[0].get_loop() is not asyncio.get_running_loop():
+                flight = self.flights[key] = [asyncio.ensure_future(func(self, address, *args, **kwargs)), 0]
+                flight[0].add_done_callback(lambda _, f=flight: self.flights.get(key) is f and self.flights.pop(key))
+            else:
+                self.metrics.coalesced.inc(endpoint=endpoint)
+
+            flight[1] += 1
+            try:
+                return await asyncio.shield(flight[0])
+            finally:
+                flight[1] -= 1
+                if flight[1] == 0 and not flight[0].done():
+                    flight[0].cancel()
+        return wrapper
+    return decorator
+
+
 def aensure_length_limit(limit: Optional[int] = None):
     """Async utility decorator to ensure that lenght of address string is less than `limit` chars 
 
@@ -158,9 +418,108 @@ def aensure_length_limit(limit: Optional[int] = None):
         async def wrapper(self, address: str, *args, **kwargs):
             
             if limit is not None:
-                while len(address) > limit:
-                    address = self.address_formatter.format_address(address)
+                address = self.address_formatter.fit(address, limit)
             
             return await func(self, address, *args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+
+def resolve_locally(endpoint: str):
+    """utility decorator to resolve address from offline `self.address_index` (if set). Decorated function
+       (i.e. online API) is called only if address is not found in index
+
+    Args:
+        endpoint (str): name of endpoint e.g. `code` or `coordinates`
+    """
+    def decorator(func: Callable) -> Callable:
+
+        def wrapper(self, address: str, *args, **kwargs):
+
+            if self.address_index is not None:
+                response = self.address_index.resolve(endpoint, address)
+                self.metrics.index.inc(endpoint=endpoint, result='hit' if response is not None else 'miss')
+                if response is not None:
+                    return response
+
+            return func(self, address, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def aresolve_locally(endpoint: str):
+    """Async utility decorator to resolve address from offline `self.address_index` (if set). Decorated function
+       (i.e. online API) is awaited only if address is not found in index
+
+    Args:
+        endpoint (str): name of endpoint e.g. `code` or `coordinates`
+    """
+    def decorator(func: Callable) -> Callable:
+        async def wrapper(self, address: str, *args, **kwargs):
+
+            if self.address_index is not None:
+                response = self.address_index.resolve(endpoint, address)
+                self.metrics.index.inc(endpoint=endpoint, result='hit' if response is not None else 'miss')
+                if response is not None:
+                    return response
+
+            return await func(self, address, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cache_response(endpoint: str):
+    """utility decorator to serve responses from `self.response_cache` (if set) and store new non-empty responses there.
+       Responses are keyed by canonical key of address (see `AddressFormatter.key`)
+
+    Args:
+        endpoint (str): name of endpoint used as part of cache key e.g. `code` or `coordinates`
+    """
+    def decorator(func: Callable) -> Callable:
+
+        def wrapper(self, address: str, *args, **kwargs):
+
+            if self.response_cache is None:
+                return func(self, address, *args, **kwargs)
+
+            key = self.address_formatter.key(address)
+            cached = self.response_cache.get(endpoint, key)
+            self.metrics.cache.inc(endpoint=endpoint, result='hit' if cached is not None else 'miss')
+            if cached is not None:
+                return cached
+
+            response = func(self, address, *args, **kwargs)
+            if response.response is not None:
+                self.response_cache.set(endpoint, key, response)
+
+            return response
+        return wrapper
+    return decorator
+
+
+def acache_response(endpoint: str):
+    """Async utility decorator to serve responses from `self.response_cache` (if set) and store new non-empty responses there.
+       Responses are keyed by canonical key of address (see `AddressFormatter.key`)
+
+    Args:
+        endpoint (str): name of endpoint used as part of cache key e.g. `code` or `coordinates`
+    """
+    def decorator(func: Callable) -> Callable:
+        async def wrapper(self, address: str, *args, **kwargs):
+
+            if self.response_cache is None:
+                return await func(self, address, *args, **kwargs)
+
+            key = self.address_formatter.key(address)
+            cached = self.response_cache.get(endpoint, key)
+            self.metrics.cache.inc(endpoint=endpoint, result='hit' if cached is not None else 'miss')
+            if cached is not None:
+                return cached
+
+            response = await func(self, address, *args, **kwargs)
+            if response.response is not None:
+                self.response_cache.set(endpoint, key, response)
+
+            return response
+        return wrapper
+    return decorator